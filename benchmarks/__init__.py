@@ -0,0 +1 @@
+"""Benchmarks of modelmsh on synthetic SAP2000 models and gmsh meshes."""
@@ -0,0 +1,312 @@
+"""Benchmarks of the modelmsh converters on synthetic models.
+
+Each stage is timed (wall clock) and its peak Python memory is measured with
+tracemalloc. Stages that cannot run here (gmsh or the femix library missing)
+are reported as skipped, stages that fail are reported with the error.
+
+The .msh output of ``to_msh`` is also compared as ASCII, binary and
+partitioned files (time and size written).
+
+Usage::
+
+    python -m benchmarks.bench --sizes 1000 10000 --save baseline.json
+    python -m benchmarks.bench --sizes 1000 10000 --compare baseline.json --threshold 0.25
+
+With ``--compare`` the exit code is 1 if any stage is slower (or uses more
+memory) than the baseline by more than the threshold. The exit code is also 1
+if ``import modelmsh`` takes longer than ``--import-budget`` seconds.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from . import generators
+
+
+SKIP_ERRORS = (ImportError, OSError, SystemExit)
+
+
+def measure(func, *args, repeat: int = 1, setup=None) -> dict:
+    """Runs func(*args) repeat times and returns the best time and the peak memory
+
+    Args:
+        func (callable): the function to be measured
+        repeat (int, optional): number of runs. Defaults to 1.
+        setup (callable, optional): called before each run, not measured. Defaults to None.
+
+    Returns:
+        dict: 'time' (s), 'peak' (MiB) and 'status' ('ok', 'skipped' or 'error')
+    """
+    best = None
+    peak = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except SKIP_ERRORS as e:
+            tracemalloc.stop()
+            return {'status': 'skipped', 'reason': "%s: %s" % (type(e).__name__, e)}
+        except Exception as e:
+            tracemalloc.stop()
+            return {'status': 'error', 'reason': "%s: %s" % (type(e).__name__, e)}
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return {'status': 'ok', 'time': best, 'peak': peak / 2**20}
+
+
+def import_time(module: str = "modelmsh", repeat: int = 5) -> dict:
+    """Measures the time to import a module in a fresh interpreter
+
+    The start-up time of the interpreter itself is subtracted.
+
+    Args:
+        module (str, optional): the module to be imported. Defaults to "modelmsh".
+        repeat (int, optional): number of runs, the best time is kept. Defaults to 5.
+
+    Returns:
+        dict: 'time' (s) and the modules of the heavy dependencies loaded by the import
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    heavy = ['gmsh', 'meshio', 'openpyxl', 'pandas', 'scipy']
+    code = "import sys; import %s; print(','.join(m for m in %r if m in sys.modules))" % (module, heavy)
+
+    def best(args):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable] + args, cwd=root, capture_output=True, text=True)
+            times.append(time.perf_counter() - start)
+        return min(times), out
+
+    bare, _ = best(["-c", "pass"])
+    elapsed, out = best(["-c", code])
+    if out.returncode != 0:
+        return {'status': 'error', 'reason': out.stderr.strip().splitlines()[-1]}
+    loaded = out.stdout.strip()
+    return {'status': 'ok', 'time': max(0.0, elapsed - bare), 'peak': 0.0,
+            'loaded': loaded.split(',') if loaded else []}
+
+
+def _read_s2k(s2k):
+    from modelmsh import sap2000
+    sap2000.read_s2k(s2k)
+
+
+def _to_femix(s2k):
+    from modelmsh import sap2000
+    sap2000.sap2000_handler(s2k).to_femix()
+
+
+def _to_msh(s2k, binary=False, partitions=0):
+    import gmsh
+    from modelmsh import sap2000
+    handler = sap2000.sap2000_handler(s2k)
+    gmsh.initialize()
+    gmsh.option.setNumber("General.Terminal", 0)
+    try:
+        handler.to_msh(binary=binary, partitions=partitions)
+    finally:
+        gmsh.finalize()
+
+
+def msh_output(s2k: str, repeat: int = 1, partitions: int = 4) -> dict:
+    """Compares the ASCII, binary and partitioned .msh output of ``sap2000_handler.to_msh``
+
+    Args:
+        s2k (str): the .s2k file
+        repeat (int, optional): number of runs of each variant. Defaults to 1.
+        partitions (int, optional): number of partitions of the partitioned variant. Defaults to 4.
+
+    Returns:
+        dict: {variant: measure}, with the total 'size' (MiB) of the written files
+    """
+    mshfile = os.path.splitext(s2k)[0] + ".msh"
+    variants = {
+        'msh_ascii': (False, 0),
+        'msh_binary': (True, 0),
+        'msh_partitioned': (False, partitions),
+        'msh_binary_partitioned': (True, partitions),
+        }
+    results = {}
+    for name, (binary, nparts) in variants.items():
+        res = measure(_to_msh, s2k, binary, nparts, repeat=repeat)
+        if res['status'] == 'ok':
+            from modelmsh import gmshsession
+            files = gmshsession.partition_files(mshfile, nparts)
+            res['size'] = sum(os.path.getsize(f) for f in files if os.path.exists(f)) / 2**20
+        results[name] = res
+    return results
+
+
+def _import_mesh(mshfile):
+    from modelmsh import meshx
+    meshx.ofem_handler().import_mesh(mshfile)
+
+
+def _to_gldat(mshfile, gldat):
+    from modelmsh import meshx
+    handler = meshx.ofem_handler()
+    handler.import_mesh(mshfile)
+    handler.to_gldat(gldat)
+
+
+def _ofem_archive(jobname):
+    from modelmsh import ofemlib
+    ofemlib.delete_ofem(jobname)
+    ofemlib.compress_ofem(jobname)
+    ofemlib.get_results_from_ofem(jobname, [ofemlib.DI_CSV, ofemlib.AST_CSV, ofemlib.EST_CSV])
+
+
+def run_size(size: int, folder: str, repeat: int = 1, stages: list = None) -> dict:
+    """Runs all the stages on synthetic models with about size joints (elements for meshes)
+
+    Args:
+        size (int): the size of the models
+        folder (str): folder for the generated files
+        repeat (int, optional): number of runs of each stage. Defaults to 1.
+        stages (list, optional): names of the stages to run. Defaults to all.
+
+    Returns:
+        dict: {stage: measure}
+    """
+    s2k = os.path.join(folder, "synthetic-%d.s2k" % size)
+    mshfile = os.path.join(folder, "synthetic-%d.msh" % size)
+    gldat = os.path.join(folder, "synthetic-%d-mesh.gldat" % size)
+    jobname = os.path.join(folder, "synthetic-%d-results" % size)
+
+    results = {}
+    start = time.perf_counter()
+    counts = generators.synthetic_s2k(s2k, size)
+    results['generate_s2k'] = {'status': 'ok', 'time': time.perf_counter() - start, 'peak': 0.0, 'counts': counts}
+
+    # meshes are made of quadrangles, about one element per joint
+    results['generate_msh'] = measure(generators.synthetic_msh, mshfile, size)
+
+    def results_setup():
+        # the archive is rebuilt from fresh result files on every run
+        generators.synthetic_results(jobname, size, size)
+
+    all_stages = {
+        'read_s2k': (_read_s2k, (s2k,), None),
+        'to_femix': (_to_femix, (s2k,), None),
+        'to_msh': (_to_msh, (s2k,), None),
+        'import_mesh': (_import_mesh, (mshfile,), None),
+        'to_gldat': (_to_gldat, (mshfile, gldat), None),
+        'ofem_archive': (_ofem_archive, (jobname,), results_setup),
+        }
+    for name, (func, args, setup) in all_stages.items():
+        if stages is not None and name not in stages:
+            continue
+        results[name] = measure(func, *args, repeat=repeat, setup=setup)
+    if stages is None or 'msh_output' in stages:
+        results.update(msh_output(s2k, repeat))
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Compares a run with a baseline
+
+    Args:
+        current (dict): the results of the run
+        baseline (dict): the results of the baseline
+        threshold (float): allowed relative increase of time and memory
+
+    Returns:
+        list: the regressions as tuples (size, stage, quantity, baseline, current)
+    """
+    regressions = []
+    for size, stages in current['results'].items():
+        if size == 'startup':
+            # too short for a relative comparison, it is checked against a budget
+            continue
+        for stage, res in stages.items():
+            ref = baseline['results'].get(size, {}).get(stage)
+            if ref is None or res['status'] != 'ok' or ref['status'] != 'ok':
+                continue
+            for key in ['time', 'peak']:
+                if ref[key] > 0 and res[key] > ref[key] * (1.0 + threshold):
+                    regressions.append((size, stage, key, ref[key], res[key]))
+    return regressions
+
+
+def report(run: dict, baseline: dict = None):
+    print("%10s  %-22s %10s %10s  %s" % ("size", "stage", "time (s)", "peak (MiB)", "notes"))
+    for size, stages in run['results'].items():
+        for stage, res in stages.items():
+            if res['status'] != 'ok':
+                print("%10s  %-22s %10s %10s  %s: %s" % (size, stage, "-", "-", res['status'], res['reason']))
+                continue
+            notes = ""
+            ref = None if baseline is None else baseline['results'].get(size, {}).get(stage)
+            if ref is not None and ref['status'] == 'ok' and ref['time'] > 0:
+                notes = "%+.1f%% time" % (100.0*(res['time']/ref['time'] - 1.0))
+            if 'size' in res:
+                notes = ("%.1f MiB written  " % res['size']) + notes
+            print("%10s  %-22s %10.3f %10.1f  %s" % (size, stage, res['time'], res['peak'], notes))
+    return
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the modelmsh converters")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="number of joints of the synthetic models (up to 1000000)")
+    parser.add_argument("--stages", nargs="+", default=None, help="stages to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each stage, the best time is kept")
+    parser.add_argument("--folder", default=None, help="folder for the generated files (default: temporary)")
+    parser.add_argument("--save", default=None, help="saves the results as a baseline JSON file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--import-budget", type=float, default=0.1,
+                        help="maximum time (s) of 'import modelmsh'")
+    args = parser.parse_args(argv)
+
+    run = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': {'startup': {'import_modelmsh': import_time()}},
+        }
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = tmp if args.folder is None else args.folder
+        os.makedirs(folder, exist_ok=True)
+        for size in args.sizes:
+            run['results'][str(size)] = run_size(size, folder, args.repeat, args.stages)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(run, baseline)
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    status = 0
+    startup = run['results']['startup']['import_modelmsh']
+    if startup['status'] == 'ok' and startup['time'] > args.import_budget:
+        print("OVER BUDGET import modelmsh: %.4g s > %.4g s (loads %s)"
+              % (startup['time'], args.import_budget, ", ".join(startup['loaded']) or "nothing heavy"))
+        status = 1
+
+    if baseline is not None:
+        regressions = compare(run, baseline, args.threshold)
+        for size, stage, key, ref, cur in regressions:
+            print("REGRESSION %s %s %s: %.4g -> %.4g" % (size, stage, key, ref, cur))
+        if len(regressions) > 0:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Calibrates the direct/iterative choice of ``modelmsh.solverstrategy``.
+
+Plates (structured quad meshes) and 3D frame lattices of increasing size
+are solved with the direct and the preconditioned iterative solver. The
+factor width (estimated entries per dof) above which the iterative solver
+wins is saved as the crossover of the calibration file (by default the
+bundled ``modelmsh/solver_calibration.json``); if it never wins, the
+crossover is null.
+
+Usage::
+
+    python -m benchmarks.calibrate
+    python -m benchmarks.calibrate --plates 50 100 200 --lattices 8 16 24 --output calibration.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from modelmsh import femsolver, frame, plate, solverstrategy, structured
+
+
+def plate_model(n: int) -> tuple:
+    """Simply supported square plate of n x n quads under a uniform pressure"""
+    mesh = structured.rectangle_mesh((0, 0, 0), 10.0, 10.0, 0.0, 10.0/n, "area4")
+    bounds = np.unique(np.concatenate([mesh['boundaries'][i] for i in range(1, 5)]))
+    codes = np.c_[np.ones(len(bounds)), np.zeros((len(bounds), 2))]
+    xy = mesh['coords'][:, :2]
+    Db, Ds = plate.constitutive(30.0e6, 0.2, 0.2)
+    blocks = plate._blocks(xy, mesh['elements'])
+    ndofs = len(xy)*plate.NDOF
+    K = plate._assemble(blocks, Db, Ds, ndofs)
+    F = np.zeros(ndofs)
+    for gtype, conn, xe, dofs in blocks:
+        F += femsolver.assemble_vector(plate.plate_pressure(xe, gtype, [-10.0]), dofs, ndofs)[:, 0]
+    return K, F, femsolver.fixed_dofs(len(xy), plate.NDOF, (bounds, codes))
+
+
+def lattice_model(n: int) -> tuple:
+    """3D frame lattice of n x n x n bays, fixed at the base, under lateral loads"""
+    points = np.stack(np.meshgrid(*[np.arange(n+1)]*3, indexing='ij'), axis=-1).reshape(-1, 3)*3.0
+    index = np.arange(len(points)).reshape(n+1, n+1, n+1)
+    conn = np.concatenate([np.c_[index[:-1].ravel(), index[1:].ravel()],
+                           np.c_[index[:, :-1].ravel(), index[:, 1:].ravel()],
+                           np.c_[index[:, :, :-1].ravel(), index[:, :, 1:].ravel()]])
+    props = {'E': 30.0e6, 'G': 12.5e6, 'area': 0.09, 'inertia2': 6.75e-4, 'inertia3': 6.75e-4,
+             'torsion': 1.1e-3}
+    K = femsolver.assemble_matrix(frame.frame_stiffness(points.astype(float), conn, props)[0],
+                                  femsolver.element_dofs(conn, frame.NDOF), len(points)*frame.NDOF)
+    base = index[:, :, 0].ravel()
+    F = np.zeros(K.shape[0])
+    F[0::frame.NDOF] = 1.0
+    return K, F, femsolver.fixed_dofs(len(points), frame.NDOF, (base, np.ones((len(base), 6))))
+
+
+def run(name: str, K, F, fixed, calibration: dict) -> dict:
+    """Solves a model with both solvers and returns the estimate and the times"""
+    stats = solverstrategy.estimate(K, fixed)
+    free = np.flatnonzero(~fixed & (K.diagonal() != 0.0))
+    Kff, Fff = K[free][:, free].tocsr(), F[free]
+
+    start = time.perf_counter()
+    direct = femsolver.factorize(Kff)(Fff)
+    stats['direct'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    x, converged = solverstrategy.solve_iterative(Kff, Fff, calibration['tolerance'], calibration)
+    stats['iterative'] = time.perf_counter() - start
+    stats['converged'] = bool(converged)
+    stats['error'] = float(np.abs(x - direct).max() / np.abs(direct).max())
+    stats['model'] = name
+    print("%-14s %8d dofs %8.0f width %8.3f s direct %8.3f s iterative%s" % (
+        name, stats['ndofs'], stats['width'], stats['direct'], stats['iterative'],
+        "" if converged else " (not converged)"))
+    return stats
+
+
+def thresholds(runs: list, calibration: dict) -> dict:
+    """Derives the thresholds from the runs
+
+    The crossover is the smallest factor width above which the iterative
+    solver won every run; if it lost the widest run there is no crossover
+    and the iterative solver is only used above the memory limit.
+    """
+    result = {k: calibration[k] for k in solverstrategy.default_calibration}
+    won = [r['converged'] and r['iterative'] < r['direct'] for r in runs]
+    order = np.argsort([r['width'] for r in runs])[::-1]
+    wins = []
+    for i in order:
+        if not won[i]:
+            break
+        wins.append(runs[i])
+    if len(wins) > 0:
+        result['crossover_width'] = min(r['width'] for r in wins)
+        result['direct_min_dofs'] = min(r['ndofs'] for r in wins)
+    else:
+        result['crossover_width'] = None
+    return result
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibrates the solver choice of modelmsh")
+    parser.add_argument("--plates", type=int, nargs="+", default=[25, 50, 100, 150],
+                        help="divisions of the square plates")
+    parser.add_argument("--lattices", type=int, nargs="+", default=[4, 8, 12, 16],
+                        help="bays of the cubic frame lattices")
+    parser.add_argument("--output", default=solverstrategy.calibration_file, help="calibration JSON file")
+    args = parser.parse_args(argv)
+
+    calibration = dict(solverstrategy.default_calibration)
+    runs = [run("plate %d" % n, *plate_model(n), calibration) for n in args.plates]
+    runs += [run("lattice %d" % n, *lattice_model(n), calibration) for n in args.lattices]
+
+    data = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'runs': runs,
+        'thresholds': thresholds(runs, calibration),
+        }
+    with open(args.output, 'w') as f:
+        json.dump(data, f, indent=2)
+    print("thresholds written to", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Synthetic models for the benchmarks: SAP2000 .s2k files, gmsh meshes and
+femix result files of any size.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _block(fmt: str, *columns) -> str:
+    table = np.column_stack(columns)
+    return (fmt * table.shape[0]) % tuple(table.ravel().tolist())
+
+
+def synthetic_s2k(filename: str, njoints: int, nfloors: int = 4, nsections: int = 5,
+                  ngroups: int = 4, triangles: float = 0.1, seed: int = 0) -> dict:
+    """Writes a SAP2000 .s2k file of a building with about njoints joints
+
+    Each floor is a square grid of joints with frames along x (beams), frames
+    between floors (columns) and a slab of quadrangles, some of them split
+    into two triangles.
+
+    Args:
+        filename (str): the .s2k file to be written
+        njoints (int): the approximate number of joints
+        nfloors (int, optional): the number of floors. Defaults to 4.
+        nsections (int, optional): the number of frame and of area sections. Defaults to 5.
+        ngroups (int, optional): the number of groups. Defaults to 4.
+        triangles (float, optional): the fraction of slab panels split into triangles. Defaults to 0.1.
+        seed (int, optional): seed of the random assignments. Defaults to 0.
+
+    Returns:
+        dict: the number of joints, frames and areas written
+    """
+    rng = np.random.default_rng(seed)
+    n = max(2, int(round(np.sqrt(njoints / nfloors))))
+    i, j, k = np.meshgrid(np.arange(n), np.arange(n), np.arange(nfloors), indexing='ij')
+    joint = 1 + i + n*j + n*n*k
+    joint = joint.ravel()
+    coords = np.column_stack([5.0*i.ravel(), 5.0*j.ravel(), 3.0*(k.ravel()+1)])
+
+    grid = (1 + np.arange(n*n*nfloors)).reshape(nfloors, n, n)
+    beams_i = grid[:, :, :-1].ravel()
+    beams_j = grid[:, :, 1:].ravel()
+    cols_i = grid[:-1].ravel()
+    cols_j = grid[1:].ravel()
+    frame_i = np.concatenate([beams_i, cols_i])
+    frame_j = np.concatenate([beams_j, cols_j])
+    nframes = len(frame_i)
+
+    p1 = grid[:, :-1, :-1].ravel()
+    p2 = grid[:, :-1, 1:].ravel()
+    p3 = grid[:, 1:, 1:].ravel()
+    p4 = grid[:, 1:, :-1].ravel()
+    split = rng.random(len(p1)) < triangles
+    quads = np.column_stack([p1, p2, p3, p4])[~split]
+    tri1 = np.column_stack([p1, p2, p3])[split]
+    tri2 = np.column_stack([p1, p3, p4])[split]
+    tris = np.concatenate([tri1, tri2])
+    nquads = len(quads)
+    nareas = nquads + len(tris)
+
+    framesec = rng.integers(1, nsections+1, nframes)
+    areasec = rng.integers(1, nsections+1, nareas)
+    framegroup = rng.integers(1, ngroups+1, nframes)
+    areagroup = rng.integers(1, ngroups+1, nareas)
+
+    with open(filename, 'w') as f:
+        f.write("File %s was saved on m/d/yy at h:mm:ss\n\n" % filename)
+
+        f.write('TABLE:  "MATERIAL PROPERTIES 02 - BASIC MECHANICAL PROPERTIES"\n')
+        f.write("   Material=C30   UnitWeight=25   UnitMass=2.5   E1=33000000   G12=13750000   U12=0.2   A1=0.00001\n")
+        f.write("   Material=S355   UnitWeight=77   UnitMass=7.85   E1=210000000   G12=80769231   U12=0.3   A1=0.000012\n\n")
+
+        f.write('TABLE:  "JOINT COORDINATES"\n')
+        f.write(_block("   Joint=%d   CoordSys=GLOBAL   CoordType=Cartesian   XorR=%.3f   Y=%.3f   Z=%.3f\n",
+                       joint, coords[:, 0], coords[:, 1], coords[:, 2]))
+        f.write("\n")
+
+        f.write('TABLE:  "CONNECTIVITY - FRAME"\n')
+        f.write(_block("   Frame=%d   JointI=%d   JointJ=%d   IsCurved=No\n",
+                       np.arange(1, nframes+1), frame_i, frame_j))
+        f.write("\n")
+
+        f.write('TABLE:  "CONNECTIVITY - AREA"\n')
+        if nquads > 0:
+            f.write(_block("   Area=%d   NumJoints=4   Joint1=%d   Joint2=%d   Joint3=%d   Joint4=%d\n",
+                           np.arange(1, nquads+1), quads))
+        if len(tris) > 0:
+            f.write(_block("   Area=%d   NumJoints=3   Joint1=%d   Joint2=%d   Joint3=%d\n",
+                           np.arange(nquads+1, nareas+1), tris))
+        f.write("\n")
+
+        f.write('TABLE:  "FRAME PROPS 01 - GENERAL"\n')
+        for s in range(1, nsections+1):
+            f.write("   SectionName=FSEC%d   Material=%s   Shape=Rectangular   t3=%.2f   t2=0.3   Area=%.4f\n"
+                    % (s, "C30" if s % 2 else "S355", 0.3 + 0.1*s, 0.3*(0.3 + 0.1*s)))
+        f.write("\n")
+
+        f.write('TABLE:  "FRAME SECTION ASSIGNMENTS"\n')
+        f.write(_block("   Frame=%d   SectionType=Rectangular   AutoSelect=N.A.   AnalSect=FSEC%d   MatProp=Default\n",
+                       np.arange(1, nframes+1), framesec))
+        f.write("\n")
+
+        f.write('TABLE:  "AREA SECTION PROPERTIES"\n')
+        for s in range(1, nsections+1):
+            f.write("   Section=ASEC%d   Material=C30   MatAngle=0   AreaType=Shell   Type=Shell-Thick   Thickness=%.2f\n"
+                    % (s, 0.15 + 0.05*s))
+        f.write("\n")
+
+        f.write('TABLE:  "AREA SECTION ASSIGNMENTS"\n')
+        f.write(_block("   Area=%d   Section=ASEC%d   MatProp=Default\n", np.arange(1, nareas+1), areasec))
+        f.write("\n")
+
+        f.write('TABLE:  "GROUPS 1 - DEFINITIONS"\n')
+        for g in range(1, ngroups+1):
+            f.write("   GroupName=G%d   Selection=Yes   SectionCut=Yes\n" % g)
+        f.write("\n")
+
+        f.write('TABLE:  "GROUPS 2 - ASSIGNMENTS"\n')
+        f.write(_block("   GroupName=G%d   ObjectType=Frame   ObjectLabel=%d\n", framegroup, np.arange(1, nframes+1)))
+        f.write(_block("   GroupName=G%d   ObjectType=Area   ObjectLabel=%d\n", areagroup, np.arange(1, nareas+1)))
+        f.write("\n")
+
+        f.write("END TABLE DATA\n")
+
+    return {'joints': len(joint), 'frames': nframes, 'areas': nareas}
+
+
+def synthetic_msh(filename: str, nelems: int, elemtype: str = "area4", binary: bool = False) -> dict:
+    """Writes a gmsh .msh file with a structured mesh of about nelems elements
+
+    Args:
+        filename (str): the .msh file to be written
+        nelems (int): the approximate number of elements
+        elemtype (str, optional): the element type, as in ``structured.rectangle_mesh``. Defaults to "area4".
+        binary (bool, optional): writes a binary file. Defaults to False.
+
+    Returns:
+        dict: the number of points and elements written
+    """
+    import meshio
+    from modelmsh import structured
+    from modelmsh._common import gmsh_meshio
+
+    n = max(1, int(round(np.sqrt(nelems))))
+    mesh = structured.rectangle_mesh((0.0, 0.0, 0.0), float(n), float(n), 0.0, 1.0, elemtype)
+    cells = [(gmsh_meshio[t], conn) for t, (_, conn) in mesh['elements'].items()]
+    meshio.write(filename, meshio.Mesh(mesh['coords'], cells), file_format="gmsh", binary=binary)
+    return {'points': len(mesh['coords']), 'elements': sum(len(c) for _, c in cells)}
+
+
+def synthetic_results(jobname: str, npoints: int, nelems: int, ncomb: int = 2, nnode: int = 4, seed: int = 0) -> dict:
+    """Writes femix result files (_di.csv, _avgst.csv and _elnst.csv) with random values
+
+    Args:
+        jobname (str): the name of the job, without extension
+        npoints (int): the number of points
+        nelems (int): the number of elements
+        ncomb (int, optional): the number of combinations. Defaults to 2.
+        nnode (int, optional): the number of nodes per element. Defaults to 4.
+        seed (int, optional): seed of the random values. Defaults to 0.
+
+    Returns:
+        dict: the number of rows of each file
+    """
+    rng = np.random.default_rng(seed)
+    icomb = np.repeat(np.arange(1, ncomb+1), npoints)
+    point = np.tile(np.arange(1, npoints+1), ncomb)
+
+    df = pd.DataFrame({'point': point})
+    for i in range(1, 7):
+        df['disp-%d' % i] = rng.standard_normal(len(df))
+    df['icomb'] = icomb
+    df.to_csv(jobname + '_di.csv', sep=';', index=False)
+
+    df = pd.DataFrame({'point': point})
+    for i in range(1, 6):
+        df['str-%d' % i] = rng.standard_normal(len(df))
+    df['icomb'] = icomb
+    df.to_csv(jobname + '_avgst.csv', sep=';', index=False)
+
+    nrows = nelems*nnode
+    df = pd.DataFrame({
+        'element': np.tile(np.repeat(np.arange(1, nelems+1), nnode), ncomb),
+        'node': np.tile(rng.integers(1, npoints+1, nrows), ncomb),
+        })
+    for i in range(1, 6):
+        df['str-%d' % i] = rng.standard_normal(len(df))
+    df['icomb'] = np.repeat(np.arange(1, ncomb+1), nrows)
+    df.to_csv(jobname + '_elnst.csv', sep=';', index=False)
+
+    return {'di': npoints*ncomb, 'avgst': npoints*ncomb, 'elnst': nrows*ncomb}
@@ -4,19 +4,60 @@ with the following features:
         cgns, gmsh, med, medit, msh, nastran, stl, vtk, vtu
 
 - sap2000: reads SAP2000 files.
+
+The submodules and the public names are imported on first access, so that
+``import modelmsh`` does not load gmsh, meshio or the femix library.
 """
 
 __version__ = "0.1.0"
 
-from . import gmshapp
-from . import sap2000
-from . import femix
-from . import meshx
-from . import meshstruct
-from .sap2000 import sap2000_handler
-from .femix import femix_handler
-from .meshx import ofem_handler
-from .msh import msh_handler
-from .gmshapp import gmshApp
-from .ofemlib import ofemSolver, ofemResults
-from .meshstruct import Slab, Beam
+import importlib
+
+
+_submodules = ['gmshapp', 'gmshsession', 'sap2000', 'femix', 'meshx', 'meshstruct', 'msh', 'ofemlib',
+               'spatial', 'sweep', 'structured', 'export', 'gldat', 'femsolver', 'frame', 'shapes',
+               'plate', 'modal', 'solverstrategy', 'recovery', 'envelope', 'reactions',
+               'gausspoints', 'transfer', 'slabdeck']
+
+_attributes = {
+    'sap2000_handler': 'sap2000',
+    'femix_handler': 'femix',
+    'ofem_handler': 'meshx',
+    'msh_handler': 'msh',
+    'gmshApp': 'gmshapp',
+    'ofemSolver': 'ofemlib',
+    'ofemResults': 'ofemlib',
+    'Slab': 'meshstruct',
+    'Beam': 'meshstruct',
+    'SpatialIndex': 'spatial',
+    'generate_slabs': 'sweep',
+    'generate_beams': 'sweep',
+    'rectangle_mesh': 'structured',
+    'line_mesh': 'structured',
+    'linear_beam_mesh': 'structured',
+    'export_results': 'export',
+    'read_gldat': 'gldat',
+    'solve_frames': 'frame',
+    'solve_plates': 'plate',
+    'nodal_average': 'recovery',
+    'Envelope': 'envelope',
+    'support_resultants': 'reactions',
+    'GaussField': 'gausspoints',
+    'FieldTransfer': 'transfer',
+}
+
+__all__ = _submodules + list(_attributes)
+
+
+def __getattr__(name: str):
+    if name in _submodules:
+        return importlib.import_module("." + name, __name__)
+    if name in _attributes:
+        value = getattr(importlib.import_module("." + _attributes[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,214 @@
+"""Envelopes of the results over the combinations.
+
+The result tables (_di.csv, _avgst.csv and _elnst.csv layouts) are read one
+combination at a time (``ofemlib.iter_results_from_ofem``), so the memory
+only holds the envelope and one combination, whatever the number of
+combinations. For every point (or element node) and component the maximum,
+the minimum and the maximum absolute value are kept with the combination
+that governs them and, optionally, the concurrent values of the other
+components in that combination.
+
+Example::
+
+    env = envelope.envelope_from_ofem(jobname, ofemlib.EST_CSV, concurrent=True)
+    env.table()             # 'str-1-max', 'str-1-max-comb', ... per element node
+    env.concurrent_table()  # all the components in each governing combination
+"""
+
+import numpy as np
+import pandas as pd
+from .ofemlib import EST_CSV, iter_results_from_ofem
+
+
+def key_columns(df: pd.DataFrame) -> list:
+    """Returns the columns identifying the rows of a result table
+
+    Args:
+        df (pd.DataFrame): a result table
+
+    Returns:
+        list: ['element', 'node'] for element-node tables, ['point'] otherwise
+    """
+    return ['element', 'node'] if 'element' in df.columns else ['point']
+
+
+def _codes(df: pd.DataFrame, keys: list) -> np.ndarray:
+    # one int64 code per row, element numbers in the high 32 bits
+    codes = df[keys[0]].values.astype(np.int64)
+    if len(keys) > 1:
+        codes = (codes << 32) | df[keys[1]].values.astype(np.int64)
+    return codes
+
+
+class Envelope:
+    """Maximum, minimum and maximum absolute values over the combinations
+
+    The combinations are added one at a time with ``update``; within a
+    combination each point (or element node) appears once, as the solver
+    writes the tables.
+    """
+
+    bounds = ['max', 'min', 'absmax']
+
+    def __init__(self, keys: list, columns: list, concurrent: bool = False):
+        """Starts an empty envelope
+
+        Args:
+            keys (list): the columns identifying the rows, see ``key_columns``
+            columns (list): the components, e.g. ['str-1', 'str-2', ...]
+            concurrent (bool, optional): keep the values of all the components in the governing
+                combinations. Defaults to False.
+        """
+        self.keys = list(keys)
+        self.columns = list(columns)
+        self.concurrent = concurrent
+        ncomp = len(self.columns)
+        self.codes = np.empty(0, dtype=np.int64)
+        # (nkey, ncomp) per bound, and (nkey, ncomp, ncomp) concurrent values
+        self.values = {b: np.empty((0, ncomp)) for b in self.bounds}
+        self.combs = {b: np.empty((0, ncomp), dtype=np.int64) for b in self.bounds}
+        self.others = {b: np.empty((0, ncomp, ncomp)) for b in self.bounds} if concurrent else None
+        self.ncomb = 0
+        return
+
+    def _grow(self, codes: np.ndarray):
+        # adds the rows of keys seen for the first time
+        new = np.setdiff1d(codes, self.codes)
+        if len(new) == 0:
+            return
+        merged = np.union1d(self.codes, new)
+        old = np.searchsorted(merged, self.codes)
+        ncomp = len(self.columns)
+        start = {'max': -np.inf, 'min': np.inf, 'absmax': -np.inf}
+        for b in self.bounds:
+            values = np.full((len(merged), ncomp), start[b])
+            values[old] = self.values[b]
+            self.values[b] = values
+            combs = np.zeros((len(merged), ncomp), dtype=np.int64)
+            combs[old] = self.combs[b]
+            self.combs[b] = combs
+            if self.concurrent:
+                others = np.full((len(merged), ncomp, ncomp), np.nan)
+                others[old] = self.others[b]
+                self.others[b] = others
+        self.codes = merged
+        return
+
+    def update(self, icomb: int, df: pd.DataFrame):
+        """Adds a combination to the envelope
+
+        Args:
+            icomb (int): the combination
+            df (pd.DataFrame): its rows of the result table
+        """
+        codes = _codes(df, self.keys)
+        self._grow(codes)
+        rows = np.searchsorted(self.codes, codes)
+        current = df[self.columns].values.astype(float)
+        for b in self.bounds:
+            if b == 'max':
+                value, better = current, current > self.values[b][rows]
+            elif b == 'min':
+                value, better = current, current < self.values[b][rows]
+            else:
+                value = np.abs(current)
+                better = value > self.values[b][rows]
+            self.values[b][rows] = np.where(better, value, self.values[b][rows])
+            self.combs[b][rows] = np.where(better, icomb, self.combs[b][rows])
+            if self.concurrent:
+                r, c = np.nonzero(better)
+                self.others[b][rows[r], c] = current[r]
+        self.ncomb += 1
+        return
+
+    def _key_frame(self) -> pd.DataFrame:
+        if len(self.keys) > 1:
+            return pd.DataFrame({self.keys[0]: self.codes >> 32, self.keys[1]: self.codes & 0xFFFFFFFF})
+        return pd.DataFrame({self.keys[0]: self.codes})
+
+    def table(self) -> pd.DataFrame:
+        """Returns the envelope
+
+        Returns:
+            pd.DataFrame: the key columns and, for each component c, 'c-max', 'c-max-comb',
+                'c-min', 'c-min-comb', 'c-absmax' and 'c-absmax-comb'
+        """
+        df = self._key_frame()
+        data = {}
+        for i, c in enumerate(self.columns):
+            for b in self.bounds:
+                data["%s-%s" % (c, b)] = self.values[b][:, i]
+                data["%s-%s-comb" % (c, b)] = self.combs[b][:, i]
+        return pd.concat([df, pd.DataFrame(data)], axis=1)
+
+    def concurrent_table(self) -> pd.DataFrame:
+        """Returns the values of all the components in the governing combinations
+
+        Raises:
+            ValueError: the envelope was created without concurrent values
+
+        Returns:
+            pd.DataFrame: the key columns, 'component', 'bound' ('max', 'min' or 'absmax'),
+                'icomb' (the governing combination) and the components
+        """
+        if not self.concurrent:
+            raise ValueError("The envelope was created without concurrent values.")
+        keys = self._key_frame()
+        ncomp = len(self.columns)
+        frames = []
+        for b in self.bounds:
+            df = keys.loc[keys.index.repeat(ncomp)].reset_index(drop=True)
+            df['component'] = np.tile(self.columns, len(keys))
+            df['bound'] = b
+            df['icomb'] = self.combs[b].ravel()
+            values = pd.DataFrame(self.others[b].reshape(-1, ncomp), columns=self.columns)
+            frames.append(pd.concat([df, values], axis=1))
+        return pd.concat(frames, ignore_index=True)
+
+
+def envelope(results, combinations: list = None, concurrent: bool = False) -> Envelope:
+    """Computes the envelope of a result table
+
+    Args:
+        results (pd.DataFrame | iterable): a result table with all the combinations, or
+            (icomb, rows) pairs as yielded by ``ofemlib.iter_results_from_ofem``
+        combinations (list, optional): the combinations included. Defaults to all.
+        concurrent (bool, optional): keep the concurrent values. Defaults to False.
+
+    Raises:
+        ValueError: no combination was found
+
+    Returns:
+        Envelope: the envelope
+    """
+    if isinstance(results, pd.DataFrame):
+        results = results.groupby('icomb', sort=False)
+    wanted = None if combinations is None else set(combinations)
+    env = None
+    for icomb, df in results:
+        if wanted is not None and icomb not in wanted:
+            continue
+        if env is None:
+            columns = [c for c in df.columns if c.startswith('str-') or c.startswith('disp-')]
+            env = Envelope(key_columns(df), columns, concurrent)
+        env.update(int(icomb), df)
+    if env is None:
+        raise ValueError("No combination to envelope.")
+    return env
+
+
+def envelope_from_ofem(jobname: str, code: int = EST_CSV, combinations: list = None, concurrent: bool = False,
+                       chunksize: int = 100000) -> Envelope:
+    """Computes the envelope of a result table of a femix job, out of core
+
+    Args:
+        jobname (str): the job name (path without extension)
+        code (int, optional): the result table (DI_CSV, AST_CSV or EST_CSV). Defaults to EST_CSV.
+        combinations (list, optional): the combinations included. Defaults to all.
+        concurrent (bool, optional): keep the concurrent values. Defaults to False.
+        chunksize (int, optional): number of rows parsed at once. Defaults to 100000.
+
+    Returns:
+        Envelope: the envelope
+    """
+    return envelope(iter_results_from_ofem(jobname, code, chunksize), combinations, concurrent)
@@ -0,0 +1,336 @@
+"""Exports meshes and solver results to ParaView.
+
+The results of a job are streamed from its .ofem archive one combination at a
+time, so memory is bounded by the fields of one combination. Each combination
+becomes a time step:
+
+- ``.pvd``: a collection of VTU files, one per combination, with the data
+  appended as raw binary. VTU files can not reference an external mesh, so
+  each one holds the points and cells again (converted to VTK once).
+- ``.xdmf``: the mesh is written once and the fields of each combination are
+  appended to an HDF5 file (needs h5py).
+
+Meshes are given as in ``structured`` and ``msh.getMeshArrays``: point
+coordinates (npoin, 3) and {gmsh type: connectivity as row indices of the
+points}. Result point numbers are 1 based row numbers of the points.
+"""
+
+import os
+import pathlib
+import numpy as np
+from . import ofemlib
+
+
+# gmsh type: VTK cell type
+gmsh_vtk = {
+    15: 1,  # vertex
+    1: 3,   # line
+    2: 5,   # triangle
+    3: 9,   # quad
+    4: 10,  # tetra
+    5: 12,  # hexahedron
+    6: 13,  # wedge
+    7: 14,  # pyramid
+    8: 21,  # line3
+    9: 22,  # triangle6
+    11: 24, # tetra10
+    16: 23, # quad8
+    17: 25, # hexahedron20
+    10: 28, # quad9
+}
+
+# VTK node order as positions in the gmsh element, where they differ
+gmsh_vtk_order = {
+    11: np.array([0, 1, 2, 3, 4, 5, 6, 7, 9, 8]),
+    17: np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 11, 13, 9, 16, 18, 19, 17, 10, 12, 14, 15]),
+}
+
+# gmsh type: XDMF topology type
+gmsh_xdmf = {
+    15: 1,  # polyvertex
+    1: 2,   # polyline
+    2: 4,   # triangle
+    3: 5,   # quadrilateral
+    4: 6,   # tetrahedron
+    7: 7,   # pyramid
+    6: 8,   # wedge
+    5: 9,   # hexahedron
+    8: 34,  # edge_3
+    9: 36,  # triangle_6
+    16: 37, # quadrilateral_8
+    11: 38, # tetrahedron_10
+    17: 48, # hexahedron_20
+    10: 35, # quadrilateral_9
+}
+
+# number of components: XDMF attribute type
+xdmf_attributes = {1: "Scalar", 3: "Vector", 6: "Tensor6", 9: "Tensor"}
+
+# result table: (prefix of the columns, name and number of components of each field)
+result_fields = {
+    ofemlib.DI_CSV: ('disp-', [("displacement", 3), ("rotation", 3)]),
+    ofemlib.AST_CSV: ('str-', [("stress", None)]),
+}
+
+
+def _vtk_cells(cells: dict) -> tuple:
+    connectivity, offsets, types = [], [], []
+    last = 0
+    for gtype, conn in cells.items():
+        if gtype not in gmsh_vtk:
+            raise ValueError("gmsh element type %d has no VTK equivalent." % gtype)
+        conn = np.asarray(conn).reshape(len(conn), -1)
+        if gtype in gmsh_vtk_order:
+            conn = conn[:, gmsh_vtk_order[gtype]]
+        connectivity.append(conn.ravel())
+        offsets.append(last + conn.shape[1]*np.arange(1, len(conn)+1))
+        last += conn.size
+        types.append(np.full(len(conn), gmsh_vtk[gtype]))
+    if len(connectivity) == 0:
+        return np.empty(0, dtype='<i8'), np.empty(0, dtype='<i8'), np.empty(0, dtype='u1')
+    return (np.concatenate(connectivity).astype('<i8'), np.concatenate(offsets).astype('<i8'),
+            np.concatenate(types).astype('u1'))
+
+
+def write_vtu(filename: str, points, cells: dict, point_data: dict = None, cell_data: dict = None) -> str:
+    """Writes an unstructured grid as a VTU file with the data appended as raw binary
+
+    Args:
+        filename (str): the .vtu file to be written
+        points (array_like): the coordinates of the points (npoin, 3)
+        cells (dict): {gmsh type: connectivity (nelem, nnode) as row indices of points}
+        point_data (dict, optional): {name: array (npoin,) or (npoin, ncomp)}. Defaults to None.
+        cell_data (dict, optional): {name: array (ncell,) or (ncell, ncomp)}, cells in the order
+            of cells. Defaults to None.
+
+    Returns:
+        str: the name of the file
+    """
+    return _write_vtu(filename, np.asarray(points, dtype='<f8').reshape(-1, 3), _vtk_cells(cells),
+                      point_data, cell_data)
+
+
+def _write_vtu(filename: str, points: np.ndarray, vtkcells: tuple, point_data: dict, cell_data: dict) -> str:
+    # write_vtu with the cells already converted by _vtk_cells
+    connectivity, offsets, types = vtkcells
+    blocks = []
+
+    def data_array(name, values, ncomp=None):
+        values = np.ascontiguousarray(values)
+        if values.dtype.kind == 'f':
+            values, vtype = values.astype('<f8'), "Float64"
+        elif values.dtype.kind == 'u' and values.itemsize == 1:
+            vtype = "UInt8"
+        else:
+            values, vtype = values.astype('<i8'), "Int64"
+        if ncomp is None:
+            ncomp = 1 if values.ndim == 1 else values.shape[1]
+        offset = sum(8 + b.nbytes for b in blocks)
+        blocks.append(values)
+        return ('<DataArray type="%s" Name="%s" NumberOfComponents="%d" format="appended" offset="%d"/>\n'
+                % (vtype, name, ncomp, offset))
+
+    xml = ['<?xml version="1.0"?>\n',
+           '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n',
+           '<UnstructuredGrid>\n',
+           '<Piece NumberOfPoints="%d" NumberOfCells="%d">\n' % (len(points), len(types))]
+    xml.append('<PointData>\n')
+    for name, values in (point_data or {}).items():
+        xml.append(data_array(name, values))
+    xml.append('</PointData>\n<CellData>\n')
+    for name, values in (cell_data or {}).items():
+        xml.append(data_array(name, values))
+    xml.append('</CellData>\n<Points>\n')
+    xml.append(data_array("Points", points, 3))
+    xml.append('</Points>\n<Cells>\n')
+    xml.append(data_array("connectivity", connectivity))
+    xml.append(data_array("offsets", offsets))
+    xml.append(data_array("types", types))
+    xml.append('</Cells>\n</Piece>\n</UnstructuredGrid>\n<AppendedData encoding="raw">\n_')
+
+    with open(filename, 'wb') as file:
+        file.write("".join(xml).encode())
+        for values in blocks:
+            file.write(np.uint64(values.nbytes).tobytes())
+            file.write(values.tobytes())
+        file.write(b'\n</AppendedData>\n</VTKFile>\n')
+    return filename
+
+
+def write_pvd(filename: str, steps: list) -> str:
+    """Writes a ParaView collection of files as time steps
+
+    Args:
+        filename (str): the .pvd file to be written
+        steps (list): [(time, file name), ...]; the names are written relative to the .pvd file
+
+    Returns:
+        str: the name of the file
+    """
+    folder = pathlib.Path(filename).resolve().parent
+    with open(filename, 'w') as file:
+        file.write('<?xml version="1.0"?>\n')
+        file.write('<VTKFile type="Collection" version="1.0" byte_order="LittleEndian">\n<Collection>\n')
+        for time, name in steps:
+            name = os.path.relpath(pathlib.Path(name).resolve(), folder)
+            file.write('<DataSet timestep="%g" group="" part="0" file="%s"/>\n' % (time, pathlib.Path(name).as_posix()))
+        file.write('</Collection>\n</VTKFile>\n')
+    return filename
+
+
+def _point_fields(code: int, df, npoin: int) -> dict:
+    prefix, fields = result_fields[code]
+    columns = [c for c in df.columns if c.startswith(prefix)]
+    rows = df['point'].values - 1
+    data = {}
+    first = 0
+    for name, ncomp in fields:
+        cols = columns[first:] if ncomp is None else columns[first:first+ncomp]
+        first += len(cols)
+        if len(cols) == 0:
+            continue
+        values = np.zeros((npoin, len(cols)))
+        values[rows] = df[cols].values
+        data[name] = values
+    return data
+
+
+def _xdmf_topology(cells: dict) -> tuple:
+    # mixed topology: the XDMF type of each cell followed by its nodes
+    # (and by the number of nodes for polyvertices and polylines)
+    topology = []
+    ncells = 0
+    for gtype, conn in cells.items():
+        if gtype not in gmsh_xdmf:
+            raise ValueError("gmsh element type %d has no XDMF equivalent." % gtype)
+        conn = np.asarray(conn).reshape(len(conn), -1)
+        if gtype in gmsh_vtk_order:
+            conn = conn[:, gmsh_vtk_order[gtype]]
+        head = [np.full(len(conn), gmsh_xdmf[gtype])]
+        if gtype in [1, 15]:
+            head.append(np.full(len(conn), conn.shape[1]))
+        topology.append(np.column_stack(head + [conn]).ravel())
+        ncells += len(conn)
+    topology = np.concatenate(topology) if len(topology) > 0 else np.empty(0, dtype=np.int64)
+    return topology.astype(np.int64), ncells
+
+
+def _xdmf_item(h5name: str, dataset: str, values) -> str:
+    dtype = "Float" if values.dtype.kind == 'f' else "Int"
+    return ('<DataItem DataType="%s" Precision="8" Dimensions="%s" Format="HDF">%s:/%s</DataItem>'
+            % (dtype, " ".join(str(d) for d in values.shape), h5name, dataset))
+
+
+def write_xdmf(filename: str, points, cells: dict, steps) -> str:
+    """Writes a mesh and a time series of point fields as XDMF with the data in HDF5
+
+    The mesh is stored once in filename.h5 and shared by all the time steps;
+    the fields are written to the HDF5 file as the steps are produced.
+
+    Args:
+        filename (str): the .xdmf file to be written
+        points (array_like): the coordinates of the points (npoin, 3)
+        cells (dict): {gmsh type: connectivity (nelem, nnode) as row indices of points}
+        steps (iterable): (time, {name: array (npoin,) or (npoin, ncomp)}) for each step
+
+    Returns:
+        str: the name of the file
+    """
+    import h5py
+    path = pathlib.Path(filename)
+    h5name = path.stem + ".h5"
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    topology, ncells = _xdmf_topology(cells)
+
+    grids = []
+    with h5py.File(path.with_name(h5name), 'w') as h5:
+        h5.create_dataset("points", data=points)
+        h5.create_dataset("cells", data=topology)
+        mesh = ('<Geometry GeometryType="XYZ">%s</Geometry>\n'
+                '<Topology TopologyType="Mixed" NumberOfElements="%d">%s</Topology>\n'
+                % (_xdmf_item(h5name, "points", points), ncells, _xdmf_item(h5name, "cells", topology)))
+        for istep, (time, data) in enumerate(steps):
+            grid = ['<Grid Name="step %d" GridType="Uniform">\n' % istep, '<Time Value="%g"/>\n' % time, mesh]
+            for name, values in data.items():
+                values = np.asarray(values)
+                ncomp = 1 if values.ndim == 1 else values.shape[1]
+                dataset = "step%d/%s" % (istep, name)
+                h5.create_dataset(dataset, data=values)
+                grid.append('<Attribute Name="%s" AttributeType="%s" Center="Node">%s</Attribute>\n'
+                            % (name, xdmf_attributes.get(ncomp, "Matrix"), _xdmf_item(h5name, dataset, values)))
+            grid.append('</Grid>\n')
+            grids.append("".join(grid))
+
+    with open(filename, 'w') as file:
+        file.write('<?xml version="1.0"?>\n<Xdmf Version="3.0">\n<Domain>\n')
+        file.write('<Grid Name="results" GridType="Collection" CollectionType="Temporal">\n')
+        file.writelines(grids)
+        file.write('</Grid>\n</Domain>\n</Xdmf>\n')
+    return filename
+
+
+def iter_result_fields(jobname: str, npoin: int, codes: list = None, chunksize: int = 100000):
+    """Reads the point fields of a job one combination at a time
+
+    Args:
+        jobname (str): the name of the job, without extension
+        npoin (int): the number of points of the mesh
+        codes (list, optional): the result tables, DI_CSV and/or AST_CSV. Defaults to both.
+        chunksize (int, optional): number of rows of the tables parsed at once. Defaults to 100000.
+
+    Yields:
+        tuple: (icomb, {field name: array (npoin, ncomp)})
+    """
+    if codes is None:
+        codes = list(result_fields)
+    tables = {code: ofemlib.iter_results_from_ofem(jobname, code, chunksize) for code in codes}
+    current = {code: next(table, None) for code, table in tables.items()}
+    while any(item is not None for item in current.values()):
+        icomb = min(item[0] for item in current.values() if item is not None)
+        data = {}
+        for code, item in current.items():
+            if item is not None and item[0] == icomb:
+                data.update(_point_fields(code, item[1], npoin))
+                current[code] = next(tables[code], None)
+        yield icomb, data
+    return
+
+
+def export_results(filename: str, points, cells: dict, jobname: str, codes: list = None,
+                   chunksize: int = 100000) -> str:
+    """Exports a mesh with the results of every combination as time steps
+
+    Args:
+        filename (str): the .pvd or .xdmf file to be written; the VTU files of a .pvd
+            collection are written next to it as name_0001.vtu, ..., each with a copy of
+            the mesh, while .xdmf stores the mesh once
+        points (array_like): the coordinates of the points (npoin, 3)
+        cells (dict): {gmsh type: connectivity (nelem, nnode) as row indices of points}
+        jobname (str): the name of the job with the results, without extension
+        codes (list, optional): the result tables, DI_CSV and/or AST_CSV. Defaults to both.
+        chunksize (int, optional): number of rows of the tables parsed at once. Defaults to 100000.
+
+    Raises:
+        ValueError: unknown file format
+
+    Returns:
+        str: the name of the file
+    """
+    path = pathlib.Path(filename)
+    suffix = path.suffix.lower()
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    fields = iter_result_fields(jobname, len(points), codes, chunksize)
+
+    if suffix == ".pvd":
+        steps = []
+        vtkcells = _vtk_cells(cells)
+        for icomb, data in fields:
+            name = str(path.with_name("%s_%04d.vtu" % (path.stem, icomb)))
+            _write_vtu(name, points, vtkcells, data, None)
+            steps.append((icomb, name))
+        write_pvd(filename, steps)
+    elif suffix == ".xdmf":
+        write_xdmf(filename, points, cells, fields)
+    else:
+        raise ValueError("Export format must be .pvd or .xdmf")
+    return filename
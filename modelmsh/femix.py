@@ -1,6 +1,3 @@
-import meshio
-import gmsh
-import openpyxl
 import numpy as np
 import pandas as pd
 import pathlib
@@ -10,104 +7,107 @@ import timeit
 from . import ofemlib
 
 
+# femix element types grouped by the shape of their elements
+femix_families = {
+    1: "area", 2: "area", 3: "area", 5: "area", 6: "area", 9: "area", 10: "area",
+    4: "solid",
+    7: "line", 8: "line", 13: "line", 14: "line", 15: "line", 16: "line",
+}
+
+# gmsh type: (femix type, nnode, dimension, permutation)
+# the permutation gives the gmsh node order as positions in the femix element,
+# femix lists the corner and mid-side nodes of quadratic elements around the boundary
+femix_gmsh_types = {
+    1: (7, 2, 1, [0, 1]),
+    8: (7, 3, 1, [0, 2, 1]),
+    2: (9, 3, 2, [0, 1, 2]),
+    9: (9, 6, 2, [0, 2, 4, 1, 3, 5]),
+    3: (6, 4, 2, [0, 1, 2, 3]),
+    16: (6, 8, 2, [0, 2, 4, 6, 1, 3, 5, 7]),
+    10: (6, 9, 2, [0, 2, 4, 6, 1, 3, 5, 7, 8]),
+    5: (4, 8, 3, list(range(8))),
+    17: (4, 20, 3, list(range(20))),
+    12: (4, 27, 3, list(range(27))),
+}
+
+# (family, nnode): gmsh type
+femix_gmsh = {(femix_families[ftype], nn): gtype for gtype, (ftype, nn, _, _) in femix_gmsh_types.items()}
+
+femix_to_gmsh_order = {gtype: np.array(perm) for gtype, (_, _, _, perm) in femix_gmsh_types.items()}
+gmsh_to_femix_order = {gtype: np.argsort(perm) for gtype, perm in femix_to_gmsh_order.items()}
+
+
+def femix_to_gmsh_nodes(code: int, nnode: int, lnods):
+    """Converts a block of femix elements of the same type to gmsh
+
+    Args:
+        code (int): the femix element type
+        nnode (int): the number of nodes of the elements
+        lnods (array_like): the nodes of the elements, (nelem, nnode) in femix order
+
+    Returns:
+        tuple: the gmsh type, its dimension and the nodes (nelem, nnode) in gmsh order;
+            unknown elements are returned as points (15, 0) with their nodes unchanged
+    """
+    lnods = np.asarray(lnods).reshape(-1, nnode)
+    gtype = femix_gmsh.get((femix_families.get(code), nnode))
+    if gtype is None:
+        return 15, 0, lnods # POINT
+    return gtype, femix_gmsh_types[gtype][2], lnods[:, femix_to_gmsh_order[gtype]]
+
+
+def gmsh_to_femix_nodes(code: int, lnods):
+    """Converts a block of gmsh elements of the same type to femix
+
+    Args:
+        code (int): the gmsh element type
+        lnods (array_like): the nodes of the elements, (nelem, nnode) in gmsh order
+
+    Raises:
+        ValueError: gmsh element type without femix equivalent
+
+    Returns:
+        tuple: the femix type, the number of nodes and the nodes (nelem, nnode) in femix order
+    """
+    if code not in femix_gmsh_types:
+        raise ValueError("gmsh element type %d has no femix equivalent." % code)
+    ftype, nn, _, _ = femix_gmsh_types[code]
+    lnods = np.asarray(lnods).reshape(-1, nn)
+    return ftype, nn, lnods[:, gmsh_to_femix_order[code]]
+
+
 def gmsh2femix(code: int, lnods: list):
-    ln = []
-    if code == 1: 
-        return 7, 2, lnods
-    if code == 2: 
-        return 9, 3, lnods
-    if code == 3: 
-        return 6, 4, lnods
-    if code == 5: 
-        return 4, 8, lnods
-    if code == 8: 
-        return 7, 2, lnods
-    if code == 8: 
-        ln[0] = lnods[0]
-        ln[1] = lnods[3]
-        ln[2] = lnods[1]
-        ln[3] = lnods[4]
-        ln[4] = lnods[2]
-        ln[5] = lnods[5]
-        return 7, 2, ln
-    if code == 10: 
-        ln[0] = lnods[0]
-        ln[1] = lnods[4]
-        ln[2] = lnods[1]
-        ln[3] = lnods[5]
-        ln[4] = lnods[2]
-        ln[5] = lnods[6]
-        ln[6] = lnods[3]
-        ln[7] = lnods[7]
-        ln[8] = lnods[8]
-        return 6, 9, lnods
-    if code == 12: 
-        return 4, 27, lnods
-    if code == 16: 
-        ln[0] = lnods[0]
-        ln[1] = lnods[4]
-        ln[2] = lnods[1]
-        ln[3] = lnods[5]
-        ln[4] = lnods[2]
-        ln[5] = lnods[6]
-        ln[6] = lnods[3]
-        ln[7] = lnods[7]
-        return 6, 8, lnods
-    if code == 17: 
-        return 4, 20, lnods
+    ftype, nn, ln = gmsh_to_femix_nodes(code, lnods)
+    return ftype, nn, ln[0].tolist()
 
 
 def femix2gmsh(code: int, nnode: int, lnods: list):
-    ln = []
-    if code == 1 or code == 2 or code == 3 or code == 5 or code == 6 or code == 9 or code == 10:
-        if nnode == 3: 
-            return 2, 2, lnods
-        if nnode == 4: 
-            return 3, 2, lnods
-        if nnode == 6: 
-            ln[0] = lnods[0]
-            ln[1] = lnods[2]
-            ln[2] = lnods[4]
-            ln[3] = lnods[1]
-            ln[4] = lnods[3]
-            ln[5] = lnods[5]
-            return 9, 2, ln
-        if nnode == 8:
-            ln[0] = lnods[0]
-            ln[1] = lnods[2]
-            ln[2] = lnods[4]
-            ln[3] = lnods[6]
-            ln[4] = lnods[1]
-            ln[5] = lnods[3]
-            ln[6] = lnods[5]
-            ln[7] = lnods[7]
-            return 16, 2, ln
-        if nnode == 9: 
-            ln[0] = lnods[0]
-            ln[1] = lnods[2]
-            ln[2] = lnods[4]
-            ln[3] = lnods[6]
-            ln[4] = lnods[1]
-            ln[5] = lnods[3]
-            ln[6] = lnods[5]
-            ln[7] = lnods[7]
-            ln[8] = lnods[8]
-            return 10, 2, ln
-    elif code == 4:
-        if nnode == 8: return 5, 3, lnods
-        if nnode == 20: 
-            return 17, 3, lnods
-        if nnode == 27: 
-            return 12, 3, lnods
-    elif code == 7 or code == 8 or code == 13 or code == 14 or code == 15 or code == 16:
-        if nnode == 2: return 1, 1, lnods
-        if nnode == 3: 
-            ln[0] = lnods[0]
-            ln[1] = lnods[2]
-            ln[2] = lnods[1]
-            return 8, 1, ln
-    else:
-        return 15, 0 # POINT
+    gtype, ndim, ln = femix_to_gmsh_nodes(code, nnode, lnods)
+    return gtype, ndim, ln[0].tolist()
+
+
+def s3dx_gmsh_blocks(blocks: dict) -> tuple:
+    """Converts the element blocks of a .s3dx file to gmsh element blocks
+
+    Args:
+        blocks (dict): {(femix type, nnode): (element numbers, element nodes)}
+
+    Returns:
+        tuple: lists of the dimensions, gmsh types, element numbers and flat node lists of the blocks
+    """
+    ndims, types, elems, lnode = [], [], [], []
+    for (ty, nn), (numbers, nodes) in blocks.items():
+        code, ndim, ln = femix_to_gmsh_nodes(ty, nn, np.array(nodes, dtype=np.int64))
+        if code in types:
+            index = types.index(code)
+            elems[index] = np.concatenate([elems[index], numbers])
+            lnode[index] = np.concatenate([lnode[index], ln.ravel()])
+        else:
+            types.append(code)
+            ndims.append(int(ndim))
+            elems.append(np.array(numbers, dtype=np.int64))
+            lnode.append(ln.ravel())
+    return ndims, types, elems, lnode
 
 
 LINE_INTERFACE = 11
@@ -135,7 +135,17 @@ class femix_handler:
         return nodes, values
 
 
-    def read_s3dx(self, filename: str):
+    def read_s3dx(self, filename: str, binary: bool = False, partitions: int = 0):
+        """Reads a femix .s3dx file and writes its mesh as filename.msh
+
+        Args:
+            filename (str): the name of the .s3dx file
+            binary (bool, optional): writes a binary MSH 4.1 file. Defaults to False.
+            partitions (int, optional): if > 1, partitions the mesh and writes one file per
+                partition. Defaults to 0.
+        """
+        import gmsh
+        from . import gmshsession
         with open(filename, 'r') as f:
             title = f.readline()
 
@@ -148,27 +158,15 @@ class femix_handler:
 
                 nelems, nnodes, nspec = f.readline().strip().split()
 
-                elems = []
-                types = []
-                lnode = []
-                ndims = []
+                blocks = {}
                 for i in range(int(nelems)):
                     lin = f.readline().strip().split()
                     # n, ty, nn, ln = f.readline().strip().split()
-                    n  = int(lin[0])
-                    ty = int(lin[1])
                     nn = int(lin[2])
-                    ln = lin[-nn:]
-                    code, ndim, ln = femix2gmsh(ty, nn, ln)
-                    if code not in types:
-                        types.append(code)
-                        elems.append([n])
-                        lnode.append(ln)
-                        ndims.append(int(ndim))
-                    else:
-                        index = types.index(code)
-                        lnode[index].extend(ln)
-                        elems[index].append(n)
+                    numbers, nodes = blocks.setdefault((int(lin[1]), nn), ([], []))
+                    numbers.append(int(lin[0]))
+                    nodes.append(lin[-nn:])
+                ndims, types, elems, lnode = s3dx_gmsh_blocks(blocks)
 
                 nodes = []
                 coord = []
@@ -182,50 +180,49 @@ class femix_handler:
                     lin = f.readline().strip().split()
                     specs.append(int(lin[1]))
 
-        gmsh.initialize()
+        name = title.strip()
+        with gmshsession.model(name, clear=True, keep=False):
+            for i in range(len(elems)):
+                tag = gmsh.model.addDiscreteEntity(ndims[i], -1)
+                gmsh.model.mesh.addNodes(ndims[i], tag, nodes, coord)
+                gmsh.model.mesh.addElements(ndims[i], tag, [types[i]], [elems[i]], [lnode[i]])
 
-        gmsh.model.add(title)
-        for i in range(len(elems)):
-            tag = gmsh.model.addDiscreteEntity(ndims[i], -1)
-            gmsh.model.mesh.addNodes(ndims[i], tag, nodes, coord)
-            gmsh.model.mesh.addElements(ndims[i], tag, [types[i]], [elems[i]], [lnode[i]])
+            # tag = gmsh.model.addDiscreteEntity(0, -1)
+            # gmsh.model.mesh.addNodes(0, tag, nodes, coord)
+            # gmsh.model.mesh.addElements(0, tag, [15], [[i for i in range(1, int(nspec)+1)]], [specs])
 
-        # tag = gmsh.model.addDiscreteEntity(0, -1)
-        # gmsh.model.mesh.addNodes(0, tag, nodes, coord)
-        # gmsh.model.mesh.addElements(0, tag, [15], [[i for i in range(1, int(nspec)+1)]], [specs])
-
-        gmsh.write(filename + ".msh")
-        gmsh.finalize()
+            gmshsession.write_model(name, filename + ".msh", binary, partitions=partitions)
         return ndims, types, elems, lnode, nodes, coord, specs
 
 
     def read_msh(self, filename: str):
-        gmsh.initialize()
-        gmsh.open(filename)
+        import meshio
+        import gmsh
+        from . import gmshsession
+        name = pathlib.Path(filename).stem
         mesh = meshio.read(filename)
 
-        # 1) store the mesh
-        m = {}
-        for e in gmsh.model.getEntities():
-            m[e] = (gmsh.model.getBoundary([e]),
-                    gmsh.model.mesh.getNodes(e[0], e[1]),
-                    gmsh.model.mesh.getElements(e[0], e[1]))
+        # 1) store the mesh; merging (not opening) keeps the other models of the session
+        with gmshsession.model(name, clear=True, keep=False):
+            gmsh.merge(filename)
+            m = {}
+            for e in gmsh.model.getEntities():
+                m[e] = (gmsh.model.getBoundary([e]),
+                        gmsh.model.mesh.getNodes(e[0], e[1]),
+                        gmsh.model.mesh.getElements(e[0], e[1]))
 
         # 2) create a new model
-        gmsh.model.add('model2')
-
-        # 3) create discrete entities in the new model and copy the mesh
-        for e in sorted(m):
-            gmsh.model.addDiscreteEntity(e[0], e[1], [b[1] for b in m[e][0]])
-            gmsh.model.mesh.addNodes(e[0], e[1], m[e][1][0], m[e][1][1])
-            gmsh.model.mesh.addElements(e[0], e[1], m[e][2][0], m[e][2][1], m[e][2][2])
-
-        # Launch the GUI to see the results:
-        if '-nopopup' not in sys.argv:
-            gmsh.fltk.run()
+        with gmshsession.model(name + '-model2', clear=True, keep=False):
 
+            # 3) create discrete entities in the new model and copy the mesh
+            for e in sorted(m):
+                gmsh.model.addDiscreteEntity(e[0], e[1], [b[1] for b in m[e][0]])
+                gmsh.model.mesh.addNodes(e[0], e[1], m[e][1][0], m[e][1][1])
+                gmsh.model.mesh.addElements(e[0], e[1], m[e][2][0], m[e][2][1], m[e][2][2])
 
-        gmsh.finalize()
+            # Launch the GUI to see the results:
+            if '-nopopup' not in sys.argv:
+                gmsh.fltk.run()
 
 
     def run(self, filename: str): 
@@ -246,29 +243,29 @@ class femix_handler:
 
 
     def rungmsh(self, filename: str):
-        gmsh.initialize()
-
-        # Copied from discrete.py...
-        gmsh.model.add("test")
-        gmsh.model.addDiscreteEntity(2, 1)
-        gmsh.model.mesh.addNodes(2, 1, [1, 2, 3, 4],
-                                [0., 0., 0., 1., 0., 0., 1., 1., 0., 0., 1., 0.])
-        gmsh.model.mesh.addElements(2, 1, [2], [[1, 2]], [[1, 2, 3, 1, 3, 4]])
-        # ... end of copy
-
-        # Create a new post-processing view
-        t = gmsh.view.add("some data")
-
-        # add 10 steps of model-based data, on the nodes of the mesh
-        # for step in range(0, 10):
-        #     gmsh.view.addModelData(
-        #         t,
-        #         step,
-        #         "test",
-        #         "NodeData",
-        #         nodes,  # tags of nodes
-        #         values)  # data, per node
-
-        gmsh.view.write(t, "data.msh")
-
-        gmsh.finalize()
+        import gmsh
+        from . import gmshsession
+
+        with gmshsession.model("test", clear=True, keep=False):
+            # Copied from discrete.py...
+            gmsh.model.addDiscreteEntity(2, 1)
+            gmsh.model.mesh.addNodes(2, 1, [1, 2, 3, 4],
+                                    [0., 0., 0., 1., 0., 0., 1., 1., 0., 0., 1., 0.])
+            gmsh.model.mesh.addElements(2, 1, [2], [[1, 2]], [[1, 2, 3, 1, 3, 4]])
+            # ... end of copy
+
+            # Create a new post-processing view
+            t = gmsh.view.add("some data")
+
+            # add 10 steps of model-based data, on the nodes of the mesh
+            # for step in range(0, 10):
+            #     gmsh.view.addModelData(
+            #         t,
+            #         step,
+            #         "test",
+            #         "NodeData",
+            #         nodes,  # tags of nodes
+            #         values)  # data, per node
+
+            gmsh.view.write(t, "data.msh")
+            gmsh.view.remove(t)
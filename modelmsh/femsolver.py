@@ -0,0 +1,281 @@
+"""In-process linear solver for models assembled from element matrices.
+
+An optional alternative to the native femix solver (``ofemlib.ofemSolver``):
+element matrices are computed in batches (see ``frame``), assembled into a
+SciPy CSR matrix from COO triplets, the supports are applied by eliminating
+the fixed degrees of freedom and all the load cases are solved with one
+factorization (CHOLMOD if scikit-sparse is installed, SuperLU otherwise).
+A ``SolverSession`` keeps the factorization to solve new loads later
+(influence lines, moving loads) without assembling again.
+
+The degrees of freedom of point i (row i of the coordinates) are
+``i*ndof ... i*ndof+ndof-1``. Results are returned as the tables of
+``ofemlib.get_results_from_ofem``: 'point' (1 based), 'disp-1' ...
+'disp-ndof' and 'icomb', one combination per load case.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+
+
+def element_dofs(conn: np.ndarray, ndof: int) -> np.ndarray:
+    """Returns the degrees of freedom of the elements
+
+    Args:
+        conn (np.ndarray): the connectivity (nelem, nnode) as row indices of the points
+        ndof (int): the number of degrees of freedom per point
+
+    Returns:
+        np.ndarray: (nelem, nnode*ndof) degrees of freedom, node by node
+    """
+    conn = np.asarray(conn, dtype=np.int64)
+    return (conn[:, :, None]*ndof + np.arange(ndof)).reshape(len(conn), -1)
+
+
+def assemble_matrix(kel: np.ndarray, dofs: np.ndarray, ndofs: int) -> sparse.csr_matrix:
+    """Assembles element matrices into a sparse matrix
+
+    Args:
+        kel (np.ndarray): the element matrices (nelem, n, n)
+        dofs (np.ndarray): the degrees of freedom of the elements (nelem, n)
+        ndofs (int): the number of degrees of freedom of the model
+
+    Returns:
+        sparse.csr_matrix: the (ndofs, ndofs) matrix, duplicate entries summed
+    """
+    n = dofs.shape[1]
+    rows = np.broadcast_to(dofs[:, :, None], (len(dofs), n, n)).ravel()
+    cols = np.broadcast_to(dofs[:, None, :], (len(dofs), n, n)).ravel()
+    return sparse.coo_matrix((kel.ravel(), (rows, cols)), shape=(ndofs, ndofs)).tocsr()
+
+
+def assemble_vector(fel: np.ndarray, dofs: np.ndarray, ndofs: int) -> np.ndarray:
+    """Assembles element vectors, one column per load case
+
+    Args:
+        fel (np.ndarray): the element vectors (nelem, n) or (nelem, n, ncase)
+        dofs (np.ndarray): the degrees of freedom of the elements (nelem, n)
+        ndofs (int): the number of degrees of freedom of the model
+
+    Returns:
+        np.ndarray: (ndofs, ncase) vectors
+    """
+    fel = fel.reshape(fel.shape[0], fel.shape[1], -1)
+    F = np.zeros((ndofs, fel.shape[2]))
+    for icase in range(fel.shape[2]):
+        F[:, icase] = np.bincount(dofs.ravel(), fel[:, :, icase].ravel(), minlength=ndofs)
+    return F
+
+
+def fixed_dofs(npoin: int, ndof: int, fixno: tuple) -> np.ndarray:
+    """Returns the mask of the fixed degrees of freedom
+
+    Args:
+        npoin (int): the number of points
+        ndof (int): the number of degrees of freedom per point
+        fixno (tuple): the rows of the supported points and their fixity codes (nfix, ndof),
+            1 for fixed and 0 for free
+
+    Returns:
+        np.ndarray: (npoin*ndof,) boolean mask
+    """
+    rows, codes = fixno
+    fixed = np.zeros((npoin, ndof), dtype=bool)
+    if len(rows) > 0:
+        codes = np.asarray(codes).reshape(len(rows), -1)
+        fixed[np.asarray(rows, dtype=np.int64), :codes.shape[1]] = codes[:, :ndof] != 0
+    return fixed.ravel()
+
+
+def factorize(A: sparse.spmatrix, definite: bool = True):
+    """Factors a symmetric sparse matrix
+
+    Positive definite matrices are factored with CHOLMOD when scikit-sparse is
+    installed, otherwise with SuperLU in symmetric mode (minimum degree
+    ordering of A+A', diagonal pivots); indefinite matrices with SuperLU and
+    partial pivoting.
+
+    Args:
+        A (sparse.spmatrix): the matrix
+        definite (bool, optional): A is positive definite. Defaults to True.
+
+    Returns:
+        callable: solves A x = b, for b (n,) or (n, nrhs)
+    """
+    A = A.tocsc()
+    if definite:
+        try:
+            from sksparse.cholmod import cholesky
+        except ImportError:
+            pass
+        else:
+            return cholesky(A)
+        lu = splinalg.splu(A, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0,
+                           options=dict(SymmetricMode=True))
+    else:
+        lu = splinalg.splu(A, permc_spec='MMD_AT_PLUS_A')
+    return lu.solve
+
+
+class SolverSession:
+    """Factorization of a stiffness matrix, kept in memory to solve any number of load cases
+
+    The fixed degrees of freedom and those without stiffness are eliminated
+    once, when the session is created; ``solve`` then only does the forward
+    and back substitutions, for all the columns of the loads at once.
+
+    Example::
+
+        session = femsolver.SolverSession(K, fixed, 6)
+        for loads in positions:
+            displ = session.solve(loads)    # (ncase, npoin, 6)
+    """
+
+    def __init__(self, K: sparse.spmatrix, fixed: np.ndarray, ndof: int = 1):
+        """Factors the stiffness matrix
+
+        Args:
+            K (sparse.spmatrix): the stiffness matrix
+            fixed (np.ndarray): the mask of the fixed degrees of freedom
+            ndof (int, optional): the number of degrees of freedom per point. Defaults to 1.
+        """
+        self.ndofs = K.shape[0]
+        self.ndof = ndof
+        self.npoin = self.ndofs // ndof
+        self.free = np.flatnonzero(~np.asarray(fixed, dtype=bool) & (K.diagonal() != 0.0))
+        self._solve = None
+        if len(self.free) > 0:
+            self._solve = factorize(K[self.free][:, self.free])
+        return
+
+    def solve_dofs(self, F: np.ndarray) -> np.ndarray:
+        """Solves for loads given by degree of freedom
+
+        Args:
+            F (np.ndarray): the loads (ndofs,) or (ndofs, ncase)
+
+        Returns:
+            np.ndarray: the displacements, with the shape of F
+        """
+        F = np.asarray(F, dtype=float)
+        U = np.zeros(F.shape)
+        if self._solve is not None:
+            U[self.free] = self._solve(np.ascontiguousarray(F[self.free]))
+        return U
+
+    def solve(self, loads: np.ndarray) -> np.ndarray:
+        """Solves for nodal loads
+
+        Args:
+            loads (np.ndarray): the loads (npoin, ndof) or (ncase, npoin, ndof)
+
+        Returns:
+            np.ndarray: the displacements (ncase, npoin, ndof)
+        """
+        loads = np.asarray(loads, dtype=float).reshape(-1, self.npoin, self.ndof)
+        U = self.solve_dofs(loads.reshape(len(loads), -1).T)
+        return U.T.reshape(loads.shape)
+
+    def table(self, loads: np.ndarray) -> pd.DataFrame:
+        """Solves for nodal loads and returns the displacements in the layout of the _di.csv results
+
+        Args:
+            loads (np.ndarray): the loads (npoin, ndof) or (ncase, npoin, ndof)
+
+        Returns:
+            pd.DataFrame: see ``displacement_table``
+        """
+        return point_table(self.solve(loads), 'disp')
+
+
+def solve(K: sparse.spmatrix, F: np.ndarray, fixed: np.ndarray) -> np.ndarray:
+    """Solves K U = F with zero displacements at the fixed degrees of freedom
+
+    The degrees of freedom without stiffness (such as the rotations of truss
+    points) are eliminated as well. All the columns of F are solved with one
+    factorization; use a ``SolverSession`` to keep it for other loads.
+
+    Args:
+        K (sparse.spmatrix): the stiffness matrix
+        F (np.ndarray): the loads (ndofs,) or (ndofs, ncase)
+        fixed (np.ndarray): the mask of the fixed degrees of freedom
+
+    Returns:
+        np.ndarray: the displacements, with the shape of F
+    """
+    return SolverSession(K, fixed).solve_dofs(F)
+
+
+def point_table(values: np.ndarray, prefix: str) -> pd.DataFrame:
+    """Returns point values in the layout of the _di.csv and _avgst.csv results
+
+    Args:
+        values (np.ndarray): (ncase, npoin, ncomp) values at the points
+        prefix (str): the prefix of the value columns, 'disp' or 'str'
+
+    Returns:
+        pd.DataFrame: 'point', 'prefix-1' ... 'prefix-ncomp' and 'icomb' (the load case, 1 based)
+    """
+    ncase, npoin, ncomp = values.shape
+    df = pd.DataFrame(values.reshape(-1, ncomp), columns=["%s-%d" % (prefix, i+1) for i in range(ncomp)])
+    df.insert(0, 'point', np.tile(np.arange(1, npoin+1), ncase))
+    df['icomb'] = np.repeat(np.arange(1, ncase+1), npoin)
+    return df
+
+
+def displacement_table(U: np.ndarray, ndof: int) -> pd.DataFrame:
+    """Returns the displacements in the layout of the _di.csv results
+
+    Args:
+        U (np.ndarray): the displacements (ndofs,) or (ndofs, ncase)
+        ndof (int): the number of degrees of freedom per point
+
+    Returns:
+        pd.DataFrame: 'point', 'disp-1' ... 'disp-ndof' and 'icomb' (the load case, 1 based)
+    """
+    U = U.reshape(U.shape[0], -1)
+    return point_table(U.reshape(-1, ndof, U.shape[1]).transpose(2, 0, 1), 'disp')
+
+
+def element_node_table(values: np.ndarray) -> pd.DataFrame:
+    """Returns element-node values in the layout of the _elnst.csv results
+
+    Args:
+        values (np.ndarray): (ncase, nelem, nnode, ncomp) values at the nodes of the elements
+
+    Returns:
+        pd.DataFrame: 'element', 'node' (1 based), 'str-1' ... 'str-ncomp' and 'icomb'
+    """
+    ncase, nelem, nnode, ncomp = values.shape
+    df = pd.DataFrame(values.reshape(-1, ncomp), columns=["str-%d" % (i+1) for i in range(ncomp)])
+    df.insert(0, 'element', np.tile(np.repeat(np.arange(1, nelem+1), nnode), ncase))
+    df.insert(1, 'node', np.tile(np.arange(1, nnode+1), ncase*nelem))
+    df['icomb'] = np.repeat(np.arange(1, ncase+1), nelem*nnode)
+    return df
+
+
+def reaction_table(K: sparse.spmatrix, U: np.ndarray, F: np.ndarray, fixed: np.ndarray, ndof: int) -> pd.DataFrame:
+    """Returns the reactions at the fixed degrees of freedom
+
+    Args:
+        K (sparse.spmatrix): the stiffness matrix
+        U (np.ndarray): the displacements (ndofs,) or (ndofs, ncase)
+        F (np.ndarray): the loads, with the shape of U
+        fixed (np.ndarray): the mask of the fixed degrees of freedom
+        ndof (int): the number of degrees of freedom per point
+
+    Returns:
+        pd.DataFrame: 'point', 'dof' (1 based), 'react' and 'icomb', as ``reactions.read_reactions``
+    """
+    U = U.reshape(U.shape[0], -1)
+    R = K @ U - np.asarray(F, dtype=float).reshape(U.shape)
+    dofs = np.flatnonzero(np.asarray(fixed, dtype=bool))
+    ncase = U.shape[1]
+    return pd.DataFrame({
+        'point': np.tile(dofs // ndof + 1, ncase),
+        'dof': np.tile(dofs % ndof + 1, ncase),
+        'react': R[dofs].T.ravel(),
+        'icomb': np.repeat(np.arange(1, ncase+1), len(dofs)),
+    })
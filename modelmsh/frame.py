@@ -0,0 +1,236 @@
+"""3D frame and truss elements for the in-process solver (femix types 7 and 8).
+
+The stiffness matrices of all the elements are computed at once, as
+(nelem, 12, 12) arrays, with 6 degrees of freedom per point (ux, uy, uz,
+rx, ry, rz). Truss elements only have axial stiffness; the rotations of
+points connected only to trusses are eliminated by ``femsolver.solve``.
+
+Local axes follow SAP2000: axis 1 from the first to the second node, axis 2
+in the vertical plane pointing up (along +X for vertical elements), axis 3 =
+1 x 2, all rotated by the section angle around axis 1. The section
+properties are those of ``_common.sections["curve"]``: 'area', 'torsion',
+'inertia2' and 'inertia3' (moments of inertia about the local axes 2 and 3).
+
+Example::
+
+    results = frame.solve_frames(coords, conn, props, fixno, nodal=loads)
+    results[ofemlib.DI_CSV]     # as ofemlib.get_results_from_ofem
+"""
+
+import numpy as np
+from . import femsolver
+from .ofemlib import DI_CSV, EST_CSV
+
+
+NDOF = 6
+
+
+def frame_axes(coords: np.ndarray, conn: np.ndarray, angle=0.0) -> tuple:
+    """Returns the local axes and the lengths of the elements
+
+    Args:
+        coords (np.ndarray): the coordinates of the points (npoin, 3)
+        conn (np.ndarray): the connectivity (nelem, 2) as row indices of coords
+        angle (float | np.ndarray, optional): rotation of the section around axis 1, in degrees. Defaults to 0.0.
+
+    Returns:
+        tuple: the axes (nelem, 3, 3), rows are the axes 1, 2, 3, and the lengths (nelem,)
+    """
+    d = coords[conn[:, 1]] - coords[conn[:, 0]]
+    length = np.sqrt((d**2).sum(axis=1))
+    e1 = d / length[:, None]
+    vertical = np.abs(e1[:, 2]) > 1.0 - 1.0e-9
+    ref = np.zeros_like(e1)
+    ref[:, 2] = 1.0
+    ref[vertical] = [1.0, 0.0, 0.0]
+    e2 = ref - (ref*e1).sum(axis=1)[:, None]*e1
+    e2 /= np.sqrt((e2**2).sum(axis=1))[:, None]
+    e3 = np.cross(e1, e2)
+
+    a = np.radians(np.broadcast_to(np.asarray(angle, dtype=float), length.shape))
+    c, s = np.cos(a)[:, None], np.sin(a)[:, None]
+    e2, e3 = c*e2 + s*e3, c*e3 - s*e2
+    return np.stack([e1, e2, e3], axis=1), length
+
+
+def _transformation(axes: np.ndarray) -> np.ndarray:
+    T = np.zeros((len(axes), 12, 12))
+    for k in range(4):
+        T[:, 3*k:3*k+3, 3*k:3*k+3] = axes
+    return T
+
+
+def local_stiffness(length, E, G, area, inertia2, inertia3, torsion, truss=False) -> np.ndarray:
+    """Returns the stiffness matrices of the elements in local axes
+
+    Args:
+        length (np.ndarray): the lengths of the elements
+        E, G (np.ndarray): the Young and shear moduli
+        area, inertia2, inertia3, torsion (np.ndarray): the section properties
+        truss (bool | np.ndarray, optional): elements with axial stiffness only. Defaults to False.
+
+    Returns:
+        np.ndarray: (nelem, 12, 12) matrices
+    """
+    L = np.asarray(length, dtype=float)
+    shape = L.shape
+    E, G, A, I2, I3, J = [np.broadcast_to(np.asarray(v, dtype=float), shape)
+                          for v in (E, G, area, inertia2, inertia3, torsion)]
+    k = np.zeros(shape + (12, 12))
+
+    def put(i, j, value):
+        k[:, i, j] += value
+        if i != j:
+            k[:, j, i] += value
+
+    ea = E*A/L
+    for i, j, s in [(0, 0, 1), (6, 6, 1), (0, 6, -1)]:
+        put(i, j, s*ea)
+    gj = G*J/L
+    for i, j, s in [(3, 3, 1), (9, 9, 1), (3, 9, -1)]:
+        put(i, j, s*gj)
+    # bending in the 1-2 plane (about axis 3) and in the 1-3 plane (about axis 2)
+    for v, r, I, sign in [(1, 5, I3, 1.0), (2, 4, I2, -1.0)]:
+        a, b, c = 12.0*E*I/L**3, 6.0*E*I/L**2, E*I/L
+        put(v, v, a)
+        put(v+6, v+6, a)
+        put(v, v+6, -a)
+        put(v, r, sign*b)
+        put(v, r+6, sign*b)
+        put(v+6, r, -sign*b)
+        put(v+6, r+6, -sign*b)
+        put(r, r, 4.0*c)
+        put(r+6, r+6, 4.0*c)
+        put(r, r+6, 2.0*c)
+
+    truss = np.broadcast_to(np.asarray(truss, dtype=bool), shape)
+    if truss.any():
+        axial = k[truss][:, [0, 6]][:, :, [0, 6]]
+        k[truss] = 0.0
+        k[np.ix_(np.flatnonzero(truss), [0, 6], [0, 6])] = axial
+    return k
+
+
+def frame_stiffness(coords: np.ndarray, conn: np.ndarray, props: dict, truss=False) -> tuple:
+    """Returns the stiffness matrices of the elements in global axes
+
+    Args:
+        coords (np.ndarray): the coordinates of the points (npoin, 3)
+        conn (np.ndarray): the connectivity (nelem, 2) as row indices of coords
+        props (dict): 'E', 'G', 'area', 'inertia2', 'inertia3', 'torsion' and optionally 'angle',
+            scalars or one value per element
+        truss (bool | np.ndarray, optional): elements with axial stiffness only. Defaults to False.
+
+    Returns:
+        tuple: the global matrices (nelem, 12, 12), the local matrices, the transformations
+            (nelem, 12, 12) and the lengths
+    """
+    axes, length = frame_axes(coords, conn, props.get('angle', 0.0))
+    klocal = local_stiffness(length, props['E'], props['G'], props['area'], props['inertia2'],
+                             props['inertia3'], props['torsion'], truss)
+    T = _transformation(axes)
+    kglobal = np.einsum('eji,ejk,ekl->eil', T, klocal, T, optimize=True)
+    return kglobal, klocal, T, length
+
+
+def uniform_load_forces(T: np.ndarray, length: np.ndarray, q: np.ndarray, truss=False) -> np.ndarray:
+    """Returns the fixed end forces of uniformly distributed loads in local axes
+
+    Args:
+        T (np.ndarray): the transformations of the elements (nelem, 12, 12)
+        length (np.ndarray): the lengths of the elements
+        q (np.ndarray): the loads per unit length in global axes, (nelem, 3) or (nelem, 3, ncase)
+        truss (bool | np.ndarray, optional): elements with axial stiffness only. Defaults to False.
+
+    Returns:
+        np.ndarray: the equivalent nodal forces (nelem, 12, ncase) in local axes
+    """
+    q = q.reshape(q.shape[0], 3, -1)
+    ql = np.einsum('eij,ejc->eic', T[:, :3, :3], q)
+    L = length[:, None]
+    f = np.zeros((len(q), 12, q.shape[2]))
+    for i in range(3):
+        f[:, i] = f[:, i+6] = ql[:, i]*L/2.0
+    moments = ~np.broadcast_to(np.asarray(truss, dtype=bool), length.shape)
+    m2 = ql[:, 1]*L**2/12.0*moments[:, None]
+    m3 = ql[:, 2]*L**2/12.0*moments[:, None]
+    f[:, 5], f[:, 11] = m2, -m2
+    f[:, 4], f[:, 10] = -m3, m3
+    return f
+
+
+def frame_session(coords: np.ndarray, conn: np.ndarray, props: dict, fixno: tuple,
+                  truss=False) -> femsolver.SolverSession:
+    """Assembles and factors the stiffness matrix of a 3D frame or truss
+
+    Args:
+        coords (np.ndarray): the coordinates of the points (npoin, 3)
+        conn (np.ndarray): the connectivity (nelem, 2) as row indices of coords
+        props (dict): the section and material properties, see ``frame_stiffness``
+        fixno (tuple): the rows of the supported points and their fixity codes (nfix, 6)
+        truss (bool | np.ndarray, optional): elements with axial stiffness only. Defaults to False.
+
+    Returns:
+        femsolver.SolverSession: the session, solving point loads (ncase, npoin, 6)
+    """
+    coords = np.asarray(coords, dtype=float)
+    conn = np.asarray(conn, dtype=np.int64)
+    kglobal = frame_stiffness(coords, conn, props, truss)[0]
+    K = femsolver.assemble_matrix(kglobal, femsolver.element_dofs(conn, NDOF), len(coords)*NDOF)
+    return femsolver.SolverSession(K, femsolver.fixed_dofs(len(coords), NDOF, fixno), NDOF)
+
+
+def solve_frames(coords: np.ndarray, conn: np.ndarray, props: dict, fixno: tuple,
+                 nodal: np.ndarray = None, distributed: np.ndarray = None, truss=False) -> dict:
+    """Linear static analysis of a 3D frame or truss
+
+    Args:
+        coords (np.ndarray): the coordinates of the points (npoin, 3)
+        conn (np.ndarray): the connectivity (nelem, 2) as row indices of coords
+        props (dict): the section and material properties, see ``frame_stiffness``
+        fixno (tuple): the rows of the supported points and their fixity codes (nfix, 6)
+        nodal (np.ndarray, optional): point loads (npoin, 6) or (ncase, npoin, 6) in global axes. Defaults to None.
+        distributed (np.ndarray, optional): uniform loads per unit length (nelem, 3) or (ncase, nelem, 3)
+            in global axes. Defaults to None.
+        truss (bool | np.ndarray, optional): elements with axial stiffness only. Defaults to False.
+
+    Returns:
+        dict: {DI_CSV: displacements, EST_CSV: section forces at the nodes of the elements}, as
+            ``ofemlib.get_results_from_ofem``; the forces are N, V2, V3, T, M2, M3 in local axes
+            (N positive in tension), one combination per load case
+    """
+    coords = np.asarray(coords, dtype=float)
+    conn = np.asarray(conn, dtype=np.int64)
+    npoin, nelem = len(coords), len(conn)
+    ndofs = npoin*NDOF
+
+    kglobal, klocal, T, length = frame_stiffness(coords, conn, props, truss)
+    dofs = femsolver.element_dofs(conn, NDOF)
+    K = femsolver.assemble_matrix(kglobal, dofs, ndofs)
+
+    ncase = 1
+    for loads in (nodal, distributed):
+        if loads is not None and np.ndim(loads) == 3:
+            ncase = max(ncase, len(loads))
+    F = np.zeros((ndofs, ncase))
+    if nodal is not None:
+        nodal = np.broadcast_to(np.asarray(nodal, dtype=float).reshape(-1, npoin, NDOF), (ncase, npoin, NDOF))
+        F += nodal.reshape(ncase, -1).T
+    fixed_end = np.zeros((nelem, 12, ncase))
+    if distributed is not None:
+        q = np.broadcast_to(np.asarray(distributed, dtype=float).reshape(-1, nelem, 3), (ncase, nelem, 3))
+        fixed_end = uniform_load_forces(T, length, q.transpose(1, 2, 0), truss)
+        F += femsolver.assemble_vector(np.einsum('eji,ejc->eic', T, fixed_end), dofs, ndofs)
+
+    U = femsolver.solve(K, F, femsolver.fixed_dofs(npoin, NDOF, fixno))
+
+    # end forces in local axes, section forces with the sign of the second end
+    ue = U[dofs]
+    forces = np.einsum('eij,ejk,ekc->eic', klocal, T, ue) - fixed_end
+    forces = forces.reshape(nelem, 2, NDOF, ncase)
+    forces[:, 0] *= -1.0
+    results = {
+        DI_CSV: femsolver.displacement_table(U, NDOF),
+        EST_CSV: femsolver.element_node_table(forces.transpose(3, 0, 1, 2)),
+    }
+    return results
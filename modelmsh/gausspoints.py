@@ -0,0 +1,365 @@
+"""Stresses at the Gauss points and their integrals.
+
+The _gpstr.csv table of a job ('ielem', 'ntype', 'igtst' (the Gauss
+point), 'x', 'y', 'z' and the stress columns) is loaded into a
+``GaussField``: arrays of (combination, element, Gauss point, component)
+values, NaN where an element has fewer points. With the mesh of the deck,
+the weights of the points (the Jacobian determinants times the Gauss
+weights of ``shapes``) are computed in bulk for every block of elements;
+the points of the table are matched to the rule by their coordinates, so
+the numbering of the points in femix does not matter.
+
+The field can then be integrated over sets of elements (resultants of
+walls, total loads) and along cut lines (strip moments of slabs), for all
+the combinations at once: along a cut the points are mapped to the natural
+coordinates of their elements, where the values are interpolated by the
+polynomial through the Gauss points of the rule, and summed with the
+midpoint rule.
+
+Example::
+
+    field = gausspoints.GaussField.from_ofem(jobname)
+    field.integrate(elements=[1, 2, 3])
+    strip = field.cut((0.0, 2.5, 0.0), (10.0, 2.5, 0.0), npts=200)
+    strip['resultant']
+"""
+
+import io
+import pathlib
+import zipfile
+import numpy as np
+import pandas as pd
+from . import shapes
+from .spatial import SpatialIndex
+from .transfer import inverse_map
+from .ofemlib import GPSTR_CSV, extract_ofem_deck, result_files
+
+
+# columns that are not stress components
+_info = ['ielem', 'ntype', 'igtst', 'x', 'y', 'z', 'icomb']
+
+# triangles: number of points of the rule, degree
+_triangle_degree = {1: 1, 3: 2, 6: 4}
+
+
+def read_table(file) -> pd.DataFrame:
+    """Reads a _gpstr.csv table, whose header may span several lines
+
+    Args:
+        file: a binary file object
+
+    Returns:
+        pd.DataFrame: the table, with the names of the header stripped
+    """
+    lines = file.read().decode().splitlines()
+    first = 0
+    for first, line in enumerate(lines):
+        try:
+            float(line.split(';')[0])
+            break
+        except ValueError:
+            continue
+    header = [h.strip() for h in ';'.join(lines[:first]).split(';') if h.strip() != '']
+    df = pd.read_csv(io.StringIO('\n'.join(lines[first:])), sep=';', header=None, skipinitialspace=True)
+    df = df.iloc[:, :len(header)]
+    df.columns = header[:df.shape[1]]
+    return df
+
+
+def _basis(u: np.ndarray, v: np.ndarray, npts: int, dim: int, triangle: bool) -> np.ndarray:
+    # polynomial through the npts points of a Gauss rule, in natural coordinates: (..., nbasis)
+    if dim == 1:
+        terms = [u**i for i in range(npts)]
+    elif triangle:
+        degree = {1: 0, 3: 1, 6: 2}[npts]
+        terms = [u**(d-j)*v**j for d in range(degree+1) for j in range(d+1)]
+    else:
+        # quadrilaterals: m x m points, tensor product of degree m-1
+        m = int(round(np.sqrt(npts)))
+        terms = [u**i*v**j for j in range(m) for i in range(m)]
+    return np.stack(terms, axis=-1)
+
+
+class GaussField:
+    """Values at the Gauss points of the elements, for all the combinations
+
+    Attributes:
+        combs (np.ndarray): the combinations (ncomb,)
+        elements (np.ndarray): the sorted element numbers (nelem,)
+        values (np.ndarray): (ncomb, nelem, ngp, ncomp) values, NaN for missing points
+        coords (np.ndarray): (nelem, ngp, 3) coordinates of the points
+        columns (list): the names of the components
+        weights (np.ndarray): (nelem, ngp) integration weights, after ``set_mesh``
+        detJ (np.ndarray): (nelem, ngp) Jacobian determinants, after ``set_mesh``
+    """
+
+    def __init__(self, combs: np.ndarray, elements: np.ndarray, values: np.ndarray, coords: np.ndarray,
+                 columns: list):
+        self.combs = np.asarray(combs)
+        self.elements = np.asarray(elements)
+        self.values = values
+        self.coords = coords
+        self.columns = list(columns)
+        self.weights = None
+        self.detJ = None
+        self._mesh = None
+        self._index = None
+        self._dims = None
+        self._natural = None
+        return
+
+    @classmethod
+    def from_table(cls, df: pd.DataFrame) -> 'GaussField':
+        """Builds the field from a _gpstr.csv table
+
+        Args:
+            df (pd.DataFrame): the table; without an 'icomb' column, a new combination starts
+                where the element and point numbers restart
+
+        Returns:
+            GaussField: the field
+        """
+        df = df.rename(columns=lambda c: str(c).strip())
+        ielem = df['ielem'].values.astype(np.int64)
+        igtst = df['igtst'].values.astype(np.int64)
+        if 'icomb' in df.columns:
+            icomb = df['icomb'].values.astype(np.int64)
+        else:
+            restart = (ielem[1:] < ielem[:-1]) | ((ielem[1:] == ielem[:-1]) & (igtst[1:] <= igtst[:-1]))
+            icomb = np.cumsum(np.r_[True, restart])
+        columns = [c for c in df.columns if c not in _info and not c.startswith('Unnamed')]
+
+        combs, ic = np.unique(icomb, return_inverse=True)
+        elements, ie = np.unique(ielem, return_inverse=True)
+        ngp = int(igtst.max(initial=1))
+        values = np.full((len(combs), len(elements), ngp, len(columns)), np.nan)
+        values[ic, ie, igtst-1] = df[columns].apply(pd.to_numeric, errors='coerce').values
+        coords = np.full((len(elements), ngp, 3), np.nan)
+        xyz = [c for c in ['x', 'y', 'z'] if c in df.columns]
+        if len(xyz) > 0:
+            coords[ie, igtst-1, :len(xyz)] = df[xyz].values
+            coords[ie, igtst-1, len(xyz):] = 0.0
+        return cls(combs, elements, values, coords, columns)
+
+    @classmethod
+    def from_ofem(cls, jobname: str, mesh: bool = True) -> 'GaussField':
+        """Reads the Gauss point stresses of a femix job
+
+        Args:
+            jobname (str): the job name (path without extension)
+            mesh (bool, optional): reads the mesh of the deck and computes the weights. Defaults to True.
+
+        Returns:
+            GaussField: the field
+        """
+        from . import gldat
+
+        job = pathlib.Path(jobname).name
+        with zipfile.ZipFile(jobname + '.ofem', 'r') as ofemfile:
+            with ofemfile.open(job + result_files[GPSTR_CSV]) as file:
+                field = cls.from_table(read_table(file))
+        if mesh:
+            deck = gldat.read_gldat(extract_ofem_deck(jobname),
+                                    sections=['coordinates', 'element parameters', 'elements'])
+            m = gldat.to_mesh(deck)
+            field.set_mesh(m['coords'], m['elements'])
+        return field
+
+    def _rows(self, elements) -> np.ndarray:
+        # rows of element numbers, all if None
+        if elements is None:
+            return np.arange(len(self.elements))
+        elements = np.asarray(elements)
+        rows = np.minimum(np.searchsorted(self.elements, elements), len(self.elements)-1)
+        if not np.array_equal(self.elements[rows], elements):
+            raise ValueError("Elements without values at the Gauss points.")
+        return rows
+
+    def get(self, icomb, element, gp) -> np.ndarray:
+        """Returns the values at (combination, element, Gauss point) keys
+
+        Args:
+            icomb (int | array_like): the combinations
+            element (int | array_like): the element numbers
+            gp (int | array_like): the Gauss points (1 based)
+
+        Returns:
+            np.ndarray: (..., ncomp) values, broadcast over the keys
+        """
+        ic = np.searchsorted(self.combs, icomb)
+        ie = np.searchsorted(self.elements, element)
+        return self.values[ic, ie, np.asarray(gp)-1]
+
+    def set_mesh(self, coords: np.ndarray, elements: dict):
+        """Computes the weights and Jacobians of the Gauss points from the mesh
+
+        Args:
+            coords (np.ndarray): (npoin, 3) coordinates
+            elements (dict): {gmsh type: (element numbers, connectivity as row indices of coords)}
+        """
+        coords = np.asarray(coords, dtype=float)
+        nelem, ngp = self.values.shape[1:3]
+        self.detJ = np.full((nelem, ngp), np.nan)
+        self.weights = np.full((nelem, ngp), np.nan)
+        self._dims = np.zeros(nelem, dtype=np.int64)
+        # natural coordinates of the points, NaN where the rule is not known
+        self._natural = np.full((nelem, ngp, 2), np.nan)
+        self._mesh = (coords, {t: (np.asarray(e), np.asarray(c, dtype=np.int64)) for t, (e, c) in elements.items()})
+        self._index = None
+        count = np.isfinite(self.values).any(axis=(0, 3)).sum(axis=1)
+
+        for gtype, (tags, conn) in self._mesh[1].items():
+            if gtype not in shapes.element_types or len(tags) == 0:
+                continue
+            dim = shapes.element_types[gtype][1]
+            rows = np.minimum(np.searchsorted(self.elements, tags), nelem-1)
+            found = self.elements[rows] == tags
+            rows, conn = rows[found], conn[found]
+            self._dims[rows] = dim
+            for n in np.unique(count[rows]):
+                if dim == 1:
+                    degree = 2*n - 2
+                elif shapes.element_types[gtype][0].startswith("triangle"):
+                    degree = _triangle_degree.get(n)
+                else:
+                    m = int(round(np.sqrt(n)))
+                    degree = 2*m - 2 if m*m == n else None
+                if degree is None:
+                    continue
+                points, w = shapes.gauss_points(gtype, degree)
+                if len(points) != n:
+                    continue
+                sel = count[rows] == n
+                r, xe = rows[sel], coords[conn[sel]]
+                N, dN = shapes.shape_functions(gtype, points)
+                det = shapes.measure(xe, dN)
+                # the points of the rule nearest to the points of the table
+                X = np.einsum('pn,enj->epj', N, xe)
+                given = self.coords[r, :n]
+                order = np.broadcast_to(np.arange(n), (len(r), n)).copy()
+                known = np.isfinite(given).all(axis=(1, 2))
+                if known.any():
+                    d = np.linalg.norm(given[known, :, None, :] - X[known, None, :, :], axis=-1)
+                    order[known] = d.argmin(axis=2)
+                self.detJ[r, :n] = np.take_along_axis(det, order, axis=1)
+                self.weights[r, :n] = self.detJ[r, :n]*w[order]
+                self._natural[r, :n] = np.pad(points, ((0, 0), (0, 2 - dim)))[order]
+        return
+
+    def integrate(self, elements=None, combinations=None) -> pd.DataFrame:
+        """Integrates the components over a set of elements
+
+        Args:
+            elements (array_like, optional): the element numbers. Defaults to all.
+            combinations (array_like, optional): the combinations. Defaults to all.
+
+        Raises:
+            ValueError: the weights were not computed (see ``set_mesh``)
+
+        Returns:
+            pd.DataFrame: 'icomb', 'measure' (length or area integrated) and the integrals
+        """
+        if self.weights is None:
+            raise ValueError("The weights of the Gauss points are not known, see set_mesh.")
+        rows = self._rows(elements)
+        cs = np.arange(len(self.combs)) if combinations is None else np.searchsorted(self.combs, combinations)
+        w = np.nan_to_num(self.weights[rows])
+        v = np.nan_to_num(self.values[np.ix_(cs, rows)])
+        df = pd.DataFrame(np.einsum('cegk,eg->ck', v, w, optimize=True), columns=self.columns)
+        df.insert(0, 'icomb', self.combs[cs])
+        df.insert(1, 'measure', w.sum())
+        return df
+
+    def integrate_sets(self, sets: dict, combinations=None) -> pd.DataFrame:
+        """Integrates the components over several sets of elements
+
+        Args:
+            sets (dict): {name: element numbers}
+            combinations (array_like, optional): the combinations. Defaults to all.
+
+        Returns:
+            pd.DataFrame: 'set' and the columns of ``integrate``
+        """
+        frames = []
+        for name, elements in sets.items():
+            df = self.integrate(elements, combinations)
+            df.insert(0, 'set', name)
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True)
+
+    def cut(self, start, end, npts: int = 100) -> dict:
+        """Integrates the components along a straight cut through the mesh
+
+        Args:
+            start (array_like): the first point of the cut
+            end (array_like): the last point of the cut
+            npts (int, optional): the number of sampling points. Defaults to 100.
+
+        Raises:
+            ValueError: the mesh is not known (see ``set_mesh``)
+
+        Returns:
+            dict: 'points' (npts, 3), 'elements' (the element of each point, -1 outside the mesh),
+                'values' (ncomb, npts, ncomp), 'length' (of the cut inside the mesh),
+                'resultant' (the integrals along the cut) and 'moment' (the first moments about
+                the middle of the cut, along the cut), as DataFrames with 'icomb'
+        """
+        if self._mesh is None:
+            raise ValueError("The mesh is not known, see set_mesh.")
+        if self._index is None:
+            self._index = SpatialIndex(self._mesh[0], None, self._mesh[1])
+        start = np.pad(np.asarray(start, dtype=float), (0, 3 - len(start)))
+        end = np.pad(np.asarray(end, dtype=float), (0, 3 - len(end)))
+        length = np.linalg.norm(end - start)
+        t = (np.arange(npts) + 0.5)/npts
+        points = start + t[:, None]*(end - start)
+        ds = length/npts
+
+        tags = self._index.locate(points)
+        nelem = len(self.elements)
+        ncomb, _, _, ncomp = self.values.shape
+        values = np.full((ncomb, npts, ncomp), np.nan)
+        count = np.isfinite(self.values).any(axis=(0, 3)).sum(axis=1)
+        inside = [np.empty(0, dtype=np.int64)]
+        for gtype, (etags, conn) in self._mesh[1].items():
+            if gtype not in shapes.element_types or len(etags) == 0:
+                continue
+            name, dim, _ = shapes.element_types[gtype]
+            # the points in the elements of this block, with values at their Gauss points
+            order = np.argsort(etags)
+            k = order[np.minimum(np.searchsorted(etags, tags, sorter=order), len(etags)-1)]
+            p = np.flatnonzero((tags >= 0) & (etags[k] == tags))
+            k = k[p]
+            rows = np.minimum(np.searchsorted(self.elements, tags[p]), nelem-1)
+            known = (self.elements[rows] == tags[p]) & np.isfinite(self._natural[rows, 0, 0])
+            p, k, rows = p[known], k[known], rows[known]
+            if len(p) == 0:
+                continue
+            xi, converged = inverse_map(gtype, self._mesh[0][conn[k]], points[p])
+            xi = np.pad(xi, ((0, 0), (0, 2 - dim)))
+            for n in np.unique(count[rows]):
+                sel = (count[rows] == n) & converged
+                ps, r = p[sel], rows[sel]
+                ue, inverse = np.unique(r, return_inverse=True)
+                g = self._natural[ue, :n]
+                fit = np.linalg.pinv(_basis(g[..., 0], g[..., 1], n, dim, name.startswith("triangle")))
+                B = _basis(xi[sel, 0], xi[sel, 1], n, dim, name.startswith("triangle"))
+                values[:, ps] = np.einsum('pb,pbg,cpgk->cpk', B, fit[inverse], self.values[:, r, :n],
+                                          optimize=True)
+                inside.append(ps)
+        inside = np.concatenate(inside)
+
+        v = np.nan_to_num(values)*ds
+        arm = (t - 0.5)*length
+        resultant = pd.DataFrame(v.sum(axis=1), columns=self.columns)
+        resultant.insert(0, 'icomb', self.combs)
+        moment = pd.DataFrame(np.einsum('cpk,p->ck', v, arm), columns=self.columns)
+        moment.insert(0, 'icomb', self.combs)
+        return {
+            'points': points,
+            'elements': np.where(np.isin(np.arange(npts), inside), tags, -1),
+            'values': values,
+            'length': ds*len(inside),
+            'resultant': resultant,
+            'moment': moment,
+        }
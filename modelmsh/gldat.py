@@ -0,0 +1,499 @@
+"""Reads femix .gldat decks into NumPy arrays.
+
+A deck is a sequence of sections, each one starting with a ``###`` header
+(continuation header lines, such as ``### (global coordinate system)`` or
+``### ntype = ...``, belong to the section above). The file is first indexed:
+the headers are found with a regular expression on a memory map, without
+parsing the data, so a multi-GB deck is indexed in the time it takes to scan
+it. Only the requested sections are then parsed, each numeric block at once.
+
+Sections are named by the keys of ``section_names``; the sections after a
+``### Load case n.`` header belong to that load case. Example::
+
+    deck = gldat.read_gldat("slab.gldat", ['coordinates', 'elements'])
+    mesh = gldat.to_mesh(deck)      # as structured.rectangle_mesh
+
+The load combinations of the .cmdat file of a job are read with ``read_cmdat``.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import numpy as np
+from .femix import femix_to_gmsh_nodes
+
+
+# start of the header text: section name
+section_names = {
+    "Main title of the problem": 'title',
+    "Main parameters": 'parameters',
+    "Sets of element parameters": 'element parameters',
+    "Sets of material properties": 'materials',
+    "Sets of element nodal properties": 'nodal properties',
+    "Element parameter index": 'elements',
+    "Coordinates of the points": 'coordinates',
+    "Points with fixed degrees of freedom": 'fixities',
+    "Sets of specified coordinate systems": 'coordinate systems',
+    "Nodes with specified coordinate systems": 'nodes with coordinate systems',
+    "Nodes with linear constraints": 'constraints',
+    "Nodes with eccentric connections": 'eccentricities',
+    "Load case n.": 'load case',
+    "Title of the load case": 'load title',
+    "Load parameters": 'load parameters',
+    "Point loads in nodal points": 'point loads',
+    "Gravity load": 'gravity',
+    "Edge load": 'edge loads',
+    "Face load": 'face loads',
+    "Uniformly distributed load": 'distributed loads',
+    "Element point load": 'element point loads',
+    "Thermal load": 'thermal loads',
+    "Prescribed variables": 'prescribed variables',
+}
+
+_header = re.compile(rb'^###[^\n]*', re.MULTILINE)
+
+
+def _section_name(text: str) -> str:
+    for prefix, name in section_names.items():
+        if text.startswith(prefix):
+            return name
+    return text
+
+
+def _index(data, offset: int = 0, case: int = 0, size: int = None) -> list:
+    # sections of a buffer (bytes or memory map) whose first byte is at offset in the file
+    sections = []
+    size = offset + len(data) if size is None else size
+    previous = -2
+    for match in _header.finditer(data):
+        text = match.group()[3:].decode(errors='replace').strip()
+        continuation = match.start() == previous + 1 or text.startswith("ntype") or text.startswith("(")
+        previous = match.end()
+        if continuation and len(sections) > 0:
+            continue
+        name = _section_name(text)
+        if name == 'load case':
+            case = int(text.split()[-1])
+        if len(sections) > 0:
+            sections[-1]['end'] = offset + match.start()
+        sections.append({'name': name, 'case': case, 'header': text,
+                         'start': offset + match.start(), 'end': size})
+    return sections
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _hashed(sections: list, data, offset: int = 0) -> list:
+    for section in sections:
+        section['hash'] = _hash(data[section['start']-offset:section['end']-offset])
+    return sections
+
+
+def index_gldat(filename: str, hashes: bool = False) -> list:
+    """Finds the sections of a .gldat deck
+
+    Args:
+        filename (str): the name of the deck
+        hashes (bool, optional): adds the hash of the content of each section. Defaults to False.
+
+    Returns:
+        list: one dict per section, in file order, with the keys 'name', 'case' (0 for the
+            sections before the first load case), 'header' (the first header line),
+            'start', 'end' (byte offsets of the section, header included) and 'hash'
+    """
+    with open(filename, 'rb') as file:
+        file.seek(0, 2)
+        if file.tell() == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            sections = _index(data)
+            if hashes:
+                _hashed(sections, data)
+    return sections
+
+
+def write_index(filename: str) -> list:
+    """Indexes a deck with the hashes of its sections and saves the index as filename.idx
+
+    The saved index is used by ``patch_gldat`` while the deck is not modified
+    by other programs (same size and modification time).
+
+    Args:
+        filename (str): the name of the deck
+
+    Returns:
+        list: the sections, as returned by ``index_gldat`` with hashes
+    """
+    sections = index_gldat(filename, hashes=True)
+    _save_index(filename, sections)
+    return sections
+
+
+def _save_index(filename: str, sections: list):
+    stat = os.stat(filename)
+    with open(filename + ".idx", 'w') as file:
+        json.dump({'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sections': sections}, file)
+    return
+
+
+def load_index(filename: str) -> list:
+    """Returns the saved index of a deck, indexing it again if it is missing or out of date
+
+    Args:
+        filename (str): the name of the deck
+
+    Returns:
+        list: the sections, as returned by ``index_gldat`` with hashes
+    """
+    try:
+        with open(filename + ".idx") as file:
+            saved = json.load(file)
+        stat = os.stat(filename)
+        if saved['size'] == stat.st_size and saved['mtime'] == stat.st_mtime_ns:
+            return saved['sections']
+    except (OSError, ValueError, KeyError):
+        pass
+    return write_index(filename)
+
+
+def patch_gldat(filename: str, sections: dict = None, loads: str = None) -> list:
+    """Replaces sections of a deck, rewriting only what changed
+
+    Sections whose new content has the same hash are skipped. Sections of the
+    same size are overwritten in place; after the first change of size the rest
+    of the file is rewritten, so changes to the load cases (at the end of the
+    deck) do not touch the element and coordinate blocks.
+
+    Args:
+        filename (str): the name of the deck
+        sections (dict, optional): {(name, case): text of the section, header included}. Defaults to None.
+        loads (str, optional): replaces all the load cases, from the first ``### Load case``
+            header to the end of the file. Defaults to None.
+
+    Raises:
+        KeyError: a section is not in the deck
+
+    Returns:
+        list: the (name, case) of the sections that were rewritten
+    """
+    index = load_index(filename)
+    keys = {(s['name'], s['case']): i for i, s in enumerate(index)}
+    size = index[-1]['end'] if len(index) > 0 else os.path.getsize(filename)
+
+    # (start, end, new content, (name, case))
+    edits = []
+    for key, text in (sections or {}).items():
+        section = index[keys[tuple(key)]]
+        data = text.encode()
+        if _hash(data) != section['hash']:
+            edits.append((section['start'], section['end'], data, tuple(key)))
+    if loads is not None:
+        first = [s['start'] for s in index if s['name'] == 'load case']
+        start = first[0] if len(first) > 0 else size
+        data = loads.encode()
+        old = "".join(s['hash'] for s in index if s['start'] >= start)
+        new = "".join(s['hash'] for s in _hashed(_index(data, start, size=start+len(data)), data, start))
+        if old != new or len(data) != size - start:
+            edits.append((start, size, data, ('load cases', 0)))
+    if len(edits) == 0:
+        return []
+    edits.sort()
+
+    with open(filename, 'r+b') as file:
+        resized = [i for i, (start, end, data, _) in enumerate(edits) if len(data) != end - start]
+        inplace = edits if len(resized) == 0 else edits[:resized[0]]
+        for start, end, data, _ in inplace:
+            file.seek(start)
+            file.write(data)
+        if len(resized) > 0:
+            first = edits[resized[0]][0]
+            file.seek(first)
+            tail = file.read()
+            pieces = []
+            position = first
+            for start, end, data, _ in edits[resized[0]:]:
+                pieces.append(tail[position-first:start-first])
+                pieces.append(data)
+                position = end
+            pieces.append(tail[position-first:])
+            file.seek(first)
+            file.write(b"".join(pieces))
+            file.truncate()
+
+    # the index is updated from the first change of size only
+    first = edits[resized[0]][0] if len(resized) > 0 else None
+    updated = []
+    for section in index:
+        if first is not None and section['start'] >= first:
+            break
+        updated.append(section)
+    with open(filename, 'rb') as file:
+        for section in updated:
+            if any(start == section['start'] for start, _, _, _ in edits):
+                file.seek(section['start'])
+                section['hash'] = _hash(file.read(section['end'] - section['start']))
+        if first is not None:
+            file.seek(first)
+            tail = file.read()
+            case = updated[-1]['case'] if len(updated) > 0 else 0
+            updated.extend(_hashed(_index(tail, first, case), tail, first))
+    _save_index(filename, updated)
+    return [key for _, _, _, key in edits]
+
+
+def read_section(filename: str, section: dict) -> str:
+    """Returns the text of a section of a deck, header included
+
+    Args:
+        filename (str): the name of the deck
+        section (dict): the section, as returned by ``index_gldat``
+
+    Returns:
+        str: the text of the section
+    """
+    with open(filename, 'rb') as file:
+        file.seek(section['start'])
+        return file.read(section['end'] - section['start']).decode()
+
+
+def _data_lines(text: str) -> list:
+    # the lines that are not headers, comments or the end of file mark
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line == "" or line.startswith("#") or line == "END_OF_FILE":
+            continue
+        lines.append(line)
+    return lines
+
+
+def _table(lines: list, dtype=float) -> tuple:
+    """Parses rows of numbers, each group of rows with the same width at once
+
+    Returns:
+        tuple: the rows padded with zeros (nrows, max width) and the width of each row
+    """
+    if len(lines) == 0:
+        return np.zeros((0, 0), dtype=dtype), np.zeros(0, dtype=np.int64)
+    widths = np.fromiter((len(line.split()) for line in lines), dtype=np.int64, count=len(lines))
+    table = np.zeros((len(lines), widths.max()), dtype=dtype)
+    for width in np.unique(widths):
+        rows = np.flatnonzero(widths == width)
+        if width == 0:
+            continue
+        block = " ".join(lines[i] for i in rows) if len(rows) < len(lines) else " ".join(lines)
+        table[rows, :width] = np.array(block.split(), dtype=dtype).reshape(len(rows), width)
+    return table, widths
+
+
+def _parameters(lines: list) -> dict:
+    # "value # name (description)"
+    params = {}
+    for line in lines:
+        value, _, name = line.partition("#")
+        if name.strip() != "":
+            params[name.split()[0]] = int(value)
+    return params
+
+
+def _element_parameters(lines: list) -> list:
+    sets = []
+    for line in lines:
+        if "#" in line:
+            sets[-1].update(_parameters([line]))
+        else:
+            sets.append({'iselp': int(line)})
+    return sets
+
+
+def _sets(lines: list) -> dict:
+    # "ispen" lines followed by the rows of the set
+    sets = {}
+    current = None
+    for line in lines:
+        if len(line.split()) == 1:
+            current = int(line)
+            sets[current] = []
+        else:
+            sets[current].append(line)
+    return {k: _table(v)[0] for k, v in sets.items()}
+
+
+def _elements(lines: list, nnodes: dict) -> dict:
+    table, widths = _table(lines, np.int64)
+    if len(table) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {'ielem': empty, 'ielps': empty, 'matno': empty, 'ielnp': empty, 'nnode': empty,
+                'lnods': np.zeros((0, 0), dtype=np.int64)}
+    ielps = table[:, 1]
+    nnode = widths - 4
+    for iselp, n in nnodes.items():
+        nnode[ielps == iselp] = n
+    # the nodal properties index is missing when the elements have none
+    first = widths - nnode
+    ielnp = np.where(first > 3, table[:, min(3, table.shape[1]-1)], 0)
+    lnods = np.zeros((len(table), nnode.max()), dtype=np.int64)
+    for k in np.unique(first):
+        rows = np.flatnonzero(first == k)
+        n = min(lnods.shape[1], table.shape[1] - k)
+        lnods[rows, :n] = table[rows, k:k+n]
+    return {'ielem': table[:, 0], 'ielps': ielps, 'matno': table[:, 2], 'ielnp': ielnp,
+            'nnode': nnode, 'lnods': lnods}
+
+
+def _records(lines: list) -> dict:
+    # loaded element lines ("iface loelf") followed by the rows of its points
+    table, widths = _table(lines)
+    head = widths == 2
+    record = np.cumsum(head) - 1
+    return {'index': table[head, 0].astype(np.int64), 'element': table[head, 1].astype(np.int64),
+            'record': record[~head], 'values': table[~head]}
+
+
+def _parse(name: str, text: str, context: dict):
+    lines = _data_lines(text)
+    if name in ['title', 'load title']:
+        return lines[0] if len(lines) > 0 else ""
+    elif name in ['parameters', 'load parameters']:
+        return _parameters(lines)
+    elif name == 'element parameters':
+        return _element_parameters(lines)
+    elif name == 'nodal properties':
+        return _sets(lines)
+    elif name == 'materials':
+        table, _ = _table(lines)
+        return {int(row[0]): row[1:] for row in table}
+    elif name == 'elements':
+        nnodes = {p['iselp']: p.get('nnode') for p in context.get('element parameters', [])}
+        return _elements(lines, {k: v for k, v in nnodes.items() if v is not None})
+    elif name in ['edge loads', 'face loads']:
+        return _records(lines)
+    elif name == 'load case':
+        return None
+    return _table(lines)[0]
+
+
+def read_gldat(filename: str, sections: list = None, cases: list = None) -> dict:
+    """Reads a .gldat deck, or some of its sections
+
+    Args:
+        filename (str): the name of the deck
+        sections (list, optional): the names of the sections to read (keys of
+            ``section_names``). Defaults to all.
+        cases (list, optional): the load cases to read. Defaults to all.
+
+    Returns:
+        dict: {section name: data} for the sections before the load cases and
+            'load cases': {case: {section name: data}}. The data are:
+
+            - 'title', 'load title': str
+            - 'parameters', 'load parameters': {name: value}
+            - 'element parameters': [{'iselp': ..., 'ntype': ..., 'nnode': ..., ...}]
+            - 'materials': {imats: values}
+            - 'nodal properties': {ispen: (nnode, ncols) array}
+            - 'elements': arrays 'ielem', 'ielps', 'matno', 'ielnp' (0 if missing),
+              'nnode' and 'lnods' (nelem, max nnode), padded with zeros
+            - 'edge loads', 'face loads': arrays 'index', 'element' (one per loaded element),
+              'record' (the loaded element of each row) and 'values'
+            - other sections: the rows as a 2D array, padded with zeros
+    """
+    index = index_gldat(filename)
+    wanted = None if sections is None else set(sections)
+    if wanted is not None and 'elements' in wanted:
+        # the number of nodes of the element sets resolves the element rows
+        wanted.add('element parameters')
+
+    deck = {'load cases': {}}
+    with open(filename, 'rb') as file:
+        for section in index:
+            name, case = section['name'], section['case']
+            if wanted is not None and name not in wanted:
+                continue
+            if case > 0 and cases is not None and case not in cases:
+                continue
+            file.seek(section['start'])
+            text = file.read(section['end'] - section['start']).decode()
+            data = _parse(name, text, deck)
+            if name == 'load case':
+                deck['load cases'].setdefault(case, {})
+            elif case > 0:
+                deck['load cases'].setdefault(case, {})[name] = data
+            else:
+                deck[name] = data
+    if sections is not None and 'element parameters' not in sections:
+        deck.pop('element parameters', None)
+    return deck
+
+
+def to_mesh(deck: dict) -> dict:
+    """Converts the coordinates, elements and fixities of a deck to the mesh arrays of ``structured``
+
+    Args:
+        deck (dict): a deck read with ``read_gldat``, with at least 'coordinates', 'elements'
+            and 'element parameters'
+
+    Returns:
+        dict: 'nodes' (point numbers), 'coords' (npoin, 3), 'elements' ({gmsh type: (element
+            numbers, connectivity as row indices of coords)}) and 'fixno' (rows of coords with
+            fixed degrees of freedom, and their fixity codes)
+    """
+    table = deck['coordinates']
+    order = np.argsort(table[:, 0], kind='stable')
+    nodes = table[order, 0].astype(np.int64)
+    coords = np.zeros((len(table), 3))
+    ndim = min(3, table.shape[1] - 1)
+    coords[:, :ndim] = table[order, 1:ndim+1]
+
+    ntypes = {p['iselp']: p.get('ntype') for p in deck.get('element parameters', [])}
+    elements = {}
+    elems = deck['elements']
+    keys = np.c_[elems['ielps'], elems['nnode']]
+    for ielps, nnode in np.unique(keys, axis=0):
+        rows = np.flatnonzero((keys[:, 0] == ielps) & (keys[:, 1] == nnode))
+        conn = np.searchsorted(nodes, elems['lnods'][rows, :nnode])
+        gtype, _, conn = femix_to_gmsh_nodes(ntypes.get(int(ielps)), int(nnode), conn)
+        tags = elems['ielem'][rows]
+        if gtype in elements:
+            tags = np.concatenate([elements[gtype][0], tags])
+            conn = np.concatenate([elements[gtype][1], conn])
+        elements[gtype] = (tags, conn)
+
+    fixno = (np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.int64))
+    if 'fixities' in deck and len(deck['fixities']) > 0:
+        fixities = deck['fixities'].astype(np.int64)
+        fixno = (np.searchsorted(nodes, fixities[:, 1]), fixities[:, 2:])
+
+    return {'nodes': nodes, 'coords': coords, 'elements': elements, 'fixno': fixno}
+
+
+def read_cmdat(filename: str) -> dict:
+    """Reads the load combinations of a .cmdat file
+
+    Args:
+        filename (str): the name of the file
+
+    Returns:
+        dict: {icomb: {icase: coefficient}}
+    """
+    combinations = {}
+    header, current = "", None
+    with open(filename) as file:
+        for line in file:
+            line = line.strip()
+            if line.startswith("###"):
+                header = line[3:].strip()
+                continue
+            if line == "" or line.startswith("#") or line == "END_OF_FILE":
+                continue
+            if header.startswith("Combination number"):
+                current = int(line.split()[0])
+                combinations[current] = {}
+            elif header.startswith("Coeficients") or header.startswith("Coefficients"):
+                icase, coef = line.split()[:2]
+                cases = combinations[current]
+                cases[int(icase)] = cases.get(int(icase), 0.0) + float(coef)
+    return combinations
@@ -1,16 +1,17 @@
 import gmsh
 import math
 import sys
+from . import gmshsession
 
 # This example shows how to implement a simple interactive pre-processor for a
 # finite element solver; in particular, it shows how boundary conditions,
 # material properties, etc., can be specified on parts of the model.
 
 def gmshApp():
-	gmsh.initialize(sys.argv)
+	gmshsession.acquire(sys.argv)
 
 	if len(sys.argv) > 1:
-			gmsh.open(sys.argv[1])
+			gmsh.merge(sys.argv[1])
 
 	# For Gmsh to know which types of boundary conditions, materials, etc., are
 	# available, you should define "template" ONELAB parameters with names
@@ -232,7 +233,7 @@ def gmshApp():
 	else:
 			runSolver()
 
-	gmsh.finalize()
+	gmshsession.release()
 
 
 if __name__ == "__main__":
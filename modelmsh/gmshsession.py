@@ -0,0 +1,267 @@
+"""Shared gmsh session.
+
+gmsh keeps one global state per process, so the handlers of this package
+share it instead of calling ``gmsh.initialize`` and ``gmsh.finalize``
+themselves. The session counts its users: the first ``acquire`` initializes
+gmsh and the last ``release`` finalizes it. Each handler works on its own
+named model and switches to it before using gmsh, so a pipeline reuses one
+kernel and several objects can keep their models alive at the same time.
+
+If gmsh was initialized by the caller, the session uses it and never
+finalizes it.
+
+Models can be written to disk on a background thread with ``write_model``.
+The gmsh API is not thread safe: while a write is pending, other gmsh calls
+must hold ``lock`` or come after ``wait``. Switching models holds ``lock``,
+removing a model and the last ``release`` join the pending writes first.
+
+Example::
+
+    with gmshsession.model("slab", clear=True):
+        gmsh.model.geo.addPoint(0, 0, 0)
+        ...
+"""
+
+import contextlib
+import os
+import threading
+import gmsh
+
+
+_users = 0
+_owner = False
+_writers = []
+
+# held while the current model is switched or written
+lock = threading.RLock()
+
+
+def acquire(argv: list = None):
+    """Registers a user of the session, initializing gmsh if needed
+
+    Args:
+        argv (list, optional): command line arguments passed to gmsh.initialize. Defaults to None.
+    """
+    global _users, _owner
+    if _users == 0 and not gmsh.is_initialized():
+        if argv is None:
+            gmsh.initialize()
+        else:
+            gmsh.initialize(argv)
+        _owner = True
+    _users += 1
+    return
+
+
+def release():
+    """Unregisters a user of the session; gmsh is finalized by the last user"""
+    global _users, _owner
+    if _users == 0:
+        return
+    _users -= 1
+    if _users == 0:
+        wait()
+    if _users == 0 and _owner:
+        if gmsh.is_initialized():
+            gmsh.finalize()
+        _owner = False
+    return
+
+
+def users() -> int:
+    """Returns the number of users of the session"""
+    return _users
+
+
+def has_model(name: str) -> bool:
+    """Checks if a model exists in the session
+
+    Args:
+        name (str): the name of the model
+
+    Returns:
+        bool: True if the model exists
+    """
+    return gmsh.is_initialized() and name in gmsh.model.list()
+
+
+def unique_name(base: str) -> str:
+    """Returns a model name not yet used in the session
+
+    Args:
+        base (str): the base name, used as is if it is free
+
+    Returns:
+        str: base, or base-2, base-3, ...
+    """
+    names = gmsh.model.list() if gmsh.is_initialized() else []
+    name, i = base, 1
+    while name in names:
+        i += 1
+        name = "%s-%d" % (base, i)
+    return name
+
+
+def use_model(name: str, clear: bool = False) -> str:
+    """Makes a model current, creating it if it does not exist
+
+    Args:
+        name (str): the name of the model
+        clear (bool, optional): removes the previous contents of the model, after the pending
+            background writes. Defaults to False.
+
+    Returns:
+        str: the name of the model
+    """
+    if clear:
+        wait()
+    with lock:
+        if name in gmsh.model.list():
+            gmsh.model.setCurrent(name)
+            if not clear:
+                return name
+            gmsh.model.remove()
+        gmsh.model.add(name)
+    return name
+
+
+def remove_model(name: str):
+    """Removes a model from the session, if it exists
+
+    Pending background writes are joined first, they may be writing it.
+
+    Args:
+        name (str): the name of the model
+    """
+    wait()
+    with lock:
+        if not has_model(name):
+            return
+        current = gmsh.model.getCurrent()
+        gmsh.model.setCurrent(name)
+        gmsh.model.remove()
+        if current != name and current in gmsh.model.list():
+            gmsh.model.setCurrent(current)
+    return
+
+
+def _write(name: str, filename: str, binary: bool, partitions: int):
+    with lock:
+        current = gmsh.model.getCurrent()
+        gmsh.model.setCurrent(name)
+        options = ["Mesh.MshFileVersion", "Mesh.Binary", "Mesh.PartitionSplitMeshFiles"]
+        saved = [gmsh.option.getNumber(option) for option in options]
+        try:
+            gmsh.option.setNumber("Mesh.MshFileVersion", 4.1)
+            gmsh.option.setNumber("Mesh.Binary", int(binary))
+            if partitions > 1:
+                # one file per partition, filename_1.msh ... filename_N.msh
+                gmsh.option.setNumber("Mesh.PartitionSplitMeshFiles", 1)
+                gmsh.model.mesh.partition(partitions)
+            try:
+                gmsh.write(filename)
+            finally:
+                if partitions > 1:
+                    gmsh.model.mesh.unpartition()
+        finally:
+            for option, value in zip(options, saved):
+                gmsh.option.setNumber(option, value)
+            if current != name and current in gmsh.model.list():
+                gmsh.model.setCurrent(current)
+    return
+
+
+def write_model(name: str, filename: str, binary: bool = False, background: bool = False,
+                partitions: int = 0) -> threading.Thread:
+    """Writes a model of the session as a MSH 4.1 file
+
+    With partitions > 1 the mesh is split with gmsh's partitioner and each
+    partition is written to its own file (``stem_1.msh`` ... ``stem_N.msh``);
+    the model is unpartitioned afterwards.
+
+    A background write holds ``lock``; until ``wait`` returns, the caller must
+    not use gmsh without holding ``lock`` too.
+
+    Args:
+        name (str): the name of the model
+        filename (str): the .msh file to be written
+        binary (bool, optional): writes a binary file. Defaults to False.
+        background (bool, optional): writes on a background thread. Defaults to False.
+        partitions (int, optional): number of partitions, 0 or 1 for a single file. Defaults to 0.
+
+    Returns:
+        threading.Thread: the writing thread, None if the file was written before returning
+    """
+    if not background:
+        _write(name, filename, binary, partitions)
+        return None
+    writer = threading.Thread(target=_write, args=(name, filename, binary, partitions),
+                              name="gmsh-write " + filename)
+    _writers.append(writer)
+    writer.start()
+    return writer
+
+
+def partition_files(filename: str, partitions: int) -> list:
+    """Returns the names of the files written by ``write_model`` for a number of partitions
+
+    Args:
+        filename (str): the .msh file given to ``write_model``
+        partitions (int): the number of partitions
+
+    Returns:
+        list: the names of the files
+    """
+    if partitions <= 1:
+        return [filename]
+    stem, suffix = os.path.splitext(filename)
+    return ["%s_%d%s" % (stem, i, suffix) for i in range(1, partitions+1)]
+
+
+def wait():
+    """Waits for the background writes of the session to finish"""
+    while len(_writers) > 0:
+        _writers.pop().join()
+    return
+
+
+@contextlib.contextmanager
+def session(argv: list = None):
+    """Context manager that holds the gmsh session
+
+    Args:
+        argv (list, optional): command line arguments passed to gmsh.initialize. Defaults to None.
+    """
+    acquire(argv)
+    try:
+        yield gmsh
+    finally:
+        release()
+
+
+@contextlib.contextmanager
+def model(name: str, clear: bool = False, keep: bool = True, argv: list = None):
+    """Context manager that holds the session and makes a model current
+
+    The previously current model is restored on exit.
+
+    Args:
+        name (str): the name of the model
+        clear (bool, optional): removes the previous contents of the model. Defaults to False.
+        keep (bool, optional): keeps the model on exit, while the session has other users. Defaults to True.
+        argv (list, optional): command line arguments passed to gmsh.initialize. Defaults to None.
+    """
+    acquire(argv)
+    try:
+        names = gmsh.model.list()
+        previous = gmsh.model.getCurrent() if len(names) > 0 else None
+        use_model(name, clear)
+        try:
+            yield gmsh.model
+        finally:
+            if not keep:
+                remove_model(name)
+            if previous is not None and previous != name and previous in gmsh.model.list():
+                gmsh.model.setCurrent(previous)
+    finally:
+        release()
@@ -9,30 +9,16 @@ import pathlib
 from . import ofemlib
 from ._common import *
 from . import msh
-
-# slabs
-RECTANGULAR = 1
-TRIANGULAR = 2
-CIRCULAR = 3
-CIRCULAR_QUARTER = 4
-CIRCULAR_WITH_HOLE = 5
-CIRCULAR_SEGMENT = 6
-POLYGON = 7
-
-# beams
-LINEAR2D = 101
-CURVED2D = 102
-SPATIAL3D = 103
-
-# supports
-FREE = -1
-HINGED = 0 # 1110
-FIXED = 1 # 1111
-HORIZONTAL = 1100
-VERTICAL = 1010
-ROTATION = 1001
-HOR_ROT = 1101
-VER_ROT = 1011
+from . import gmshsession
+from . import gldat
+from . import plate
+from . import modal
+from . import femsolver
+from .spatial import SpatialIndex
+from .slabdeck import (RECTANGULAR, TRIANGULAR, CIRCULAR, CIRCULAR_QUARTER, CIRCULAR_WITH_HOLE,
+                       CIRCULAR_SEGMENT, POLYGON, LINEAR2D, CURVED2D, SPATIAL3D, FREE, HINGED,
+                       FIXED, HORIZONTAL, VERTICAL, ROTATION, HOR_ROT, VER_ROT, boundary_fixities,
+                       slab_fixities, write_slab_gldat, update_slab_loads, write_slab_cmdat)
 
 
 def rotate_point(point1: tuple, point2: tuple, angle: float) -> tuple:
@@ -47,7 +33,6 @@ def rotate_point(point1: tuple, point2: tuple, angle: float) -> tuple:
 
 
 def Circle(center: tuple, radius: float, msize: float = 0.3):
-    gmsh.model.add("slab")
     pt1 = gmsh.model.geo.addPoint(center[0], center[1], center[2], msize)
     pt2 = gmsh.model.geo.addPoint(center[0]+radius, center[1], center[2], msize)
     pt3 = gmsh.model.geo.addPoint(center[0]-radius, center[1], center[2], msize)
@@ -62,7 +47,6 @@ def Circle(center: tuple, radius: float, msize: float = 0.3):
 
 
 def CircleWithHole(center: tuple, radius_ext: float, radius_int: float, msize: float = 0.3):
-    gmsh.model.add("slab")
     circ_out = gmsh.model.occ.addDisk(center[0], center[1], center[2], radius_ext, radius_ext)
     circ_int = gmsh.model.occ.addDisk(center[0], center[1], center[2], radius_int, radius_int)
     a, b = gmsh.model.occ.cut([(2, circ_out)], [(2, circ_int)])
@@ -81,7 +65,6 @@ def CircleWithHole(center: tuple, radius_ext: float, radius_int: float, msize: f
 
 
 def CircleSegment(center: tuple, radius: float, startangle: float, endangle: float, msize: float = 0.3):
-    gmsh.model.add("slab")
     angle = endangle - startangle
     pt1 = gmsh.model.geo.addPoint(center[0], center[1], center[2], msize)
     pn2 = rotate_point(center, (center[0]+radius, center[1]), startangle)
@@ -101,7 +84,6 @@ def CircleSegment(center: tuple, radius: float, startangle: float, endangle: flo
 
 
 def CirleQuarter(center: tuple, radius: float, angle: float, msize: float = 0.3):
-    gmsh.model.add("slab")
     pt1 = gmsh.model.geo.addPoint(center[0], center[1], center[2], msize)
     pn2 = rotate_point(center, (center[0]+radius, center[1]), angle)
     pt2 = gmsh.model.geo.addPoint(pn2[0], pn2[1], center[2], msize)
@@ -128,7 +110,6 @@ def CirleQuarter(center: tuple, radius: float, angle: float, msize: float = 0.3)
 
 
 def Rectangle(bleft: tuple, width: float, height: float, angle: float, msize: float = 0.3):
-    gmsh.model.add("slab")
     pt1 = gmsh.model.geo.addPoint(bleft[0]      , bleft[1]       , bleft[2], msize)
     pn2 = rotate_point(bleft, (bleft[0]+width, bleft[1]), angle)
     pt2 = gmsh.model.geo.addPoint(pn2[0], pn2[1], bleft[2], msize)
@@ -244,12 +225,57 @@ def SpatialBeam(points: tuple, msize: float = 0.3):
     return pt, ln
 
 
+def _add_result_views(model: str, results: dict, nodetags: np.ndarray, elemtags: np.ndarray):
+    # one view per result component, with the combinations as time steps
+    df = results[ofemlib.DI_CSV]
+    columns = [c for c in df.columns if c.startswith('disp-')][:3]
+    icomb = df['icomb'].values if 'icomb' in df else np.ones(len(df))
+    msh.addResultViews(model, columns, "NodeData", nodetags[df['point'].values-1], df[columns].values, icomb)
+
+    df = results[ofemlib.AST_CSV]
+    columns = [c for c in df.columns if c.startswith('str-')][:5]
+    icomb = df['icomb'].values if 'icomb' in df else np.ones(len(df))
+    msh.addResultViews(model, ["str_avg-" + c[4:] for c in columns], "NodeData",
+                       nodetags[df['point'].values-1], df[columns].values, icomb)
+
+    df = results[ofemlib.EST_CSV]
+    columns = [c for c in df.columns if c.startswith('str-')][:5]
+    icomb = df['icomb'].values if 'icomb' in df else np.ones(len(df))
+    msh.addResultViews(model, ["str_eln-" + c[4:] for c in columns], "ElementNodeData",
+                       elemtags[df['element'].values-1], df[columns].values, icomb)
+    return
+
+
 class Slab:
     
     def __init__(self) -> None:
-        if not gmsh.is_initialized():
-            gmsh.initialize()
+        gmshsession.acquire()
+        self._model = gmshsession.use_model(gmshsession.unique_name("slab"))
+        self._spatial = None
+        self._deck = None
+        return
+
+    def _activate(self):
+        if self._model is None:
+            raise RuntimeError("The slab has been closed.")
+        gmshsession.use_model(self._model)
+        return
+
+    def close(self):
+        """Removes the slab model and releases the gmsh session"""
+        if self._model is not None:
+            gmshsession.remove_model(self._model)
+            self._model = None
+            gmshsession.release()
         return
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        """Spatial index of the slab mesh (gmsh tags), built on first use."""
+        if self._spatial is None:
+            self._activate()
+            self._spatial = msh.getSpatialIndex(gmsh.model, 2)
+        return self._spatial
     
     def addGeometry(self, geometry: int, *args, **kwargs):
         """_summary_
@@ -260,7 +286,9 @@ class Slab:
         Raises:
             ValueError: _description_
         """
-        gmsh.model.add("slab")
+        self._activate()
+        gmshsession.use_model(self._model, clear=True)
+        self._spatial = None
         if geometry == RECTANGULAR:
             msize = 0.3 if len(args) < 5 else args[4]
             Rectangle(args[0], args[1], args[2], args[3], msize)
@@ -292,18 +320,14 @@ class Slab:
     def addParameters(self, **kwargs):
         self.fixno = {}
         if "boundary" in kwargs:
+            self._activate()
             bounddary_condition = kwargs["boundary"]
             # if len(bounddary_condition) != len (bounds):
             #     raise ValueError("Invalid boundary conditions.")
-            for i, b in enumerate(bounddary_condition):
-                bounds, _, _ = gmsh.model.mesh.getNodes(1, i+1, includeBoundary=True)
-                if b == FREE:
-                    pass
-                elif b in [FIXED, HINGED]:
-                    for inode in bounds:
-                        self.fixno[inode] = b if inode not in self.fixno else max(b, self.fixno[inode])
-                else:
-                    raise ValueError("Invalid boundary conditions.")
+            bounds = [gmsh.model.mesh.getNodes(1, i+1, includeBoundary=True)[0]
+                      for i in range(len(bounddary_condition))]
+            nodes, codes = boundary_fixities(bounds, bounddary_condition)
+            self.fixno = dict(zip(nodes.tolist(), codes.tolist()))
         
         if "material" in kwargs:
             self.material = kwargs["material"]
@@ -312,192 +336,87 @@ class Slab:
             self.thick = kwargs["thick"]
         
         if "load" in kwargs:
-            self.load = float(kwargs["load"])
+            load = kwargs["load"]
+            self.load = float(load) if np.isscalar(load) else [float(l) for l in load]
 
         return
 
-    def to_ofem(self, mesh_file: str):
-        """Writes a femix .gldat mesh file
+    def _mesh_arrays(self) -> tuple:
+        # the points of the slab elements, the elements and the supported rows
+        self._activate()
+        nodeTags, coords, elements = msh.getMeshArrays(gmsh.model, 2)
+        used = np.unique(np.concatenate([c.ravel() for _, c in elements.values()]))
+        renum = np.full(len(nodeTags), -1, dtype=np.int64)
+        renum[used] = np.arange(len(used))
+        elements = {t: (e, renum[c]) for t, (e, c) in elements.items()}
+        nodeTags = nodeTags[used]
+        coords = coords[used]
+
+        fixnodes = np.fromiter(self.fixno.keys(), dtype=np.int64, count=len(self.fixno))
+        fixcodes = np.fromiter(self.fixno.values(), dtype=np.int64, count=len(self.fixno))
+        fixrows = np.searchsorted(nodeTags, fixnodes)
+        return nodeTags, coords, elements, (fixrows, fixcodes)
+
+    def write_ofem(self, mesh_file: str) -> str:
+        """Writes the femix .gldat mesh file and the .cmdat combinations file
 
         Args:
             mesh_file (str): the name of the file to be written
+
+        Returns:
+            str: the job name (path without extension)
         """
-        ndime = 3
-        
         path = pathlib.Path(mesh_file)
         if path.suffix.lower() != ".gldat":
-            mesh_file = path.with_suffix('').resolve() + ".gldat"
+            path = path.with_suffix('.gldat')
+            mesh_file = str(path)
 
-        nodeTags, nodeCoords, _ = gmsh.model.mesh.getNodes(2, includeBoundary=True)
-        coordlist = dict(zip(nodeTags, np.arange(len(nodeTags))))
-        # coords = np.array(nodeCoords).reshape(-1, 3)
-        # sorted_dict_by_keys = {key: coordlist[key] for key in sorted(coordlist)}
-        eleTypes, eleTags, eleNodes = gmsh.model.mesh.getElements(2)
-        elemlist = dict(zip(np.arange(1, 1+len(eleTags[0])), eleTags[0]))
-        self.nelems = len(eleTags[0])
+        nodeTags, coords, elements, (fixrows, fixcodes) = self._mesh_arrays()
+        elemTags = write_slab_gldat(mesh_file, coords, elements, (fixrows, fixcodes),
+                                    self.material, self.thick, self.load)
+        self.nelems = len(elemTags)
         self.npoints = len(nodeTags)
         self.nmats = 1
-        self.nsections = 1
+        self.nsections = len(elements)
         self.nspecnodes = len(self.fixno)
-        ndime = 3
-        props = meshio_femix[gmsh_meshio[eleTypes[0]]]
-        ntype = props[0]
-        nnode = props[1]
 
-        with open(mesh_file, 'w') as file:
+        write_slab_cmdat(str(path.with_suffix('.cmdat')), len(np.atleast_1d(self.load)))
+        gldat.write_index(mesh_file)
+        self._deck = (mesh_file, elements)
 
-            file.write("### Main title of the problem\n")
-            file.write("Slab mesh\n")
+        self._nodelist = nodeTags
+        self._elemtags = elemTags
+        self._elemlist = dict(zip(np.arange(1, 1+len(elemTags)), elemTags))
+        return str(path.parent / path.stem)
 
-            file.write("\n")
-            file.write("### Main parameters\n")
-            file.write("%5d # nelem (n. of elements in the mesh)\n" % self.nelems)
-            file.write("%5d # npoin (n. of points in the mesh)\n" % self.npoints)
-            file.write("%5d # nvfix (n. of points with fixed degrees of freedom)\n" % self.nspecnodes)
-            file.write("%5d # ncase (n. of load cases)\n" % 1)
-            file.write("%5d # nselp (n. of sets of element parameters)\n" % 1)
-            file.write("%5d # nmats (n. of sets of material properties)\n" % 1)
-            file.write("%5d # nspen (n. of sets of element nodal properties)\n" % 1)
-            file.write("%5d # nmdim (n. of geometric dimensions)\n" % 2)
-            file.write("%5d # nnscs (n. of nodes with specified coordinate systems)\n" % 0)
-            file.write("%5d # nsscs (n. of sets of specified coordinate systems)\n" % 0)
-            file.write("%5d # nncod (n. of nodes with constrained d.o.f.)\n" % 0)
-            file.write("%5d # nnecc (n. of nodes with eccentric connections)\n" % 0)
+    def update_loads(self, load) -> str:
+        """Changes the loads of the deck written by ``write_ofem``, rewriting only the load cases
 
-            file.write("\n")
-            file.write("### Sets of element parameters\n")
-            file.write("# iselp\n")
-            file.write(" %6d\n" % 1)
-            file.write("# element parameters\n")
-            file.write("%5d # ntype (n. of element type)\n" % 5)
-            file.write("%5d # nnode (n. of nodes per element)\n" % props[1])
-            file.write("%5d # ngauq (n. of Gaussian quadrature) (stiffness)\n" % props[3])
-            file.write("%5d # ngaus (n. of Gauss points in the formulation) (stiffness)\n" % props[4])
-            file.write("%5d # ngstq (n. of Gaussian quadrature) (stresses)\n" % props[5])
-            file.write("%5d # ngstr (n. of Gauss points in the formulation) (stresses)\n" % props[6])
+        The deck may already have been solved by ``to_ofem``; it is then taken
+        from the .ofem archive.
 
-            file.write("\n")
-            file.write("### Sets of material properties\n")
-            file.write("### (Young modulus, Poisson ratio, mass/volume and thermic coeff.\n")
-            file.write("# imats         young        poiss        dense        alpha\n")
-            file.write("  %5d  %16.3f %16.3f %16.3f %16.3f\n" % (1,
-                self.material['E'],self.material['nu'],self.material['rho'],self.material['alpha']))
-
-            file.write("\n")
-            file.write("### Sets of element nodal properties\n")
-            file.write("# ispen\n")
-            file.write(" %6d\n" % 1)
-            file.write("# inode       thick\n")
-            for inode in range(1, nnode+1):
-                file.write(" %6d     %15.3f\n" % (inode, self.thick))
-
-            file.write("\n")
-            file.write("### Element parameter index, material properties index, element nodal\n")
-            file.write("### properties index and list of the nodes of each element\n")
-            file.write("# ielem ielps matno ielnp       lnods ...\n")
-            count = 0
-            for i, elem in enumerate(eleTags[0]):
-                file.write(" %6d %5d %5d %5d    " % (i+1, 1, 1, 1))
-                for inode in range(nnode):
-                    file.write(" %8d" % eleNodes[0][count])
-                    count += 1
-                file.write("\n")
-
-            file.write("\n")
-            file.write("### Coordinates of the points\n")
-            file.write("# ipoin            coord-x            coord-y            coord-z\n")
-            icount = 1
-            for i, ipoin in enumerate(nodeTags):
-                node = coordlist[i+1]
-                count = int(3*node)
-                file.write(" %6d    %16.8lf   %16.8lf\n" % (i+1, nodeCoords[count], nodeCoords[count+1]))
-                icount += 1
-
-            file.write("\n")
-            file.write("### Points with fixed degrees of freedom and fixity codes (1-fixed0-free)\n")
-            file.write("# ivfix  nofix       ifpre ...\n")
-            count = 1
-            for i, fix in self.fixno.items():
-                sup = " 1  1  1" if fix==FIXED else " 1  0  0"
-                file.write(" %6d %6d      %s\n" % (count, i, sup))
-                count += 1
-
-            file.write("\n")
-            file.write("# ===================================================================\n")
-
-            file.write("\n")
-            file.write("### Load case n. %8d\n" % 1)
-
-            file.write("\n")
-            file.write("### Title of the load case\n")
-            file.write("Uniform distributed load\n")
-
-            file.write("\n")
-            file.write("### Load parameters\n")
-            file.write("%5d # nplod (n. of point loads in nodal points)\n" % 0)
-            file.write("%5d # ngrav (gravity load flag: 1-yes0-no)\n" % 0)
-            file.write("%5d # nedge (n. of edge loads) (F.E.M. only)\n" % 0)
-            file.write("%5d # nface (n. of face loads) (F.E.M. only)\n" % self.nelems)
-            file.write("%5d # ntemp (n. of points with temperature variation) (F.E.M. only)\n" % 0)
-            file.write("%5d # nudis (n. of uniformly distributed loads " % 0)
-            file.write("(3d frames and trusses only)\n")
-            file.write("%5d # nepoi (n. of element point loads) (3d frames and trusses only)\n" % 0)
-            file.write("%5d # nprva (n. of prescribed and non zero degrees of freedom)\n" % 0)
-
-            file.write("\n")
-            file.write("### Face load (loaded element, loaded points and load value)\n")
-            file.write("### (local coordinate system)\n")
-            count = 0
-            for i, elem in enumerate(eleTags[0]):
-                file.write("# iface  loelf\n")
-                file.write(" %5d %5d\n" % (i+1, i+1))
-                file.write("# lopof       prfac-n   prfac-mb   prfac-mt\n")
-                for j in range(nnode):
-                    inode = eleNodes[0][count]
-                    file.write(" %5d %16.3f %16.3f %16.3f\n" % (inode, self.load, 0.0, 0.0))
-                    count += 1
-
-            file.write("\n")
-            file.write("END_OF_FILE\n")
-
-        if path.suffix.lower() == ".gldat":
-            mesh_file = str(path.parent / path.stem) + ".cmdat"
-        
-        with open(mesh_file, 'w') as file:
-
-            file.write("### Main title of the problem\n")
-            file.write("Slab mesh\n")
-
-            file.write("### Number of combinations\n")
-            file.write("      2 # ncomb (number of combinations)\n\n")
-
-            file.write("### Combination title\n")
-            file.write("G\n")
-            file.write("### Combination number\n")
-            file.write("# combination n. (icomb) and number off load cases in combination (ncase)\n")
-            file.write("# icomb    lcase\n")
-            file.write("      1        1\n")
-            file.write("### Coeficients\n")
-            file.write("# load case number (icase) and load coefficient (vcoef)\n")
-            file.write("# icase      vcoef\n")
-            file.write("      1       1.00\n")
-            file.write("\n")
+        Args:
+            load (float | list): the uniform face load of each load case
 
-            file.write("### Combination title\n")
-            file.write("1.35G\n")
-            file.write("### Combination number\n")
-            file.write("# combination n. (icomb) and number off load cases in combination (ncase)\n")
-            file.write("# icomb    lcase\n")
-            file.write("      2        1\n")
-            file.write("### Coeficients\n")
-            file.write("# load case number (icase) and load coefficient (vcoef)\n")
-            file.write("# icase      vcoef\n")
-            file.write("      1       1.35\n")
-            file.write("\n")
+        Returns:
+            str: the job name (path without extension)
+        """
+        if self._deck is None:
+            raise RuntimeError("The slab deck has not been written.")
+        mesh_file, elements = self._deck
+        self.load = float(load) if np.isscalar(load) else [float(l) for l in load]
+        update_slab_loads(mesh_file, elements, self.load)
+        path = pathlib.Path(mesh_file)
+        write_slab_cmdat(str(path.with_suffix('.cmdat')), len(np.atleast_1d(self.load)))
+        return str(path.parent / path.stem)
 
-            file.write("END_OF_FILE\n")
+    def to_ofem(self, mesh_file: str):
+        """Writes a femix .gldat mesh file, runs the solver and adds the results as gmsh views
 
-        jobname = str(path.parent / path.stem)
+        Args:
+            mesh_file (str): the name of the file to be written
+        """
+        jobname = self.write_ofem(mesh_file)
         txt = ofemlib.ofemSolver(jobname)
 
         options = {'csryn': 'n', 'ksres': 2, 'lcaco': 'c'}
@@ -505,64 +424,104 @@ class Slab:
         codes = [ofemlib.DI_CSV, ofemlib.AST_CSV, ofemlib.EST_CSV]
         txt = ofemlib.ofemResults(jobname, codes, **options)
 
-        df = ofemlib.get_csv_from_ofem(jobname, ofemlib.DI_CSV)
-        for i in range(1, 4):
-            t1 = gmsh.view.add("disp-" + str(i))
-            dff = df.loc[df['icomb'] == 1]
-            gmsh.view.addHomogeneousModelData(
-                    t1, 0, "slab", "NodeData", dff["point"].values, dff['disp-'+str(i)].values) 
-            gmsh.view.option.setNumber(t1, "Visible", 0)
-            
-        t1 = gmsh.view.add("deformed mesh")
-        dff = df.loc[df['icomb'] == 1]
-        npoin = dff.shape[0]
-        displ = np.stack([np.zeros(npoin), np.zeros(npoin), dff['disp-1'].values], axis=1).reshape(3*npoin)
-        gmsh.view.addHomogeneousModelData(
-                t1, 0, "slab", "NodeData", dff["point"].values, displ, numComponents=3) 
-
-        df = ofemlib.get_csv_from_ofem(jobname, ofemlib.AST_CSV)
-        for i in range(1, 6):
-            t1 = gmsh.view.add("str_avg-" + str(i))
-            dff = df.loc[df['icomb'] == 1]
-            gmsh.view.addHomogeneousModelData(
-                    t1, 0, "slab", "NodeData", dff['point'].values, dff['str-'+str(i)].values) 
-            gmsh.view.option.setNumber(t1, "Visible", 0)
-
-        df = ofemlib.get_csv_from_ofem(jobname, ofemlib.EST_CSV)
-        unique_values = [elemlist.get(item, item) for item in df["element"].unique().tolist()]
-        for i in range(1, 6):
-            t1 = gmsh.view.add("str_eln-" + str(i))
-            dff = df.loc[df['icomb'] == 1]
-            gmsh.view.addHomogeneousModelData(
-                    t1, 0, "slab", "ElementNodeData", unique_values, dff['str-'+str(i)].values) 
-            gmsh.view.option.setNumber(t1, "Visible", 0)
+        results = ofemlib.get_results_from_ofem(jobname, codes)
+        self._show_results(results)
+        return
 
+    def solve(self, views: bool = True) -> dict:
+        """Analyses the slab in process, without writing a deck or running femix
+
+        Each load case is solved as one combination (femix adds 1.35G when
+        there is only one load case).
+
+        Args:
+            views (bool, optional): adds the results as gmsh views. Defaults to True.
+
+        Returns:
+            dict: the results, as ``ofemlib.get_results_from_ofem`` (see ``plate.solve_plates``)
+        """
+        nodeTags, coords, elements, (fixrows, fixcodes) = self._mesh_arrays()
+        results = plate.solve_plates(coords, elements, (fixrows, slab_fixities(fixcodes)),
+                                     self.material, self.thick, self.load)
+        self._nodelist = nodeTags
+        self._elemtags = np.concatenate([elements[t][0] for t in sorted(elements)])
+        if views:
+            self._show_results(results)
+        return results
+
+    def modes(self, nmodes: int = 6, lumped: bool = False, views: bool = True) -> dict:
+        """Computes the lowest vibration modes of the slab
+
+        Args:
+            nmodes (int, optional): the number of modes. Defaults to 6.
+            lumped (bool, optional): lumped masses. Defaults to False.
+            views (bool, optional): adds the mode shapes as a gmsh view. Defaults to True.
+
+        Returns:
+            dict: the modes, see ``modal.modes``
+        """
+        nodeTags, coords, elements, (fixrows, fixcodes) = self._mesh_arrays()
+        K, M = modal.plate_matrices(coords, elements, self.material, self.thick, lumped)
+        fixed = femsolver.fixed_dofs(len(coords), plate.NDOF, (fixrows, slab_fixities(fixcodes)))
+        result = modal.modes(K, M, fixed, nmodes, plate.NDOF)
+        if views:
+            self._activate()
+            modal.add_mode_views(self._model, nodeTags, result)
+        return result
+
+    def _show_results(self, results: dict):
+        self._activate()
+        _add_result_views(self._model, results, self._nodelist, self._elemtags)
+
+        df = results[ofemlib.DI_CSV]
+        npoin = df.shape[0]
+        displ = np.stack([np.zeros(npoin), np.zeros(npoin), df['disp-1'].values], axis=1)
+        msh.addResultViews(self._model, ["deformed mesh"], "NodeData", self._nodelist[df["point"].values-1],
+                           displ, df['icomb'].values, numComponents=3, visible=True)
         return
 
     def getNodes(self):
+        self._activate()
         nodes = msh.getNodes(gmsh.model)
         return
 
     def getElements(self):
+        self._activate()
         elems = msh.getElementShell(gmsh.model)
         return
 
     def getBoundaries(self):
+        self._activate()
         bounds = msh.getBoundaries(gmsh.model)
         return
     
     def run(self):
         # Launch the GUI to see the results:
+        self._activate()
         if '-nopopup' not in sys.argv:
             gmsh.fltk.run()
 
-        gmsh.finalize()
+        self.close()
 
     
 class Beam:
     def __init__(self) -> None:
-        if not gmsh.is_initialized():
-            gmsh.initialize()
+        gmshsession.acquire()
+        self._model = gmshsession.use_model(gmshsession.unique_name("beam"))
+        return
+
+    def _activate(self):
+        if self._model is None:
+            raise RuntimeError("The beam has been closed.")
+        gmshsession.use_model(self._model)
+        return
+
+    def close(self):
+        """Removes the beam model and releases the gmsh session"""
+        if self._model is not None:
+            gmshsession.remove_model(self._model)
+            self._model = None
+            gmshsession.release()
         return
     
     def addGeometry(self, geometry: int, *args, **kwargs):
@@ -575,7 +534,8 @@ class Beam:
             ValueError: _description_
         """
 
-        gmsh.model.add("beam")
+        self._activate()
+        gmshsession.use_model(self._model, clear=True)
         if geometry == LINEAR2D:
             msize = 0.3 if len(args) < 2 else args[1]
             LinearBeam(args[0], msize)
@@ -617,20 +577,33 @@ class Beam:
         if "load" in kwargs:
             self.load = float(kwargs["load"])
 
+        if "section" in kwargs:
+            sec = kwargs["section"]
+            self.area = sec['A']
+            self.inertia = sec['It']
+            self.inertia2 = sec['I2']
+            self.inertia3 = sec['I3']
+            self.angle = sec.get('angle', 0.0)
+
         return
 
-    def to_ofem(self, mesh_file: str):
-        """Writes a femix .gldat mesh file
+    def write_ofem(self, mesh_file: str) -> str:
+        """Writes the femix .gldat mesh file and the .cmdat combinations file
 
         Args:
             mesh_file (str): the name of the file to be written
+
+        Returns:
+            str: the job name (path without extension)
         """
         ndime = 3
         
         path = pathlib.Path(mesh_file)
         if path.suffix.lower() != ".gldat":
-            mesh_file = path.with_suffix('').resolve() + ".gldat"
+            path = path.with_suffix('.gldat')
+            mesh_file = str(path)
 
+        self._activate()
         nodeTags, nodeCoords, _ = gmsh.model.mesh.getNodes(1, includeBoundary=True)
         coordlist = dict(zip(nodeTags, np.arange(len(nodeTags))))
         # coords = np.array(nodeCoords).reshape(-1, 3)
@@ -800,43 +773,37 @@ class Beam:
             file.write("      1       1.00\n")
             file.write("\n")
 
-        jobname = str(path.parent / path.stem)
+        self._nodelist = np.arange(1, self.npoints+1)
+        self._elemtags = np.asarray(eleTags[0])
+        self._elemlist = elemlist
+        return str(path.parent / path.stem)
+
+    def to_ofem(self, mesh_file: str):
+        """Writes a femix .gldat mesh file, runs the solver and adds the results as gmsh views
+
+        Args:
+            mesh_file (str): the name of the file to be written
+        """
+        jobname = self.write_ofem(mesh_file)
         ofemlib.ofemSolver(jobname)
 
         options = {'csryn': 'n', 'ksres': 2}
         codes = [ofemlib.DI_CSV, ofemlib.AST_CSV, ofemlib.EST_CSV, ofemlib.RS_CSV]
         ofemlib.ofemResults(jobname, codes, **options)
 
-        df = ofemlib.get_csv_from_ofem(jobname, ofemlib.DI_CSV)
-        for i in range(1, 4):
-            t1 = gmsh.view.add("disp-" + str(i))
-            gmsh.view.addHomogeneousModelData(
-                    t1, 0, "beam", "NodeData", df["point"].values, df['disp-'+str(i)].values) 
-            gmsh.view.option.setNumber(t1, "Visible", 0)
-
-        df = ofemlib.get_csv_from_ofem(jobname, ofemlib.AST_CSV)
-        for i in range(1, 6):
-            t1 = gmsh.view.add("str_avg-" + str(i))
-            gmsh.view.addHomogeneousModelData(
-                    t1, 0, "beam", "NodeData", df['point'].values, df['str-'+str(i)].values) 
-            gmsh.view.option.setNumber(t1, "Visible", 0)
-
-        df = ofemlib.get_csv_from_ofem(jobname, ofemlib.EST_CSV)
-        unique_values = [elemlist.get(item, item) for item in df["element"].unique().tolist()]
-        for i in range(1, 6):
-            t1 = gmsh.view.add("str_eln-" + str(i))
-            gmsh.view.addHomogeneousModelData(
-                    t1, 0, "beam", "ElementNodeData", unique_values, df['str-'+str(i)].values) 
-            gmsh.view.option.setNumber(t1, "Visible", 0)
+        results = ofemlib.get_results_from_ofem(jobname, [ofemlib.DI_CSV, ofemlib.AST_CSV, ofemlib.EST_CSV])
+        self._activate()
+        _add_result_views(self._model, results, self._nodelist, self._elemtags)
 
         return
 
     def run(self):
         # Launch the GUI to see the results:
+        self._activate()
         if '-nopopup' not in sys.argv:
             gmsh.fltk.run()
 
-        gmsh.finalize()
+        self.close()
 
 
 
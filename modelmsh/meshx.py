@@ -1,6 +1,3 @@
-import meshio
-import gmsh
-import openpyxl
 import numpy as np
 import pandas as pd
 import copy
@@ -20,6 +17,7 @@ class ofem_handler:
         self._info: dict = {}
         self._specialnodes: pd.DataFrame  = pd.DataFrame(columns=['tag', 'node', 'fixed'])
         self._types: list = []
+        self._sections: list = []
         self._framesections: list = []
         self._areasections: list = []
         self._materials: list = []
@@ -29,8 +27,10 @@ class ofem_handler:
         self._solidloads: list = []
         self._combinations: list = []
         self_gmsh = None
+        self._spatial = None
 
     def read_mesh(self, mesh_file):
+        import meshio
         self._mesh = meshio.read(mesh_file)
         return self._mesh
 
@@ -52,75 +52,194 @@ class ofem_handler:
 
         return mesh_file
 
+    def _read_meshio(self, mesh_file: str) -> tuple:
+        import meshio
+        mesh = meshio.read(mesh_file)
+        blocks = [(m.type, None, np.asarray(m.data), None, None) for m in mesh.cells]
+        return None, np.asarray(mesh.points, dtype=float), blocks
+
+    def _read_gmsh(self, mesh_file: str) -> tuple:
+        import gmsh
+        from . import gmshsession
+        from .msh import getPhysicalAttrAndValue
+
+        name = gmshsession.unique_name(Path(mesh_file).stem)
+        with gmshsession.model(name, keep=False):
+            gmsh.merge(mesh_file)
+
+            nodeTags, coords, _ = gmsh.model.mesh.getNodes()
+            nodeTags, index = np.unique(nodeTags, return_index=True)
+            coords = np.asarray(coords, dtype=float).reshape(-1, 3)[index]
+
+            # physical groups: element tags with their section and group names
+            ptags, psection, pgroup = [], [], []
+            for dim, tag in gmsh.model.getPhysicalGroups():
+                attr, value = getPhysicalAttrAndValue(gmsh.model.getPhysicalName(dim, tag))
+                if attr in ['section', 'sec']:
+                    section, group = value, None
+                elif attr in ['group', '']:
+                    section, group = None, value
+                else:
+                    continue
+                for entity in gmsh.model.getEntitiesForPhysicalGroup(dim, tag):
+                    for etags in gmsh.model.mesh.getElements(dim, entity)[1]:
+                        ptags.append(np.asarray(etags))
+                        psection.extend([section]*len(etags))
+                        pgroup.extend([group]*len(etags))
+
+            blocks = []
+            for gtype in gmsh.model.mesh.getElementTypes():
+                etags, enodes = gmsh.model.mesh.getElementsByType(gtype)
+                etags = np.asarray(etags)
+                conn = np.searchsorted(nodeTags, enodes).reshape(len(etags), -1)
+                blocks.append((gmsh_meshio[gtype], etags, conn, None, None))
+
+        if len(ptags) == 0:
+            return nodeTags, coords, blocks
+
+        ptags = np.concatenate(ptags)
+        psection = np.asarray(psection, dtype=object)
+        pgroup = np.asarray(pgroup, dtype=object)
+        order = np.argsort(ptags, kind='stable')
+        ptags, psection, pgroup = ptags[order], psection[order], pgroup[order]
+
+        def lookup(tags, names):
+            # name of the last physical group of each element with a name of this kind
+            known = np.nonzero(names != None)[0]
+            keys, last = ptags[known], known
+            if len(keys) == 0:
+                return np.full(len(tags), None, dtype=object)
+            ends = np.searchsorted(keys, tags, side='right') - 1
+            found = (ends >= 0) & (keys[np.maximum(ends, 0)] == tags)
+            result = np.full(len(tags), None, dtype=object)
+            result[found] = names[last[ends[found]]]
+            return result
+
+        blocks = [(mtype, etags, conn, lookup(etags, psection), lookup(etags, pgroup))
+                  for mtype, etags, conn, _, _ in blocks]
+        return nodeTags, coords, blocks
+
     def import_mesh(self, mesh_file: str, mesh_format: str="gmsh"):
+        """Imports a mesh file
+
+        .msh files are read once with the gmsh API, keeping the physical groups:
+        "section: name" groups split the element blocks into sections and "group: name"
+        (or unqualified) groups set the group of their elements. The other formats,
+        and .msh files that gmsh is not available to read or cannot read, are read
+        with meshio.
+
+        Args:
+            mesh_file (str): the name of the file to be read
+            mesh_format (str, optional): the reader of .msh files, "gmsh" or "meshio".
+                Defaults to "gmsh".
+        """
         path = Path(mesh_file)
         file = path.stem
         sufffix = path.suffix.lower()
 
-        if mesh_format == "gmsh" or sufffix == ".msh":
-            # gmsh.initialize()
-            # self._gmsh = gmsh.open(mesh_file)
-            mesh = meshio.read(mesh_file)
-
-            self._points = pd.DataFrame(mesh.points, np.arange(len(mesh.points)), ['x', 'y', 'z'])
-            self._points['tag'] = np.arange(len(mesh.points))
-            self._info['npoints'] = len(self._points)
-
-            #self._elements: pd.DataFrame = pd.DataFrame(columns=['nodes', 'dtype'])
-            isection = 0
-            imaterial = 0
-            for m in mesh.cells:
-                if m.type == 'vertex':
-                    newrow = pd.DataFrame({'node': list(m.data)})
-                    self._specialnodes = pd.concat([self._specialnodes, newrow])
+        nodeTags = None
+        if sufffix == ".msh" and mesh_format == "gmsh":
+            try:
+                nodeTags, coords, blocks = self._read_gmsh(mesh_file)
+            except Exception:
+                # gmsh cannot be loaded (ImportError, OSError) or cannot parse the file
+                # (Exception); the model and the session were already released
+                nodeTags, coords, blocks = self._read_meshio(mesh_file)
+        else:
+            nodeTags, coords, blocks = self._read_meshio(mesh_file)
+
+        npoints = len(coords)
+        self._points = pd.DataFrame(coords, np.arange(npoints), ['x', 'y', 'z'])
+        self._points['tag'] = np.arange(npoints)
+        self._points['numtag'] = np.arange(1, npoints+1) if nodeTags is None else nodeTags
+        self._info['npoints'] = npoints
+
+        self._types = []
+        self._materials = []
+        self._sections = []
+        elements = []
+        specialnodes = []
+        isection = 0
+        imaterial = 0
+        for mtype, etags, conn, secnames, groups in blocks:
+            if mtype == 'vertex':
+                specialnodes.append(pd.DataFrame({'node': list(conn)}))
+                continue
+
+            if mtype == 'line':
+                conn = np.sort(conn, axis=1)
+            if secnames is None:
+                secnames = np.full(len(conn), None, dtype=object)
+            # one set of element parameters (and section) for each section of the block
+            keys = np.asarray(['' if n is None else n for n in secnames], dtype=object)
+            for secname in pd.unique(keys):
+                rows = np.nonzero(keys == secname)[0]
+                newrow = pd.DataFrame({'nodes': list(conn[rows])})
+                newrow['numtag'] = rows + 1 if etags is None else etags[rows]
+                newrow['dtype'] = mtype
+                newrow['section type'] = meshio_sections[mtype]
+                newrow['type'] = meshio_femix[mtype][0]
+                newrow['nnodes'] = meshio_femix[mtype][1]
+                newrow['nodals'] = meshio_femix[mtype][2]
+                newrow['gtype'] = int(meshio_gmsh[mtype])
+                newrow['section name'] = secname
+                newrow['group'] = 'all' if groups is None else [g or 'all' for g in groups[rows]]
+
+                if meshio_femix[mtype][2] != 0:
+                    isection += 1
+                    ksection = isection
+                    self._sections.append(meshio_sections[mtype])
                 else:
-                    newrow = pd.DataFrame({'nodes': list(m.data)})
-                    newrow['dtype'] = m.type
-                    newrow['section type'] = meshio_sections[m.type]
-                    newrow['type'] = meshio_femix[m.type][0]
-                    newrow['nnodes'] = meshio_femix[m.type][1]
-                    newrow['nodals'] = meshio_femix[m.type][2]
-                    newrow['gtype'] = int(meshio_gmsh[m.type])
-                    newrow['group'] = 'all'
-
-                    if meshio_femix[m.type][2] != 0:     
-                        isection += 1
-                        ksection = isection
-                        self._sections.append(meshio_sections[m.type])
-                    else:
-                        ksection = -1
-                        
-                    if m.type == 'line':
-                        for row in newrow.itertuples():
-                            node1 = row.nodes[0]
-                            node2 = row.nodes[1]
-                            if node1 > node2:
-                                newrow.at[row.Index, 'nodes'][0] = node2 
-                                newrow.at[row.Index, 'nodes'][1] = node1
-                    
-                    newrow['section'] = ksection
-                    imaterial += 1
-                    self._materials.append(meshio_sections[m.type])
-                    newrow['material'] = imaterial
-                    self._types.append(meshio_femix[m.type])
-                    self._elements = pd.concat([self._elements, newrow])
-
-            self._specialnodes['tag'] = np.arange(1, len(self._specialnodes)+1)
-            self._elements['tag'] = np.arange(1, len(self._elements)+1)
-            self._elements['group'] = 'all'
+                    ksection = -1
+
+                newrow['section'] = ksection
+                imaterial += 1
+                self._materials.append(meshio_sections[mtype])
+                newrow['material'] = imaterial
+                self._types.append(meshio_femix[mtype])
+                elements.append(newrow)
+
+        self._elements = pd.concat(elements, ignore_index=True) if len(elements) > 0 else \
+            pd.DataFrame(columns=['tag', 'numtag', 'type', 'nnodes', 'nodes', 'section', 'group'])
+        self._specialnodes = pd.concat(specialnodes, ignore_index=True) if len(specialnodes) > 0 else \
+            pd.DataFrame(columns=['tag', 'node', 'fixed'])
+        self._specialnodes['tag'] = np.arange(1, len(self._specialnodes)+1)
+        self._elements['tag'] = np.arange(1, len(self._elements)+1)
+        if len(self._elements) > 0:
             self._elements[['gtype', 'nodals']] = self._elements[['gtype', 'nodals']].astype('int32')
-            print (self._elements)
-
-            self._info['filename'] = mesh_file
-            self._info['foldername']  = path.parent
-            self._info['jobname']  = path.stem
-            self._info['title'] = file
-            self._info['nelems'] = len(self._elements)
-            self._info['nsections'] = isection
-            self._info['nmats'] = imaterial
-            self._info['nspecnodes'] = len(self._specialnodes)
-
-            # gmsh.finalize()
+
+        self._info['filename'] = mesh_file
+        self._info['foldername']  = path.parent
+        self._info['jobname']  = path.stem
+        self._info['title'] = file
+        self._info['nelems'] = len(self._elements)
+        self._info['nsections'] = isection
+        self._info['nmats'] = imaterial
+        self._info['nspecnodes'] = len(self._specialnodes)
+        self.invalidate_spatial()
+        return
+
+    @property
+    def spatial(self) -> "SpatialIndex":
+        """Spatial index of the nodes and elements of the model, built on first use.
+
+        The index is rebuilt when the points table is replaced; call
+        ``invalidate_spatial`` after changing the coordinates in place.
+        """
+        from .spatial import SpatialIndex
+        if self._spatial is None or self._spatial[0] is not self._points:
+            coords = self._points[['x', 'y', 'z']].to_numpy(dtype=float)
+            elements = {}
+            if 'gtype' in self._elements:
+                for gtype, elems in self._elements.groupby('gtype'):
+                    elements[gtype] = (elems['tag'].to_numpy(), np.stack(elems['nodes'].to_numpy()))
+            index = SpatialIndex(coords, self._points['tag'].to_numpy(), elements)
+            self._spatial = (self._points, index)
+        return self._spatial[1]
+
+    def invalidate_spatial(self):
+        """Discards the spatial index after the coordinates of the model changed."""
+        self._spatial = None
         return
 
     @property
@@ -162,14 +281,15 @@ class ofem_handler:
         Args:
             mesh_file (str): the name of the file to be written
         """
+        import gmsh
+        from . import gmshsession
         file = Path(mesh_file)
         if file.suffix.lower() != ".msh":
-            mesh_file = file.with_suffix('').resolve() + ".msh"
+            mesh_file = str(file.with_suffix('.msh'))
 
-        # initialize gmsh
-        gmsh.initialize()
-        
-        gmsh.model.add(self._info['title'])
+        # the model lives in the shared gmsh session
+        gmshsession.acquire()
+        gmshsession.use_model(self._info['title'], clear=True)
 
         # joints = self._points
         # elems = self._elements
@@ -289,12 +409,33 @@ class ofem_handler:
         # #     gmsh.fltk.run()
 
         # gmsh.finalize()
+        gmshsession.release()
         return
 
     def to_meshio(self, mesh):
+        import meshio
         meshio.write("mesh.vtk", mesh)
         return "mesh.vtk"
 
+    def to_paraview(self, filename: str, jobname: str, codes: list = None) -> str:
+        """Exports the mesh with the results of a job, one time step per combination
+
+        The results are read one combination at a time (see ``export.export_results``).
+
+        Args:
+            filename (str): the .pvd (VTU collection) or .xdmf (HDF5) file to be written
+            jobname (str): the name of the job with the results, without extension
+            codes (list, optional): the result tables, DI_CSV and/or AST_CSV. Defaults to both.
+
+        Returns:
+            str: the name of the file
+        """
+        from . import export
+        points = self._points[['x', 'y', 'z']].values
+        cells = {int(gtype): np.stack(block['nodes'].values)
+                 for gtype, block in self._elements.groupby('gtype', sort=False)}
+        return export.export_results(filename, points, cells, jobname, codes)
+
     def to_excel(self, mesh):
         df = pd.DataFrame(mesh.points)
         df.to_excel("mesh.xlsx")
@@ -0,0 +1,270 @@
+"""Modal analysis of the models of the in-process solver.
+
+Mass matrices of the frame and plate elements are computed in batches, like
+their stiffness matrices (consistent, or lumped on the translations), and
+assembled by ``femsolver``. The lowest modes are found with the
+shift-invert Lanczos solver of ``scipy.sparse.linalg.eigsh``: K - sigma M is
+factored once per shift (``femsolver.factorize``) and the factorization is
+reused by all the Lanczos iterations. The default shift is slightly
+negative, which keeps the matrix positive definite also for unsupported
+models and mechanisms, so CHOLMOD can be used when it is installed.
+
+The masses come from the density ('rho', mass per unit volume, as the
+'mass' of ``_common.materials``). Mode shapes are normalized to unit modal
+mass.
+
+Example::
+
+    K, M = modal.frame_matrices(coords, conn, props)
+    result = modal.modes(K, M, femsolver.fixed_dofs(npoin, 6, fixno), 12, ndof=6)
+    result['frequencies'], result['participation']
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+from . import femsolver
+from . import frame
+from . import plate
+from . import shapes
+
+
+def frame_mass(coords: np.ndarray, conn: np.ndarray, props: dict, lumped: bool = False,
+               truss=False) -> np.ndarray:
+    """Returns the mass matrices of 3D frame elements in global axes
+
+    Args:
+        coords (np.ndarray): the coordinates of the points (npoin, 3)
+        conn (np.ndarray): the connectivity (nelem, 2) as row indices of coords
+        props (dict): 'rho', 'area' and, for the rotational inertia of consistent matrices,
+            'inertia2' and 'inertia3' (see ``frame.frame_stiffness``)
+        lumped (bool, optional): half of the mass on the translations of each node. Defaults to False.
+        truss (bool | np.ndarray, optional): elements without rotational inertia. Defaults to False.
+
+    Returns:
+        np.ndarray: (nelem, 12, 12) matrices
+    """
+    axes, L = frame.frame_axes(coords, conn, props.get('angle', 0.0))
+    m = np.broadcast_to(np.asarray(props['rho'], dtype=float)*np.asarray(props['area'], dtype=float), L.shape)*L
+    me = np.zeros((len(L), 12, 12))
+    if lumped:
+        for i in [0, 1, 2, 6, 7, 8]:
+            me[:, i, i] = m/2.0
+        return me
+
+    def put(i, j, value):
+        me[:, i, j] += value
+        if i != j:
+            me[:, j, i] += value
+
+    for i, j, c in [(0, 0, 2.0), (6, 6, 2.0), (0, 6, 1.0)]:
+        put(i, j, c*m/6.0)
+    polar = np.asarray(props['rho'], dtype=float)*(np.asarray(props['inertia2'], dtype=float) +
+                                                   np.asarray(props['inertia3'], dtype=float))*L
+    for i, j, c in [(3, 3, 2.0), (9, 9, 2.0), (3, 9, 1.0)]:
+        put(i, j, c*polar/6.0)
+    # bending in the 1-2 plane (rotation 5) and in the 1-3 plane (rotation 4)
+    for v, r, sign in [(1, 5, 1.0), (2, 4, -1.0)]:
+        c = m/420.0
+        put(v, v, 156.0*c)
+        put(v+6, v+6, 156.0*c)
+        put(v, v+6, 54.0*c)
+        put(v, r, sign*22.0*L*c)
+        put(v, r+6, -sign*13.0*L*c)
+        put(v+6, r, sign*13.0*L*c)
+        put(v+6, r+6, -sign*22.0*L*c)
+        put(r, r, 4.0*L**2*c)
+        put(r+6, r+6, 4.0*L**2*c)
+        put(r, r+6, -3.0*L**2*c)
+
+    # trusses: linear interpolation of the translations, the same in all directions
+    truss = np.broadcast_to(np.asarray(truss, dtype=bool), L.shape)
+    if truss.any():
+        me[truss] = 0.0
+        for i in range(3):
+            me[truss, i, i] = me[truss, i+6, i+6] = m[truss]/3.0
+            me[truss, i, i+6] = me[truss, i+6, i] = m[truss]/6.0
+    T = frame._transformation(axes)
+    return np.einsum('eji,ejk,ekl->eil', T, me, T, optimize=True)
+
+
+def plate_mass(xe: np.ndarray, gtype: int, rho: float, thick: float, lumped: bool = False) -> np.ndarray:
+    """Returns the mass matrices of a block of plate elements
+
+    Lumped matrices are diagonal, scaled to the total mass of the element
+    (HRZ lumping), so quadratic elements have no negative masses.
+
+    Args:
+        xe (np.ndarray): the XY coordinates of the nodes of the elements (nelem, nnode, 2)
+        gtype (int): the gmsh element type
+        rho (float): the density
+        thick (float): the thickness
+        lumped (bool, optional): diagonal matrices. Defaults to False.
+
+    Returns:
+        np.ndarray: (nelem, 3*nnode, 3*nnode) matrices
+    """
+    points, weights = shapes.gauss_points(gtype, 4)
+    N, dN = shapes.shape_functions(gtype, points)
+    detJ = shapes.isoparametric(xe, dN)[0]
+    mnn = np.einsum('pi,pj,ep->eij', N, N, detJ*weights)
+    if lumped:
+        diagonal = np.einsum('eii->ei', mnn)
+        area = mnn.sum(axis=(1, 2))
+        mnn = np.einsum('ei,ij->eij', diagonal*(area/diagonal.sum(axis=1))[:, None], np.eye(N.shape[1]))
+    inertia = rho*np.array([thick, thick**3/12.0, thick**3/12.0])
+    nelem, nnode = mnn.shape[:2]
+    me = np.einsum('eij,k,kl->eikjl', mnn, inertia, np.eye(plate.NDOF))
+    return me.reshape(nelem, nnode*plate.NDOF, nnode*plate.NDOF)
+
+
+def frame_matrices(coords: np.ndarray, conn: np.ndarray, props: dict, lumped: bool = False,
+                   truss=False) -> tuple:
+    """Assembles the stiffness and mass matrices of a 3D frame or truss
+
+    Args:
+        coords (np.ndarray): the coordinates of the points (npoin, 3)
+        conn (np.ndarray): the connectivity (nelem, 2) as row indices of coords
+        props (dict): the section and material properties, see ``frame_stiffness`` and ``frame_mass``
+        lumped (bool, optional): lumped masses. Defaults to False.
+        truss (bool | np.ndarray, optional): elements with axial stiffness only. Defaults to False.
+
+    Returns:
+        tuple: the sparse K and M
+    """
+    coords = np.asarray(coords, dtype=float)
+    conn = np.asarray(conn, dtype=np.int64)
+    dofs = femsolver.element_dofs(conn, frame.NDOF)
+    ndofs = len(coords)*frame.NDOF
+    K = femsolver.assemble_matrix(frame.frame_stiffness(coords, conn, props, truss)[0], dofs, ndofs)
+    M = femsolver.assemble_matrix(frame_mass(coords, conn, props, lumped, truss), dofs, ndofs)
+    return K, M
+
+
+def plate_matrices(coords: np.ndarray, elements: dict, material: dict, thick: float,
+                   lumped: bool = False) -> tuple:
+    """Assembles the stiffness and mass matrices of a plate
+
+    Args:
+        coords (np.ndarray): (npoin, 2 or 3) coordinates, only X and Y are used
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of coords)}
+        material (dict): material properties 'E', 'nu' and 'rho'
+        thick (float): the thickness of the plate
+        lumped (bool, optional): lumped masses. Defaults to False.
+
+    Returns:
+        tuple: the sparse K and M
+    """
+    xy = np.asarray(coords, dtype=float)[:, :2]
+    ndofs = len(xy)*plate.NDOF
+    Db, Ds = plate.constitutive(material['E'], material['nu'], thick)
+    blocks = plate._blocks(xy, elements)
+    K = plate._assemble(blocks, Db, Ds, ndofs)
+    M = None
+    for gtype, conn, xe, dofs in blocks:
+        Me = femsolver.assemble_matrix(plate_mass(xe, gtype, material['rho'], thick, lumped), dofs, ndofs)
+        M = Me if M is None else M + Me
+    return K, M
+
+
+# default shift, relative to the mean ratio of the diagonals of K and M
+shift_fraction = 1.0e-6
+
+
+def _eigen(Kff, Mff, nmodes: int, sigma: float) -> tuple:
+    # K - sigma M is positive definite for shifts below the first eigenvalue
+    solve = femsolver.factorize(Kff - sigma*Mff, definite=sigma <= 0.0)
+    OPinv = splinalg.LinearOperator(Kff.shape, matvec=solve, dtype=float)
+    return splinalg.eigsh(Kff, k=nmodes, M=Mff, sigma=sigma, which='LM', OPinv=OPinv)
+
+
+def modes(K: sparse.spmatrix, M: sparse.spmatrix, fixed: np.ndarray, nmodes: int, ndof: int,
+          sigma=None, directions: tuple = None) -> dict:
+    """Computes the lowest vibration modes
+
+    Args:
+        K (sparse.spmatrix): the stiffness matrix
+        M (sparse.spmatrix): the mass matrix
+        fixed (np.ndarray): the mask of the fixed degrees of freedom
+        nmodes (int): the number of modes (of each shift)
+        ndof (int): the number of degrees of freedom per point
+        sigma (float | list, optional): the shift(s) in (rad/s)^2; modes closest to each shift
+            are found, one factorization per shift. Defaults to -``shift_fraction`` times
+            trace(K)/trace(M) of the free degrees of freedom.
+        directions (tuple, optional): the translational degrees of freedom of the participating
+            masses. Defaults to (0, 1, 2) for 6 dofs per point and (0,) otherwise.
+
+    Returns:
+        dict: 'frequencies' (Hz), 'periods' (s), 'omega2' (rad/s)^2, 'shapes' (nmodes, npoin, ndof),
+            'participation' (nmodes, ndirections) participating mass ratios and 'mass' (ndirections,)
+            the total masses
+    """
+    if directions is None:
+        directions = (0, 1, 2) if ndof == 6 else (0,)
+    # degrees of freedom without stiffness are eliminated
+    free = np.flatnonzero(~np.asarray(fixed, dtype=bool) & (K.diagonal() != 0.0))
+    Kff = K[free][:, free].tocsc()
+    Mff = M[free][:, free].tocsc()
+    nmodes = min(nmodes, len(free)-1)
+    if sigma is None:
+        sigma = -shift_fraction*Kff.diagonal().sum()/Mff.diagonal().sum()
+
+    w2 = np.empty(0)
+    phi = np.empty((len(free), 0))
+    for shift in np.atleast_1d(sigma):
+        values, vectors = _eigen(Kff, Mff, nmodes, float(shift))
+        vectors /= np.sqrt(np.einsum('in,in->n', vectors, Mff @ vectors))
+        # modes already found with a previous shift are kept once
+        projection = np.einsum('in,im->m', phi @ (phi.T @ (Mff @ vectors)), Mff @ vectors)
+        new = projection < 0.5
+        w2 = np.concatenate([w2, values[new]])
+        phi = np.concatenate([phi, vectors[:, new]], axis=1)
+    order = np.argsort(w2)
+    w2, phi = w2[order], phi[:, order]
+
+    U = np.zeros((K.shape[0], len(w2)))
+    U[free] = phi
+    r = np.zeros((K.shape[0], len(directions)))
+    for k, d in enumerate(directions):
+        r[d::ndof, k] = 1.0
+    Mr = M @ r
+    mass = np.einsum('ik,ik->k', r, Mr)
+    gamma = U.T @ Mr
+    omega = np.sqrt(np.maximum(w2, 0.0))
+    periods = np.full(len(w2), np.inf)
+    np.divide(2.0*np.pi, omega, out=periods, where=omega > 0.0)
+    return {
+        'omega2': w2,
+        'frequencies': omega/(2.0*np.pi),
+        'periods': periods,
+        'shapes': U.T.reshape(len(w2), -1, ndof),
+        'participation': gamma**2/mass,
+        'mass': mass,
+    }
+
+
+def add_mode_views(model: str, nodetags: np.ndarray, result: dict, name: str = "mode shape") -> list:
+    """Adds the mode shapes as a gmsh view with one step per mode
+
+    Args:
+        model (str): the name of the gmsh model
+        nodetags (np.ndarray): the gmsh tag of each point (row of the shapes)
+        result (dict): the result of ``modes``
+        name (str, optional): the name of the view. Defaults to "mode shape".
+
+    Returns:
+        list: the tags of the views
+    """
+    from . import msh
+
+    shapes = result['shapes']
+    nmodes, npoin, ndof = shapes.shape
+    displ = np.zeros((nmodes, npoin, 3))
+    if ndof >= 6:
+        displ = shapes[:, :, :3]
+    else:
+        # plates: the deflection along Z
+        displ[:, :, 2] = shapes[:, :, 0]
+    icomb = np.repeat(np.arange(1, nmodes+1), npoin)
+    return msh.addResultViews(model, [name], "NodeData", np.tile(nodetags, nmodes),
+                              displ.reshape(-1, 3), icomb, numComponents=3, visible=True)
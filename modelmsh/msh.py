@@ -1,6 +1,4 @@
-import meshio
 import gmsh
-import openpyxl
 import numpy as np
 from numpy.typing import NDArray
 import pandas as pd
@@ -8,6 +6,9 @@ import pathlib
 import sys
 import logging
 import timeit
+from .spatial import SpatialIndex
+from . import gmshsession
+from .femix import s3dx_gmsh_blocks
 
 
 physical_attributes = [
@@ -116,6 +117,57 @@ def getElements(model: gmsh.model):
         lnods.update({k: v for k, v in zip(e, l)})
     return lnods
 
+def getMeshArrays(model: gmsh.model, dim: int = -1) -> tuple:
+    """Gets the mesh of a gmsh model as arrays
+
+    Args:
+        model (gmsh.model): the gmsh model
+        dim (int, optional): dimension of the elements, -1 for all. Defaults to -1.
+
+    Returns:
+        tuple: the sorted node tags, the (npoin, 3) coordinates and a dict
+            {gmsh type: (element tags, connectivity as row indices of the coordinates)}
+    """
+    t, c, _ = model.mesh.getNodes()
+    order = np.argsort(t)
+    tags = t[order]
+    coords = np.asarray(c).reshape(-1, 3)[order]
+    elements = {}
+    eleTypes, eleTags, eleNodes = model.mesh.getElements(dim)
+    for et, e, n in zip(eleTypes, eleTags, eleNodes):
+        elements[int(et)] = (e, np.searchsorted(tags, n).reshape(len(e), -1))
+    return tags, coords, elements
+
+def getPhysicalGroupNodes(model: gmsh.model, dim: int = -1) -> dict:
+    """Gets the nodes of the physical groups of a gmsh model
+
+    Args:
+        model (gmsh.model): the gmsh model
+        dim (int, optional): dimension of the physical groups, -1 for all. Defaults to -1.
+
+    Returns:
+        dict: {physical name (or "dim:tag" if unnamed): sorted node tags}
+    """
+    groups = {}
+    for d, tag in model.getPhysicalGroups(dim):
+        name = model.getPhysicalName(d, tag) or "%d:%d" % (d, tag)
+        nodes = np.asarray(model.mesh.getNodesForPhysicalGroup(d, tag)[0], dtype=np.int64)
+        groups[name] = np.union1d(groups.get(name, []), nodes).astype(np.int64)
+    return groups
+
+def getSpatialIndex(model: gmsh.model, dim: int = -1) -> SpatialIndex:
+    """Builds a spatial index with the nodes and the elements of a gmsh model
+
+    Args:
+        model (gmsh.model): the gmsh model
+        dim (int, optional): dimension of the elements to index, -1 for all. Defaults to -1.
+
+    Returns:
+        SpatialIndex: the spatial index, with gmsh node and element tags
+    """
+    tags, coords, elements = getMeshArrays(model, dim)
+    return SpatialIndex(coords, tags, elements)
+
 def getElementFrames(model: gmsh.model, types: list=[1, 8]) -> pd.DataFrame:
     lnods = {}
     for t in types:
@@ -141,10 +193,59 @@ def getElementSolid(model: gmsh.model, types: list=[4, 7, 6, 5, 11, 14, 13, 17,
     return lnods
 
 
+def addResultViews(model: str, names: list, datatype: str, tags: NDArray, values: NDArray,
+                   icomb: NDArray, numComponents: int = 1, visible: bool = False) -> list:
+    """Adds result views with one time step per combination
+
+    The rows of the result table are grouped by combination once, and each
+    combination is pushed to every view as one time step.
+
+    Args:
+        model (str): the name of the gmsh model
+        names (list): the names of the views
+        datatype (str): "NodeData", "ElementData" or "ElementNodeData"
+        tags (NDArray): the gmsh tag of each row, node tags for "NodeData" and element tags otherwise
+        values (NDArray): (nrows, len(names)*numComponents) values of the views
+        icomb (NDArray): the combination of each row
+        numComponents (int, optional): number of components of each view (1, 3 or 9). Defaults to 1.
+        visible (bool, optional): whether the views are visible. Defaults to False.
+
+    Returns:
+        list: the tags of the views
+    """
+    tags = np.asarray(tags)
+    values = np.asarray(values, dtype=float).reshape(len(tags), -1)
+    icomb = np.asarray(icomb)
+    order = np.argsort(icomb, kind='stable')
+    combs, starts = np.unique(icomb[order], return_index=True)
+
+    views = [gmsh.view.add(name) for name in names]
+    for step, rows in enumerate(np.split(order, starts[1:])):
+        t = tags[rows]
+        homogeneous = True
+        if datatype == "ElementNodeData":
+            # the rows of an element are contiguous
+            first = np.flatnonzero(np.r_[True, t[1:] != t[:-1]])
+            counts = np.diff(np.r_[first, len(t)])
+            homogeneous = np.all(counts == counts[0])
+            t = t[first]
+        for k, view in enumerate(views):
+            v = values[rows, k*numComponents:(k+1)*numComponents]
+            if homogeneous:
+                gmsh.view.addHomogeneousModelData(view, step, model, datatype, t, v.ravel(),
+                                                  time=float(combs[step]), numComponents=numComponents)
+            else:
+                gmsh.view.addModelData(view, step, model, datatype, t, [d.ravel() for d in np.split(v, first[1:])],
+                                       time=float(combs[step]), numComponents=numComponents)
+    for view in views:
+        gmsh.view.option.setNumber(view, "Visible", int(visible))
+    return views
+
+
 class msh_handler:
     def __init__(self):
-        if not gmsh.isInitialized():
-            gmsh.initialize()
+        gmshsession.acquire()
+        self._session = True
 
 
     def import_s3dx(self, filename: str):
@@ -174,27 +275,15 @@ class msh_handler:
 
                 nelems, nnodes, nspec = f.readline().strip().split()
 
-                elems = []
-                types = []
-                lnode = []
-                ndims = []
+                blocks = {}
                 for i in range(int(nelems)):
                     lin = f.readline().strip().split()
                     # n, ty, nn, ln = f.readline().strip().split()
-                    n  = int(lin[0])
-                    ty = int(lin[1])
                     nn = int(lin[2])
-                    ln = lin[-nn:]
-                    code, ndim, ln = femix2gmsh(ty, nn, ln)
-                    if code not in types:
-                        types.append(code)
-                        elems.append([n])
-                        lnode.append(ln)
-                        ndims.append(int(ndim))
-                    else:
-                        index = types.index(code)
-                        lnode[index].extend(ln)
-                        elems[index].append(n)
+                    numbers, nodes = blocks.setdefault((int(lin[1]), nn), ([], []))
+                    numbers.append(int(lin[0]))
+                    nodes.append(lin[-nn:])
+                ndims, types, elems, lnode = s3dx_gmsh_blocks(blocks)
 
                 nodes = []
                 coord = []
@@ -208,7 +297,7 @@ class msh_handler:
                     lin = f.readline().strip().split()
                     specs.append(int(lin[1]))
 
-        gmsh.model.add(title)
+        gmshsession.use_model(title.strip(), clear=True)
         for i in range(len(elems)):
             tag = gmsh.model.addDiscreteEntity(ndims[i], -1)
             gmsh.model.mesh.addNodes(ndims[i], tag, nodes, coord)
@@ -252,8 +341,9 @@ class msh_handler:
 
 
     def finalize(self):
-        if gmsh.isInitialized():
-            gmsh.finalize()
+        if self._session:
+            gmshsession.release()
+            self._session = False
         return
 
 
@@ -3,6 +3,7 @@ Define the C-variables and functions from the C-files that are needed in Python
 """
 from ctypes import c_double, c_int, CDLL, POINTER
 import os
+import numpy as np
 import pandas as pd
 import pathlib
 import zipfile
@@ -28,6 +29,10 @@ DM_S3DX = 14 # /*   14) _dm.s3dx file with the deformed mesh.
 AST_CSV = 15 # /*   15) _avgst.csv file with the stresses in the nodes.             */
 EST_CSV = 16 # /*   16) _elnst.csv file with the stresses in the nodes.             */
 DI_CSV  = 17 # /*   17) _di.csv file with the displacements in the nodes.           */
+# result tables read only from Python
+REACT_CSV = 18 # _react.csv file with the reactions in the fixed degrees of freedom.
+FIXFO_CSV = 19 # _fixfo.csv file with the fixation forces.
+GPSTR_CSV = 20 # _gpstr.csv file with the stresses in the Gauss points.
 
 BOTO_XX = 1
 BOTO_YY = 2
@@ -46,7 +51,7 @@ SURF_TOP = 3
 
 
 captured_stdout = ''
-stdout_pipe = os.pipe()
+stdout_pipe = None
 
 def drain_pipe():
     global captured_stdout
@@ -58,22 +63,36 @@ def drain_pipe():
 
 
 lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libfemixpy.dylib')
-try:
-    libfemixpy = CDLL(lib_path)
-except:
-    print("Cannot load library 'libfemixpy'")
-    exit()
+_libfemixpy = None
 
-prefemixlib = libfemixpy.prefemixlib
-prefemixlib.restype = int
-femixlib = libfemixpy.femixlib
-femixlib.restype = int
+def load_library() -> CDLL:
+    """Loads the femix library on first use
 
-posfemixlib = libfemixpy.posfemixlib
-posfemixlib.restype = int
+    Raises:
+        OSError: the library can not be loaded
 
-posofemlib = libfemixpy.posofemlib
-posofemlib.restype = int
+    Returns:
+        CDLL: the femix library
+    """
+    global _libfemixpy
+    if _libfemixpy is None:
+        try:
+            lib = CDLL(lib_path)
+        except OSError as e:
+            raise OSError("Cannot load library 'libfemixpy'") from e
+        for name in ['prefemixlib', 'femixlib', 'posfemixlib', 'posofemlib']:
+            getattr(lib, name).restype = int
+        _libfemixpy = lib
+    return _libfemixpy
+
+
+def __getattr__(name: str):
+    # the library and its functions are loaded on first access
+    if name == 'libfemixpy':
+        return load_library()
+    if name in ['prefemixlib', 'femixlib', 'posfemixlib', 'posofemlib']:
+        return getattr(load_library(), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 ofemfilessuffix = ['.gldat', '.cmdat', '.log',
@@ -81,6 +100,9 @@ ofemfilessuffix = ['.gldat', '.cmdat', '.log',
                 '_di.csv', '_avgst.csv', '_elnst.csv', 
                 '_gpstr.csv', '_react.csv', '_fixfo.csv', '_csv.info']
 
+# files of the job that are removed with it but not archived (the index of the deck, see gldat.write_index)
+ofemtempsuffix = ['.gldat.idx']
+
 
 def compress_ofem(filename: str):
     """_summary_
@@ -123,6 +145,16 @@ def add_to_ofem(filename: str, file_to_add: str):
     return
 
 
+result_files = {
+    DI_CSV: '_di.csv',
+    EST_CSV: '_elnst.csv',
+    AST_CSV: '_avgst.csv',
+    REACT_CSV: '_react.csv',
+    FIXFO_CSV: '_fixfo.csv',
+    GPSTR_CSV: '_gpstr.csv',
+}
+
+
 def get_csv_from_ofem(filename: str, code: int) -> pd.DataFrame:
     """_summary_
 
@@ -133,24 +165,65 @@ def get_csv_from_ofem(filename: str, code: int) -> pd.DataFrame:
     Returns:
         pd.DataFrame: _description_
     """
+    return get_results_from_ofem(filename, [code])[code]
 
-    path = pathlib.Path(filename + '.ofem')
-    if code == DI_CSV:
-        file_to_extract = pathlib.Path(filename + '_di.csv')
-    elif code == EST_CSV:
-        file_to_extract = pathlib.Path(filename + '_elnst.csv')
-    elif code == AST_CSV:
-        file_to_extract = pathlib.Path(filename + '_avgst.csv')
-        
+
+def get_results_from_ofem(filename: str, codes: list) -> dict:
+    """Reads several result tables from the .ofem archive, opening it only once
+
+    Args:
+        filename (str): the name of the job, without extension
+        codes (list): the codes of the result tables (DI_CSV, AST_CSV, EST_CSV, ...)
+
+    Returns:
+        dict: {code: pd.DataFrame}
+    """
+    jobname = pathlib.Path(filename).name
+    results = {}
     with zipfile.ZipFile(filename + '.ofem', 'r') as ofemfile:
-        with ofemfile.open(file_to_extract.name) as file:
-            df = pd.read_csv(file, sep=';')
+        for code in codes:
+            with ofemfile.open(jobname + result_files[code]) as file:
+                results[code] = pd.read_csv(file, sep=';')
 
-    return df
+    return results
+
+
+def iter_results_from_ofem(filename: str, code: int, chunksize: int = 100000):
+    """Reads a result table from the .ofem archive one combination at a time
+
+    The table is parsed in chunks of rows, so only one combination is held in
+    memory; the rows of a combination must be contiguous, as the solver writes them.
+
+    Args:
+        filename (str): the name of the job, without extension
+        code (int): the code of the result table (DI_CSV, AST_CSV, EST_CSV, ...)
+        chunksize (int, optional): number of rows parsed at once. Defaults to 100000.
+
+    Yields:
+        tuple: (icomb, pd.DataFrame) with the rows of each combination
+    """
+    jobname = pathlib.Path(filename).name
+    with zipfile.ZipFile(filename + '.ofem', 'r') as ofemfile:
+        with ofemfile.open(jobname + result_files[code]) as file:
+            # the chunks of the combination still open, joined once when it ends
+            pending, current = [], None
+            for chunk in pd.read_csv(file, sep=';', chunksize=chunksize):
+                icomb = chunk['icomb'].values
+                starts = np.flatnonzero(np.r_[True, icomb[1:] != icomb[:-1]])
+                ends = np.r_[starts[1:], len(chunk)]
+                for first, last in zip(starts, ends):
+                    if current is not None and icomb[first] != current:
+                        yield int(current), pd.concat(pending, ignore_index=True)
+                        pending = []
+                    pending.append(chunk.iloc[first:last])
+                    current = icomb[first]
+            if len(pending) > 0:
+                yield int(current), pd.concat(pending, ignore_index=True)
+    return
 
 
 def remove_ofem_files(filename: str):
-    for suffix in ofemfilessuffix:
+    for suffix in ofemfilessuffix + ofemtempsuffix:
         fname = filename + suffix
         if pathlib.Path(fname).exists():
             os.remove(fname)
@@ -171,6 +244,27 @@ def extract_ofem_all(filename: str):
     return
 
 
+def extract_ofem_deck(filename: str, suffix: str = '.gldat') -> str:
+    """Returns the .gldat deck of a job, extracted from the .ofem archive if it is not on disk
+
+    Args:
+        filename (str): the name of the job, without extension
+        suffix (str, optional): the file of the job, such as '.cmdat'. Defaults to '.gldat'.
+
+    Raises:
+        KeyError: the file is neither on disk nor in the archive
+
+    Returns:
+        str: the name of the file
+    """
+    deck = filename + suffix
+    if not pathlib.Path(deck).exists():
+        path = pathlib.Path(filename + '.ofem')
+        with zipfile.ZipFile(path, 'r') as ofemfile:
+            ofemfile.extract(path.stem + suffix, path.parent)
+    return deck
+
+
 def extract_ofem_bin(filename: str):
     path = pathlib.Path(filename + '.ofem')
     with zipfile.ZipFile(filename + '.ofem', 'r') as ofemfile:
@@ -190,7 +284,7 @@ def prefemix2(filename: str):
     Returns:
         error code: 0 if no error, 1 if error
     """""""""
-    n = prefemixlib(filename.encode())
+    n = load_library().prefemixlib(filename.encode())
     return n
 
 
@@ -203,7 +297,7 @@ def femix2(filename: str, soalg: str='d', randsn: float=1.0e-6):
     Returns:
         error code: 0 if no error, 1 if error
     """""""""
-    n = femixlib(filename.encode(), soalg.encode(), c_double(randsn))
+    n = load_library().femixlib(filename.encode(), soalg.encode(), c_double(randsn))
     return n
 
 
@@ -242,7 +336,7 @@ def posfemix2(filename: str, code: int=1, lcaco: str='l', cstyn: str='y',
         cstyn = 'n'
         print("\n'cstyn' must be 'y'es or 'n'o. 'cstyn' changed to 'y")
 
-    n = posfemixlib(filename.encode(), c_int(code), 
+    n = load_library().posfemixlib(filename.encode(), c_int(code), 
                     lcaco.encode(), cstyn.encode(), stnod.encode(), csryn.encode())
     return n
 
@@ -257,6 +351,7 @@ def ofemResults(filename: str, codes: list, **kwargs):
         error code: 0 if no error, 1 if error
     """""""""
     
+    libfemixpy = load_library()
     extract_ofem_bin(filename)
 
     if 'lcaco' not in kwargs:
@@ -332,7 +427,7 @@ def ofemResults(filename: str, codes: list, **kwargs):
 
     # Pass a pointer to the integer object to the C function
     myarray = (c_int * len(codes))(*codes)
-    n = posofemlib(filename.encode(), c_int(ncode), myarray,
+    n = libfemixpy.posofemlib(filename.encode(), c_int(ncode), myarray,
                     lcaco.encode(), cstyn.encode(), 
                     stnod.encode(), csryn.encode(), 
                     c_int(ksres), c_int(kstre), c_int(kdisp))
@@ -360,16 +455,28 @@ def ofemSolver(filename: str, soalg: str='d', randsn: float=1.0e-6) -> int:
 
     Args:
         filename (str): the name of the file to be read without extension
-        soalg (str, optional): the algorithm used to solve the sysytem of linear equations, 'd' direct, 'i' iterative. Defaults to 'd'.
+        soalg (str, optional): the algorithm used to solve the sysytem of linear equations, 'd' direct, 'i' iterative,
+            'a' chosen from the size of the model (see ``solverstrategy``). With 'a' the choice is written
+            to the .log file and to the ``modelmsh.solverstrategy`` logger, and the model is solved again
+            directly if the iterative solver returns an error code. femix does not report a conjugate
+            gradient that stops above the tolerance as an error: check the residual norms in the .log
+            file. Defaults to 'd'.
         randsn (float, optional): converge criteria to stop the iterative solver. Defaults to 1.0e-6.
 
     Returns:
         error code: 0 if no error, 1 if error
     """
 
+    libfemixpy = load_library()
     delete_ofem(filename)
 
     soalg = soalg.lower()
+    auto = soalg == 'a'
+    if auto:
+        from . import solverstrategy
+        choice = solverstrategy.native_options(filename + '.gldat')
+        soalg, randsn = choice['soalg'], choice['randsn']
+
     if soalg not in ['d', 'i']:
         soalg = 'd'
         print("\n'soalg' must be 'd' or 'i'. 'soalg' changed to 'd")
@@ -393,9 +500,19 @@ def ofemSolver(filename: str, soalg: str='d', randsn: float=1.0e-6) -> int:
     t = threading.Thread(target=drain_pipe)
     t.start()
 
-    n = prefemixlib(filename.encode())
-    n = femixlib(filename.encode(), soalg.encode(), c_double(randsn))
+    n = libfemixpy.prefemixlib(filename.encode())
+    if auto:
+        # sys.stdout is buffered when it is not a terminal: flushed while it goes to the pipe
+        print("solver: %s (%s)" % ("iterative" if soalg == 'i' else "direct", choice['reason']))
+        sys.stdout.flush()
+    n = libfemixpy.femixlib(filename.encode(), soalg.encode(), c_double(randsn))
+    if auto and soalg == 'i' and n != 0:
+        solverstrategy.logger.warning("femix iterative solver failed (error %d), solving directly", n)
+        print("solver: the iterative solver failed, solving again with the direct solver")
+        sys.stdout.flush()
+        n = libfemixpy.femixlib(filename.encode(), b'd', c_double(randsn))
     print()
+    sys.stdout.flush()
 
     # Close the write end of the pipe to unblock the reader thread and trigger it to exit
     os.close(stdout_fileno)
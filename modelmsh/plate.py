@@ -0,0 +1,276 @@
+"""Reissner-Mindlin thick plate elements for the in-process solver (femix type 5).
+
+Plates in the XY plane with 3 degrees of freedom per point: the deflection w
+(disp-1) and the rotations about the X and Y axes (disp-2, disp-3). The
+triangles and quadrilaterals of 3, 4, 6, 8 and 9 nodes of ``shapes`` are
+supported; the bending terms use full Gauss integration and the shear terms
+reduced integration to avoid shear locking, except for the 3 node triangle,
+whose constant shear strains come from the discrete shear gaps of its edges
+(DSG3), with its shear stiffness scaled by t^2/(t^2 + 0.1 h^2) (h the longest
+edge) so that coarse meshes of thin plates do not lock either.
+
+The stiffness matrices of a block of elements are computed at once with
+einsum and assembled by ``femsolver``. The section forces are mx, my, mxy,
+vx and vy (str-1 ... str-5), evaluated at the nodes of the elements.
+
+Example::
+
+    results = plate.solve_plates(coords, elements, fixno, {'E': 30e6, 'nu': 0.2}, 0.25, [-10.0])
+    results[ofemlib.DI_CSV]     # as ofemlib.get_results_from_ofem
+"""
+
+import numpy as np
+from . import femsolver
+from . import recovery
+from . import shapes
+from .ofemlib import DI_CSV, AST_CSV, EST_CSV
+
+
+NDOF = 3
+
+# 3 node triangles: shear stiffness scaled by r/(r + stabilization*h^2), r = Db[0, 0]/Ds[0, 0];
+# with kappa = 5/6 and nu = 0.2, r = t^2/4 and this is t^2/(t^2 + 0.1 h^2)
+stabilization = 0.025
+
+# gmsh type: (degree of the bending rule, degree of the shear rule)
+integration = {
+    2: (1, 1),
+    9: (2, 2),
+    3: (2, 1),
+    16: (4, 2),
+    10: (4, 2),
+}
+
+
+def constitutive(E: float, nu: float, thick: float, kappa: float = 5.0/6.0) -> tuple:
+    """Returns the bending and shear constitutive matrices of the plate
+
+    Args:
+        E (float): the Young modulus
+        nu (float): the Poisson ratio
+        thick (float): the thickness
+        kappa (float, optional): the shear correction factor. Defaults to 5/6.
+
+    Returns:
+        tuple: Db (3, 3) and Ds (2, 2)
+    """
+    D = E*thick**3/(12.0*(1.0-nu**2))
+    Db = D*np.array([[1.0, nu, 0.0], [nu, 1.0, 0.0], [0.0, 0.0, (1.0-nu)/2.0]])
+    Ds = kappa*E/(2.0*(1.0+nu))*thick*np.eye(2)
+    return Db, Ds
+
+
+def _bending_matrix(dNx: np.ndarray) -> np.ndarray:
+    # curvatures (kx, ky, kxy) from (w, rx, ry): kx = d ry/dx, ky = -d rx/dy, kxy = d ry/dy - d rx/dx
+    B = np.zeros(dNx.shape[:-2] + (3, dNx.shape[-2], NDOF))
+    B[..., 0, :, 2] = dNx[..., 0]
+    B[..., 1, :, 1] = -dNx[..., 1]
+    B[..., 2, :, 1] = -dNx[..., 0]
+    B[..., 2, :, 2] = dNx[..., 1]
+    return B.reshape(B.shape[:-2] + (-1,))
+
+
+def _shear_matrix(N: np.ndarray, dNx: np.ndarray) -> np.ndarray:
+    # shear strains (gxz, gyz) = (dw/dx + ry, dw/dy - rx)
+    B = np.zeros(dNx.shape[:-2] + (2, dNx.shape[-2], NDOF))
+    B[..., 0, :, 0] = dNx[..., 0]
+    B[..., 1, :, 0] = dNx[..., 1]
+    B[..., 0, :, 2] = N
+    B[..., 1, :, 1] = -N
+    return B.reshape(B.shape[:-2] + (-1,))
+
+
+def _dsg_shear_matrix(xe: np.ndarray, dNx: np.ndarray) -> np.ndarray:
+    # DSG3: the shear gaps of nodes 2 and 3 from node 1, w_k - w_1 plus the integral of the
+    # rotations (ry, -rx) along the edge (trapezoidal), interpolated with the shape functions
+    nelem = len(xe)
+    gaps = np.zeros((nelem, 3, 3, NDOF))
+    for k in [1, 2]:
+        dx = xe[:, k] - xe[:, 0]
+        gaps[:, k, k, 0] = 1.0
+        gaps[:, k, 0, 0] = -1.0
+        for node in [0, k]:
+            gaps[:, k, node, 1] = -0.5*dx[:, 1]
+            gaps[:, k, node, 2] = 0.5*dx[:, 0]
+    return np.einsum('eni,enj->eij', dNx, gaps.reshape(nelem, 3, -1))
+
+
+def _dsg_factor(xe: np.ndarray, Db: np.ndarray, Ds: np.ndarray) -> np.ndarray:
+    # stabilization of the shear stiffness of DSG3 triangles, by the longest edge
+    h2 = np.max([((xe[:, i] - xe[:, j])**2).sum(axis=1) for i, j in [(0, 1), (1, 2), (2, 0)]], axis=0)
+    r = Db[0, 0]/Ds[0, 0]
+    return r/(r + stabilization*h2)
+
+
+def plate_stiffness(xe: np.ndarray, gtype: int, Db: np.ndarray, Ds: np.ndarray) -> np.ndarray:
+    """Returns the stiffness matrices of a block of plate elements
+
+    Args:
+        xe (np.ndarray): the XY coordinates of the nodes of the elements (nelem, nnode, 2)
+        gtype (int): the gmsh element type
+        Db (np.ndarray): the bending constitutive matrix
+        Ds (np.ndarray): the shear constitutive matrix
+
+    Returns:
+        np.ndarray: (nelem, 3*nnode, 3*nnode) matrices
+    """
+    bending, shear = integration[gtype]
+
+    points, weights = shapes.gauss_points(gtype, bending)
+    N, dN = shapes.shape_functions(gtype, points)
+    detJ, dNx = shapes.isoparametric(xe, dN)
+    B = _bending_matrix(dNx)
+    k = np.einsum('epki,kl,eplj,ep->eij', B, Db, B, detJ*weights, optimize=True)
+
+    points, weights = shapes.gauss_points(gtype, shear)
+    N, dN = shapes.shape_functions(gtype, points)
+    detJ, dNx = shapes.isoparametric(xe, dN)
+    if gtype == 2:
+        B = _dsg_shear_matrix(xe, dNx[:, 0])[:, None]
+        detJ = detJ*_dsg_factor(xe, Db, Ds)[:, None]
+    else:
+        B = _shear_matrix(np.broadcast_to(N, dNx.shape[:-1]), dNx)
+    k += np.einsum('epki,kl,eplj,ep->eij', B, Ds, B, detJ*weights, optimize=True)
+    return k
+
+
+def plate_pressure(xe: np.ndarray, gtype: int, pressure: np.ndarray) -> np.ndarray:
+    """Returns the nodal forces of uniform pressures on a block of plate elements
+
+    Args:
+        xe (np.ndarray): the XY coordinates of the nodes of the elements (nelem, nnode, 2)
+        gtype (int): the gmsh element type
+        pressure (np.ndarray): the pressure along w of each load case (ncase,)
+
+    Returns:
+        np.ndarray: (nelem, 3*nnode, ncase) forces
+    """
+    pressure = np.atleast_1d(np.asarray(pressure, dtype=float))
+    points, weights = shapes.gauss_points(gtype, integration[gtype][0])
+    N, dN = shapes.shape_functions(gtype, points)
+    detJ = shapes.isoparametric(xe, dN)[0]
+    f = np.zeros((len(xe), N.shape[1], NDOF, len(pressure)))
+    f[:, :, 0, :] = np.einsum('pn,ep,c->enc', N, detJ*weights, pressure)
+    return f.reshape(len(xe), -1, len(pressure))
+
+
+def plate_forces(xe: np.ndarray, gtype: int, ue: np.ndarray, Db: np.ndarray, Ds: np.ndarray) -> np.ndarray:
+    """Returns the section forces at the nodes of a block of plate elements
+
+    Args:
+        xe (np.ndarray): the XY coordinates of the nodes of the elements (nelem, nnode, 2)
+        gtype (int): the gmsh element type
+        ue (np.ndarray): the displacements of the elements (nelem, 3*nnode, ncase)
+        Db (np.ndarray): the bending constitutive matrix
+        Ds (np.ndarray): the shear constitutive matrix
+
+    Returns:
+        np.ndarray: (ncase, nelem, nnode, 5) mx, my, mxy, vx, vy
+    """
+    N, dN = shapes.shape_functions(gtype, shapes.natural_nodes(gtype))
+    dNx = shapes.isoparametric(xe, dN)[1]
+    Bb = _bending_matrix(dNx)
+    if gtype == 2:
+        Bs = np.repeat(_dsg_shear_matrix(xe, dNx[:, 0])[:, None], dNx.shape[1], axis=1)
+    else:
+        Bs = _shear_matrix(np.broadcast_to(N, dNx.shape[:-1]), dNx)
+    moments = np.einsum('kl,epli,eic->cepk', Db, Bb, ue, optimize=True)
+    shears = np.einsum('kl,epli,eic->cepk', Ds, Bs, ue, optimize=True)
+    if gtype == 2:
+        shears *= _dsg_factor(xe, Db, Ds)[None, :, None, None]
+    return np.concatenate([moments, shears], axis=-1)
+
+
+def _blocks(xy: np.ndarray, elements: dict) -> list:
+    # (gmsh type, connectivity, node coordinates, dofs) of each block, by increasing type
+    blocks = []
+    for gtype in sorted(elements):
+        conn = np.asarray(elements[gtype][1], dtype=np.int64)
+        blocks.append((gtype, conn, xy[conn], femsolver.element_dofs(conn, NDOF)))
+    return blocks
+
+
+def _assemble(blocks: list, Db: np.ndarray, Ds: np.ndarray, ndofs: int):
+    K = None
+    for gtype, conn, xe, dofs in blocks:
+        Ke = femsolver.assemble_matrix(plate_stiffness(xe, gtype, Db, Ds), dofs, ndofs)
+        K = Ke if K is None else K + Ke
+    return K
+
+
+def plate_session(coords: np.ndarray, elements: dict, fixno: tuple, material: dict,
+                  thick: float) -> femsolver.SolverSession:
+    """Assembles and factors the stiffness matrix of a plate
+
+    Args:
+        coords (np.ndarray): (npoin, 2 or 3) coordinates, only X and Y are used
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of coords)}
+        fixno (tuple): the rows of the supported points and their fixity codes (nfix, 3), 1 for fixed
+        material (dict): material properties 'E' and 'nu'
+        thick (float): the thickness of the plate
+
+    Returns:
+        femsolver.SolverSession: the session, solving point loads (ncase, npoin, 3)
+    """
+    xy = np.asarray(coords, dtype=float)[:, :2]
+    Db, Ds = constitutive(material['E'], material['nu'], thick)
+    K = _assemble(_blocks(xy, elements), Db, Ds, len(xy)*NDOF)
+    return femsolver.SolverSession(K, femsolver.fixed_dofs(len(xy), NDOF, fixno), NDOF)
+
+
+def solve_plates(coords: np.ndarray, elements: dict, fixno: tuple, material: dict, thick: float,
+                 loads) -> dict:
+    """Linear static analysis of a plate under uniform pressures
+
+    Args:
+        coords (np.ndarray): (npoin, 2 or 3) coordinates, only X and Y are used
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of coords)}
+        fixno (tuple): the rows of the supported points and their fixity codes (nfix, 3), 1 for fixed
+        material (dict): material properties 'E' and 'nu'
+        thick (float): the thickness of the plate
+        loads (float | list): the uniform pressure along w of each load case
+
+    Returns:
+        dict: {DI_CSV: displacements, AST_CSV: averaged nodal forces, EST_CSV: forces at the nodes
+            of the elements}, as ``ofemlib.get_results_from_ofem``; the elements are numbered
+            by increasing gmsh type, as in ``slabdeck.write_slab_gldat``, and each load case
+            is a combination
+    """
+    xy = np.asarray(coords, dtype=float)[:, :2]
+    npoin = len(xy)
+    ndofs = npoin*NDOF
+    loads = np.atleast_1d(np.asarray(loads, dtype=float))
+    Db, Ds = constitutive(material['E'], material['nu'], thick)
+
+    blocks = _blocks(xy, elements)
+    K = _assemble(blocks, Db, Ds, ndofs)
+    F = np.zeros((ndofs, len(loads)))
+    for gtype, conn, xe, dofs in blocks:
+        F += femsolver.assemble_vector(plate_pressure(xe, gtype, loads), dofs, ndofs)
+
+    U = femsolver.solve(K, F, femsolver.fixed_dofs(npoin, NDOF, fixno))
+
+    # forces at the nodes of the elements, padded to the largest element
+    nnode = max(conn.shape[1] for _, conn, _, _ in blocks)
+    nelem = sum(len(conn) for _, conn, _, _ in blocks)
+    forces = np.full((len(loads), nelem, nnode, 5), np.nan)
+    points = np.full((nelem, nnode), -1, dtype=np.int64)
+    first = 0
+    for gtype, conn, xe, dofs in blocks:
+        last = first + len(conn)
+        forces[:, first:last, :conn.shape[1]] = plate_forces(xe, gtype, U[dofs], Db, Ds)
+        points[first:last, :conn.shape[1]] = conn
+        first = last
+
+    est = femsolver.element_node_table(forces)
+    used = np.tile(points.ravel() >= 0, len(loads))
+    est = est[used].reset_index(drop=True)
+
+    # simple average of the element node values at each point
+    ast = recovery.nodal_average(est, points + 1)
+
+    return {
+        DI_CSV: femsolver.displacement_table(U, NDOF),
+        AST_CSV: ast,
+        EST_CSV: est,
+    }
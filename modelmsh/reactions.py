@@ -0,0 +1,526 @@
+"""Support reactions and fixation forces of femix jobs.
+
+The _react.csv (reactions at the fixed degrees of freedom) and _fixfo.csv
+(fixation forces) tables of a job are read from its .ofem archive together
+with the coordinates, the supports and the loads of its deck and the
+combinations of its .cmdat file, once: the job is cached while its archive
+is unchanged, so repeated queries (or the checks of many models) do not
+parse the files again.
+
+The reactions are converted to generalized forces Fx, Fy, Fz, Mx, My, Mz
+(the meaning of the degrees of freedom depends on the femix element types
+of the deck) and summed per group of points about a reference point, for
+all the combinations at once with ``np.bincount``. The groups are the
+supports with the same fixity codes, any {name: point numbers} dict (see
+``msh.getPhysicalGroupNodes`` for the gmsh physical groups) or all the
+points.
+
+The applied loads are summed from the deck: point loads, face and edge loads
+integrated over the loaded faces and edges with the shape functions of
+``shapes``, distributed and point loads of frames and the gravity load of
+the elements with a thickness, then combined with the coefficients of the
+.cmdat file.
+
+Example::
+
+    forces = reactions.support_resultants(jobname, groups='supports', reference=(0, 0, 0))
+    check = reactions.equilibrium(reactions.support_resultants(jobname),
+                                  reactions.load_resultants(jobname))
+"""
+
+import collections
+import logging
+import pathlib
+import zipfile
+import numpy as np
+import pandas as pd
+from . import gldat
+from . import shapes
+from .femix import femix_to_gmsh_order
+from .frame import frame_axes
+from .ofemlib import REACT_CSV, FIXFO_CSV, extract_ofem_deck, result_files
+
+
+logger = logging.getLogger(__name__)
+
+components = ['Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz']
+
+# femix element type: the component of each degree of freedom of the points
+femix_components = {
+    1: (0, 1), 2: (0, 1), 3: (0, 1),
+    4: (0, 1, 2),
+    5: (2, 3, 4), 10: (2, 3, 4),
+    6: (0, 1, 2, 3, 4, 5), 7: (0, 1, 2, 3, 4, 5), 8: (0, 1, 2, 3, 4, 5), 9: (0, 1, 2, 3, 4, 5),
+    13: (0, 1, 5), 14: (0, 1, 5),
+}
+
+# femix element types by the layout of their face, edge and gravity loads
+_plane_types = (1, 2, 3)
+_plate_types = (5, 10)
+_shell_types = (6, 9)
+_bar2d_types = (13, 14)
+_frame_types = (7, 8)
+
+# gmsh type of the loaded faces and edges, by their number of points
+_face_types = {3: 2, 4: 3, 6: 9, 8: 16, 9: 10}
+_edge_types = {2: 1, 3: 8}
+
+# the load sections of the deck
+load_sections = ['point loads', 'face loads', 'edge loads', 'distributed loads', 'element point loads',
+                 'gravity', 'load parameters']
+
+# number of jobs kept in memory
+cache_size = 16
+
+_cache = collections.OrderedDict()
+
+
+def _table(file, value: str) -> pd.DataFrame:
+    # 'point', 'dof', value, 'icomb'; rows repeating the header are dropped
+    df = pd.read_csv(file, sep=';', skipinitialspace=True)
+    df.columns = [c.strip() for c in df.columns]
+    df = df.apply(pd.to_numeric, errors='coerce').dropna(subset=['kpoin', 'kdofn'])
+    if 'icomb' in df.columns:
+        icomb = df['icomb'].values.astype(np.int64)
+    else:
+        # the reactions of each combination are counted from 1
+        count = df['itfix'].values
+        icomb = np.cumsum(np.r_[True, count[1:] <= count[:-1]])
+    table = pd.DataFrame({
+        'point': df['kpoin'].values.astype(np.int64),
+        'dof': df['kdofn'].values.astype(np.int64),
+        value: df[value].values.astype(float),
+        'icomb': icomb,
+    })
+    if 'isscs' in df.columns and (df['isscs'].values != 0).any():
+        logger.warning("reactions in specified coordinate systems are taken in global axes")
+    return table
+
+
+def read_reactions(jobname: str) -> dict:
+    """Reads the reactions, the fixation forces and the geometry of a job, cached
+
+    Args:
+        jobname (str): the job name (path without extension)
+
+    Returns:
+        dict: 'react' ('point', 'dof', 'react', 'icomb'), 'fixfo' ('point', 'dof', 'fixfo',
+            'icomb', None if the job has none), 'nodes' (point numbers), 'coords' (npoin, 3),
+            'fixno' (rows of coords and fixity codes), 'dofs' (the component of each degree
+            of freedom), 'deck' (the deck sections read), 'mesh' (``gldat.to_mesh``) and
+            'combinations' ({icomb: {icase: coefficient}}, None without a .cmdat file)
+    """
+    path = pathlib.Path(jobname + '.ofem').resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+
+    job = pathlib.Path(jobname).name
+    with zipfile.ZipFile(path, 'r') as ofemfile:
+        names = ofemfile.namelist()
+        with ofemfile.open(job + result_files[REACT_CSV]) as file:
+            react = _table(file, 'react')
+        fixfo = None
+        if job + result_files[FIXFO_CSV] in names:
+            with ofemfile.open(job + result_files[FIXFO_CSV]) as file:
+                fixfo = _table(file, 'fixfo')
+        has_cmdat = job + '.cmdat' in names
+
+    deck = gldat.read_gldat(extract_ofem_deck(jobname), sections=[
+        'coordinates', 'element parameters', 'elements', 'fixities', 'materials', 'nodal properties']
+        + load_sections)
+    combinations = None
+    if has_cmdat or pathlib.Path(jobname + '.cmdat').exists():
+        combinations = gldat.read_cmdat(extract_ofem_deck(jobname, '.cmdat'))
+    mesh = gldat.to_mesh(deck)
+    layouts = [femix_components.get(p.get('ntype'), ()) for p in deck.get('element parameters', [])]
+    dofs = max(layouts, key=len, default=())
+    result = {'react': react, 'fixfo': fixfo, 'nodes': mesh['nodes'], 'coords': mesh['coords'],
+              'fixno': mesh['fixno'], 'dofs': dofs if len(dofs) > 0 else tuple(range(6)), 'deck': deck,
+              'mesh': mesh, 'combinations': combinations}
+
+    _cache[key] = result
+    while len(_cache) > cache_size:
+        _cache.popitem(last=False)
+    return result
+
+
+def clear_cache():
+    """Forgets the jobs read by ``read_reactions``"""
+    _cache.clear()
+    return
+
+
+def support_groups(nodes: np.ndarray, fixno: tuple) -> dict:
+    """Groups the supported points by their fixity codes
+
+    Args:
+        nodes (np.ndarray): the point numbers of the rows of the coordinates
+        fixno (tuple): the supported rows and their fixity codes (nfix, ndof)
+
+    Returns:
+        dict: {fixity codes, e.g. '111000': point numbers}
+    """
+    rows, codes = fixno
+    codes = np.asarray(codes, dtype=np.int64)
+    if len(rows) == 0:
+        return {}
+    patterns, inverse = np.unique(codes, axis=0, return_inverse=True)
+    return {''.join(str(c) for c in p): np.asarray(nodes)[np.asarray(rows)[inverse.ravel() == k]]
+            for k, p in enumerate(patterns)}
+
+
+def _moments(forces: pd.DataFrame, nodes: np.ndarray, coords: np.ndarray, dofs: tuple,
+             reference) -> tuple:
+    # the generalized forces of the rows of a point-dof-value table, and the point of each row
+    value = [c for c in forces.columns if c not in ['point', 'dof', 'icomb']][0]
+    points = forces['point'].values
+    dof = forces['dof'].values - 1
+    valid = (dof >= 0) & (dof < len(dofs))
+    f = np.zeros((len(forces), 6))
+    f[np.flatnonzero(valid), np.asarray(dofs)[dof[valid]]] = forces[value].values[valid]
+    rows = np.searchsorted(nodes, points)
+    r = np.asarray(coords)[np.minimum(rows, len(nodes)-1)] - np.asarray(reference, dtype=float)
+    f[:, 3:] += np.cross(r, f[:, :3])
+    return f, points
+
+
+def resultants(forces: pd.DataFrame, nodes: np.ndarray, coords: np.ndarray, groups: dict = None,
+               reference=(0.0, 0.0, 0.0), dofs: tuple = tuple(range(6))) -> pd.DataFrame:
+    """Sums point forces per group of points about a reference point
+
+    Args:
+        forces (pd.DataFrame): 'point', 'dof' (1 based), the values and 'icomb', as the
+            'react' and 'fixfo' tables of ``read_reactions`` or ``femsolver.reaction_table``
+        nodes (np.ndarray): the sorted point numbers of the rows of coords
+        coords (np.ndarray): (npoin, 3) coordinates
+        groups (dict, optional): {name: point numbers}; a point may belong to several groups.
+            Defaults to None, all the points as group 'all'.
+        reference (tuple, optional): the point the moments are taken about. Defaults to the origin.
+        dofs (tuple, optional): the component (index of ``components``) of each degree of freedom.
+            Defaults to the 6 degrees of freedom of 3D frames.
+
+    Returns:
+        pd.DataFrame: 'group', 'icomb', 'Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz'
+    """
+    f, points = _moments(forces, np.asarray(nodes), coords, dofs, reference)
+    combs, comb = np.unique(forces['icomb'].values, return_inverse=True)
+    if groups is None:
+        groups = {'all': None}
+    names = list(groups)
+
+    # (row, group) pairs of the rows in each group
+    rows, gids = [], []
+    for g, name in enumerate(names):
+        if groups[name] is None:
+            inside = np.arange(len(points))
+        else:
+            inside = np.flatnonzero(np.isin(points, np.asarray(groups[name])))
+        rows.append(inside)
+        gids.append(np.full(len(inside), g))
+    rows, gids = np.concatenate(rows), np.concatenate(gids)
+
+    nbins = len(names)*len(combs)
+    key = gids*len(combs) + comb[rows]
+    sums = np.stack([np.bincount(key, f[rows, k], minlength=nbins) for k in range(6)], axis=-1)
+    df = pd.DataFrame(sums, columns=components)
+    df.insert(0, 'group', np.repeat(names, len(combs)))
+    df.insert(1, 'icomb', np.tile(combs, len(names)))
+    return df
+
+
+def support_resultants(jobname: str, groups='all', reference=(0.0, 0.0, 0.0), kind: str = 'react') -> pd.DataFrame:
+    """Sums the reactions (or the fixation forces) of a femix job per group of points
+
+    Args:
+        jobname (str): the job name (path without extension)
+        groups (str | dict, optional): 'all', 'supports' (by fixity codes) or {name: point numbers}.
+            Defaults to 'all'.
+        reference (tuple, optional): the point the moments are taken about. Defaults to the origin.
+        kind (str, optional): 'react' or 'fixfo'. Defaults to 'react'.
+
+    Raises:
+        ValueError: invalid kind or groups, or a job without fixation forces
+
+    Returns:
+        pd.DataFrame: see ``resultants``
+    """
+    if kind not in ['react', 'fixfo']:
+        raise ValueError("Invalid kind, must be 'react' or 'fixfo'.")
+    job = read_reactions(jobname)
+    if job[kind] is None:
+        raise ValueError("The job has no fixation forces.")
+    if isinstance(groups, str):
+        if groups == 'all':
+            groups = None
+        elif groups == 'supports':
+            groups = support_groups(job['nodes'], job['fixno'])
+        else:
+            raise ValueError("Invalid groups, must be 'all', 'supports' or a dict.")
+    return resultants(job[kind], job['nodes'], job['coords'], groups, reference, job['dofs'])
+
+
+def _points(job: dict, numbers: np.ndarray) -> np.ndarray:
+    # the coordinates of point numbers
+    nodes = job['nodes']
+    return job['coords'][np.minimum(np.searchsorted(nodes, numbers), len(nodes)-1)]
+
+
+def _element_info(deck: dict) -> tuple:
+    # femix type, material, nodal properties set and row in the deck of each element number
+    elems = deck['elements']
+    ntypes = {p['iselp']: p.get('ntype', 0) for p in deck.get('element parameters', [])}
+    size = int(elems['ielem'].max(initial=0)) + 1
+    info = np.zeros((4, size), dtype=np.int64)
+    info[0, elems['ielem']] = [ntypes.get(int(k), 0) for k in elems['ielps']]
+    info[1, elems['ielem']] = elems['matno']
+    info[2, elems['ielem']] = elems['ielnp']
+    info[3, elems['ielem']] = np.arange(len(elems['ielem']))
+    return tuple(info)
+
+
+def _unit(v: np.ndarray) -> tuple:
+    norm = np.sqrt((v**2).sum(axis=-1))
+    return v / norm[..., None], norm
+
+
+def _padded(values: np.ndarray, ncomp: int) -> np.ndarray:
+    out = np.zeros(values.shape[:-1] + (max(ncomp, values.shape[-1]),))
+    out[..., :values.shape[-1]] = values
+    return out
+
+
+def _face_density(ntype: int, T: np.ndarray, q: np.ndarray) -> tuple:
+    # force per unit area and area scale at the Gauss points; None for moments or unknown types
+    n, area = _unit(np.cross(T[:, :, 0], T[:, :, 1]))
+    s1 = _unit(T[:, :, 0])[0]
+    s2 = np.cross(n, s1)
+    q = _padded(q, 3)
+    if ntype in _plate_types:
+        f, moments = q[..., :1]*np.array([0.0, 0.0, 1.0]), q[..., 1:]
+    elif ntype in _plane_types:
+        f, moments = q[..., :1]*s1 + q[..., 1:2]*s2, q[..., 2:]
+    elif ntype == 4 or ntype in _shell_types:
+        f, moments = q[..., :1]*s1 + q[..., 1:2]*s2 + q[..., 2:3]*n, q[..., 3:]
+    else:
+        return None
+    return (f, area) if not np.any(moments != 0.0) else None
+
+
+def _edge_density(ntype: int, T: np.ndarray, q: np.ndarray) -> tuple:
+    # force per unit length and length scale at the Gauss points; None for moments or unknown types
+    t, length = _unit(T[:, :, 0])
+    q = _padded(q, 2)
+    if ntype in _plane_types or ntype in _bar2d_types:
+        f, moments = q[..., :1]*t + q[..., 1:2]*np.cross([0.0, 0.0, 1.0], t), q[..., 2:]
+    elif ntype in _plate_types:
+        f, moments = q[..., :1]*np.array([0.0, 0.0, 1.0]), q[..., 1:]
+    else:
+        return None
+    return (f, length) if not np.any(moments != 0.0) else None
+
+
+def _record_forces(job: dict, loads: dict, kind: str, ntype: np.ndarray) -> tuple:
+    # nodal forces of the face or edge loads of a load case: points (n, 3), forces (n, 6) or None
+    values = loads['values']
+    counts = np.bincount(loads['record'], minlength=len(loads['element']))
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    etypes = ntype[np.minimum(loads['element'], len(ntype)-1)]
+    types = _face_types if kind == 'face loads' else _edge_types
+    density = _face_density if kind == 'face loads' else _edge_density
+    positions, forces = [], []
+    for nn, et in np.unique(np.c_[counts, etypes], axis=0):
+        if nn not in types:
+            logger.warning("%s with %d points are not summed", kind, nn)
+            return None
+        gtype = types[nn]
+        recs = np.flatnonzero((counts == nn) & (etypes == et))
+        rows = (starts[recs][:, None] + np.arange(nn))[:, femix_to_gmsh_order[gtype]]
+        x = _points(job, values[rows, 0].astype(np.int64))
+        points, weights = shapes.gauss_points(gtype, 4)
+        N, dN = shapes.shape_functions(gtype, points)
+        T = np.einsum('pnd,rnj->rpdj', dN, x)
+        f = density(int(et), T, np.einsum('pn,rnc->rpc', N, values[rows, 1:]))
+        if f is None:
+            logger.warning("%s of femix type %d elements are not summed", kind, et)
+            return None
+        F = np.einsum('pn,rpj,rp->rnj', N, f[0], f[1]*weights)
+        positions.append(x.reshape(-1, 3))
+        forces.append(_padded(F.reshape(-1, 3), 6))
+    return positions, forces
+
+
+def _frame_ends(job: dict, elements: np.ndarray, row: np.ndarray) -> tuple:
+    # the coordinates of the end points of frame elements
+    elems = job['deck']['elements']
+    r = row[elements]
+    last = elems['nnode'][r] - 1
+    return _points(job, elems['lnods'][r, 0]), _points(job, elems['lnods'][r, last])
+
+
+def _gravity_forces(job: dict, g: np.ndarray, info: tuple) -> tuple:
+    # nodal forces of the gravity load: points (n, 3), forces (n, 6) or None
+    ntype, matno, ielnp, _ = info
+    deck = job['deck']
+    materials = deck.get('materials', {})
+    props = deck.get('nodal properties', {})
+    positions, forces = [], []
+    for gtype, (tags, conn) in job['mesh']['elements'].items():
+        tags = np.asarray(tags, dtype=np.int64)
+        keys = np.c_[ntype[tags], matno[tags], ielnp[tags]]
+        for et, imats, ispen in np.unique(keys, axis=0):
+            if gtype not in shapes.element_types or imats not in materials or ispen not in props or \
+                    et not in _plane_types + _plate_types + _shell_types:
+                logger.warning("the gravity load of femix type %d elements is not summed", et)
+                return None
+            if et in _plate_types:
+                accel = np.array([0.0, 0.0, g[0]])
+            elif et in _plane_types:
+                accel = np.array([g[0], g[1] if len(g) > 1 else 0.0, 0.0])
+            else:
+                accel = _padded(g[None], 3)[0, :3]
+            sel = np.flatnonzero((keys == [et, imats, ispen]).all(axis=1))
+            thick = props[ispen][:, 1][femix_to_gmsh_order[gtype]]
+            x = job['coords'][np.asarray(conn)[sel]]
+            points, weights = shapes.gauss_points(gtype, 4)
+            N, dN = shapes.shape_functions(gtype, points)
+            mass = materials[imats][2]*np.einsum('pn,p,ep->en', N, (N @ thick)*weights, shapes.measure(x, dN))
+            positions.append(x.reshape(-1, 3))
+            forces.append(_padded(mass.reshape(-1, 1)*accel, 6))
+    return positions, forces
+
+
+def _case_forces(job: dict, sections: dict, info: tuple) -> tuple:
+    # the forces of the loads of a load case, as points (n, 3) and forces (n, 6); None if some
+    # load can not be summed
+    ntype, _, _, row = info
+    positions, forces = [], []
+
+    table = sections.get('point loads')
+    if table is not None and len(table) > 0:
+        ndof = min(table.shape[1] - 2, len(job['dofs']))
+        f = np.zeros((len(table), 6))
+        f[:, np.asarray(job['dofs'][:ndof])] = table[:, 2:2+ndof]
+        positions.append(_points(job, table[:, 1].astype(np.int64)))
+        forces.append(f)
+
+    for kind in ['face loads', 'edge loads']:
+        loads = sections.get(kind)
+        if loads is not None and len(loads['element']) > 0:
+            found = _record_forces(job, loads, kind, ntype)
+            if found is None:
+                return None
+            positions += found[0]
+            forces += found[1]
+
+    for kind in ['distributed loads', 'element point loads']:
+        table = sections.get(kind)
+        if table is None or len(table) == 0:
+            continue
+        elements = table[:, 1].astype(np.int64)
+        if not np.isin(ntype[np.minimum(elements, len(ntype)-1)], _frame_types).all():
+            logger.warning("%s of elements other than frames are not summed", kind)
+            return None
+        x0, x1 = _frame_ends(job, elements, row)
+        if kind == 'distributed loads':
+            # local axes of the frames, load per unit length at the middle of the elements
+            axes, length = frame_axes(np.r_[x0, x1], np.c_[np.arange(len(x0)), np.arange(len(x0)) + len(x0)])
+            q = _padded(table[:, 2:], 6)
+            f = np.c_[np.einsum('eij,ei->ej', axes, q[:, :3]), np.einsum('eij,ei->ej', axes, q[:, 3:6])]
+            positions.append(0.5*(x0 + x1))
+            forces.append(length[:, None]*f)
+        else:
+            e1 = _unit(x1 - x0)[0]
+            positions.append(x0 + table[:, 2:3]*e1)
+            forces.append(_padded(table[:, 3:9], 6))
+
+    gravity = sections.get('gravity')
+    if sections.get('load parameters', {}).get('ngrav', 0) == 1 and gravity is not None and len(gravity) > 0:
+        found = _gravity_forces(job, gravity[0], info)
+        if found is None:
+            return None
+        positions += found[0]
+        forces += found[1]
+
+    if len(forces) == 0:
+        return np.zeros((0, 3)), np.zeros((0, 6))
+    return np.concatenate(positions), np.concatenate(forces)
+
+
+def load_resultants(jobname: str, reference=(0.0, 0.0, 0.0)) -> pd.DataFrame:
+    """Sums the applied loads of each combination of a femix job
+
+    The loads of each load case of the deck are summed: point loads, face
+    and edge loads integrated over the loaded points (in the local axes of
+    the face or edge, normal along +Z for plates), distributed and point
+    loads of frames (local axes of ``frame.frame_axes``) and gravity on
+    elements with a thickness. Thermal loads and prescribed displacements
+    apply no resultant. The load cases are combined with the coefficients
+    of the .cmdat file or, without it, each load case is the combination of
+    the same number. A combination is NaN if one of its load cases has
+    loads that can not be summed (face or edge moments, loads of other
+    element types, gravity on frames or solids); they are logged.
+
+    Args:
+        jobname (str): the job name (path without extension)
+        reference (tuple, optional): the point the moments are taken about. Defaults to the origin.
+
+    Returns:
+        pd.DataFrame: 'group' ('loads'), 'icomb', 'Fx', 'Fy', 'Fz', 'Mx', 'My', 'Mz'
+    """
+    job = read_reactions(jobname)
+    info = _element_info(job['deck'])
+    reference = np.asarray(reference, dtype=float)
+    cases = {}
+    for case, sections in job['deck']['load cases'].items():
+        found = _case_forces(job, sections, info)
+        if found is None:
+            cases[case] = np.full(6, np.nan)
+            continue
+        positions, f = found
+        cases[case] = np.r_[f[:, :3].sum(axis=0),
+                            f[:, 3:].sum(axis=0) + np.cross(positions - reference, f[:, :3]).sum(axis=0)]
+
+    combinations = job['combinations']
+    if combinations is None:
+        combinations = {case: {case: 1.0} for case in cases}
+    combs = sorted(combinations)
+    sums = np.zeros((len(combs), 6))
+    for k, icomb in enumerate(combs):
+        for icase, coef in combinations[icomb].items():
+            if coef != 0.0:
+                sums[k] += coef*cases.get(icase, np.zeros(6))
+    df = pd.DataFrame(sums, columns=components)
+    df.insert(0, 'group', 'loads')
+    df.insert(1, 'icomb', np.asarray(combs, dtype=np.int64))
+    return df
+
+
+def equilibrium(reactions: pd.DataFrame, loads: pd.DataFrame, tolerance: float = 1.0e-6) -> pd.DataFrame:
+    """Checks that the reactions balance the applied loads in each combination
+
+    Args:
+        reactions (pd.DataFrame): the resultants of all the reactions ('icomb' and the components,
+            one group), see ``support_resultants``
+        loads (pd.DataFrame): the resultants of the applied loads about the same point,
+            e.g. ``load_resultants``
+        tolerance (float, optional): the allowed residual, relative to the largest applied force
+            or moment of the combination. Defaults to 1.0e-6.
+
+    Returns:
+        pd.DataFrame: 'icomb', the residual components (reactions + loads), 'error' (relative,
+            NaN where the applied loads are unknown or zero) and 'ok'
+    """
+    r = reactions.groupby('icomb')[components].sum()
+    p = loads.groupby('icomb')[components].sum(min_count=1).reindex(r.index)
+    residual = r + p
+    forces = np.abs(p[components[:3]].values).max(axis=1, initial=0.0)
+    moments = np.abs(p[components[3:]].values).max(axis=1, initial=0.0)
+    scale = np.maximum(forces, moments)
+    df = residual.reset_index()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df['error'] = np.abs(residual.values).max(axis=1) / np.where(scale > 0.0, scale, np.nan)
+    df['ok'] = df['error'] <= tolerance
+    return df
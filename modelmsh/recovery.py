@@ -0,0 +1,161 @@
+"""Nodal averaging of the element-node stresses, without the femix post-processor.
+
+The element-node results (``_elnst.csv`` layout: 'element', 'node' (local
+node of the element), 'str-1' ... 'str-n' and 'icomb') are gathered on the
+points of the elements and averaged with ``np.bincount``, for all the
+combinations at once. The contributions can be weighted (simple average,
+element lengths or areas, or any weight per element) and kept apart per
+group of elements (sections or materials), so that the averages do not
+smear discontinuities between groups.
+
+Example::
+
+    avg = recovery.average_from_ofem(jobname, weights='area', by='material')
+"""
+
+import numpy as np
+import pandas as pd
+from . import shapes
+
+
+def element_sizes(coords: np.ndarray, elements: dict) -> np.ndarray:
+    """Returns the lengths or areas of the elements
+
+    Args:
+        coords (np.ndarray): (npoin, 2 or 3) coordinates
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of coords)}
+
+    Returns:
+        np.ndarray: the sizes, in the order of the blocks by increasing gmsh type
+    """
+    sizes = []
+    coords = np.asarray(coords, dtype=float)
+    for gtype in sorted(elements):
+        conn = np.asarray(elements[gtype][1], dtype=np.int64)
+        points, weights = shapes.gauss_points(gtype, 4)
+        N, dN = shapes.shape_functions(gtype, points)
+        sizes.append((shapes.measure(coords[conn], dN)*weights).sum(axis=1))
+    return np.concatenate(sizes) if sizes else np.empty(0)
+
+
+def padded_connectivity(elements: dict) -> np.ndarray:
+    """Returns the connectivity of all the blocks as one array of point numbers
+
+    Args:
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of the points)}
+
+    Returns:
+        np.ndarray: (nelem, max nnode) point numbers (row + 1), 0 where the element has fewer
+            nodes, in the order of the blocks by increasing gmsh type
+    """
+    blocks = [np.asarray(elements[t][1], dtype=np.int64) for t in sorted(elements)]
+    nnode = max([b.shape[1] for b in blocks], default=0)
+    conn = np.zeros((sum(len(b) for b in blocks), nnode), dtype=np.int64)
+    first = 0
+    for b in blocks:
+        conn[first:first+len(b), :b.shape[1]] = b + 1
+        first += len(b)
+    return conn
+
+
+def nodal_average(est: pd.DataFrame, conn: np.ndarray, weights=None, groups: np.ndarray = None) -> pd.DataFrame:
+    """Averages element-node values at the points
+
+    Args:
+        est (pd.DataFrame): the element-node values ('element', 'node', 'str-*', 'icomb'),
+            elements and nodes numbered from 1
+        conn (np.ndarray): (nelem, max nnode) point numbers of element e in row e-1, 0 (or less)
+            for missing nodes
+        weights (np.ndarray, optional): the weight of each element (row of conn), such as
+            ``element_sizes``. Defaults to None, the simple average.
+        groups (np.ndarray, optional): the group of each element; points shared by groups get
+            one average per group. Defaults to None.
+
+    Returns:
+        pd.DataFrame: 'point', ['group',] 'str-*' and 'icomb', sorted by combination, group and point
+    """
+    conn = np.asarray(conn, dtype=np.int64)
+    element = est['element'].values - 1
+    points = conn[element, est['node'].values - 1]
+    columns = [c for c in est.columns if c.startswith('str-')]
+    valid = points > 0
+    for c in columns:
+        valid &= np.isfinite(est[c].values)
+
+    ids, point = np.unique(points[valid], return_inverse=True)
+    combs, comb = np.unique(est['icomb'].values[valid] if 'icomb' in est else np.ones(valid.sum()),
+                            return_inverse=True)
+    if groups is None:
+        names, group = np.zeros(1, dtype=np.int64), np.zeros(valid.sum(), dtype=np.int64)
+    else:
+        names, group = np.unique(np.asarray(groups)[element[valid]], return_inverse=True)
+    w = np.ones(valid.sum()) if weights is None else np.asarray(weights, dtype=float)[element[valid]]
+
+    # one bin per (combination, group, point)
+    nbins = len(combs)*len(names)*len(ids)
+    key = (comb*len(names) + group)*len(ids) + point
+    total = np.bincount(key, w, minlength=nbins)
+    values = np.stack([np.bincount(key, w*est[c].values[valid], minlength=nbins) for c in columns], axis=-1)
+    used = total > 0
+    values = values[used] / total[used, None]
+
+    bins = np.flatnonzero(used)
+    df = pd.DataFrame(values, columns=columns)
+    df.insert(0, 'point', ids[bins % len(ids)])
+    if groups is not None:
+        df.insert(1, 'group', names[(bins // len(ids)) % len(names)])
+    df['icomb'] = combs[bins // (len(ids)*len(names))]
+    return df
+
+
+def average_from_ofem(jobname: str, weights: str = 'simple', by: str = None) -> pd.DataFrame:
+    """Averages the element-node stresses of a femix job at the points
+
+    The connectivity (and for area weights the coordinates) are read from the
+    .gldat deck (extracted from the .ofem archive if needed), the stresses from
+    the _elnst.csv results of the .ofem file.
+
+    Args:
+        jobname (str): the job name (path without extension)
+        weights (str, optional): 'simple' or 'area' (element lengths or areas; elements of other
+            types are left out of the averages). Defaults to 'simple'.
+        by (str, optional): None, 'material' or 'section' (set of element parameters), the groups
+            kept apart. Defaults to None.
+
+    Raises:
+        ValueError: invalid weights or groups
+
+    Returns:
+        pd.DataFrame: see ``nodal_average``
+    """
+    from . import gldat
+    from .ofemlib import EST_CSV, extract_ofem_deck, get_csv_from_ofem
+
+    if weights not in ['simple', 'area']:
+        raise ValueError("Invalid weights, must be 'simple' or 'area'.")
+    if by not in [None, 'material', 'section']:
+        raise ValueError("Invalid groups, must be None, 'material' or 'section'.")
+
+    sections = ['coordinates', 'element parameters', 'elements'] if weights == 'area' else ['elements']
+    deck = gldat.read_gldat(extract_ofem_deck(jobname), sections=sections)
+    elems = deck['elements']
+    nelem = int(elems['ielem'].max())
+    conn = np.zeros((nelem, elems['lnods'].shape[1]), dtype=np.int64)
+    conn[elems['ielem']-1] = elems['lnods']
+
+    w = None
+    if weights == 'area':
+        mesh = gldat.to_mesh(deck)
+        w = np.zeros(nelem)
+        blocks = {t: b for t, b in mesh['elements'].items() if t in shapes.element_types}
+        if len(blocks) > 0:
+            tags = np.concatenate([blocks[t][0] for t in sorted(blocks)])
+            w[np.asarray(tags, dtype=np.int64)-1] = element_sizes(mesh['coords'], blocks)
+
+    groups = None
+    if by is not None:
+        groups = np.zeros(nelem, dtype=np.int64)
+        groups[elems['ielem']-1] = elems['matno'] if by == 'material' else elems['ielps']
+
+    est = get_csv_from_ofem(jobname, EST_CSV)
+    return nodal_average(est, conn, w, groups)
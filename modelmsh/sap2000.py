@@ -1,7 +1,4 @@
 
-import meshio
-import gmsh
-import openpyxl
 import numpy as np
 import pandas as pd
 import pathlib
@@ -43,10 +40,12 @@ colors = {
 
 
 def add_area_nodes2(surf, itype, elem, nodes):
+        import gmsh
         gmsh.model.mesh.addElementsByType(surf, itype, [elem], nodes)
 
 
 def add_area_nodes(elem, node1, node2, node3, node4):
+    import gmsh
     surf = gmsh.model.addDiscreteEntity(SURFACE)
     if (node4 == 'nan'):
         gmsh.model.mesh.addElementsByType(surf, TRIANGLE3, [elem], [node1, node2, node3])
@@ -115,6 +114,7 @@ def read_line(s: str, s0, cont: bool=False) -> dict:
 
 
 def rename_area_nodes(elem, nodes):
+    import gmsh
     surf = gmsh.model.addDiscreteEntity(SURFACE)
     if len(nodes) == 3:
         gmsh.model.mesh.addElementsByType(surf, TRIANGLE3, [elem], nodes)
@@ -124,6 +124,7 @@ def rename_area_nodes(elem, nodes):
 
 
 def add_elem_nodes(joints, elem, node1, node2):
+    import gmsh
     surf = gmsh.model.addDiscreteEntity(CURVE)
     lst =  [joints.at[node1, "JoinTag"],
             joints.at[node2, "JoinTag"]]
@@ -205,6 +206,7 @@ class sap2000_handler:
             raise ValueError("File extension not supported")
         
         self._filename = str(path.parent / path.stem)
+        self._msh_model = None  # gmsh model kept live by to_msh
 
         if not self._check_input("geometry"):
             raise ValueError("Input file is not a SAP2000 file")
@@ -644,15 +646,31 @@ class sap2000_handler:
         return
 
 
-    def to_msh(self, model: str = 'geometry', entities: str = 'types', physicals: str = ''):
-        """Writes a GMSH mesh file and opens it in GMSH
+    def to_msh(self, model: str = 'geometry', entities: str = 'types', physicals: str = '',
+               write: bool = True, keep: bool = False, background: bool = False, binary: bool = False,
+               partitions: int = 0):
+        """Builds the GMSH model and writes it as a .msh file
 
         Args:
-            filename (str): the name of the file to be written
+            model (str, optional): "geometry" or "mesh". Defaults to 'geometry'.
+            entities (str, optional): "types", "sections" or "elements". Defaults to 'types'.
+            physicals (str, optional): "sections" or "". Defaults to ''.
+            write (bool, optional): writes the .msh file. Defaults to True.
+            keep (bool, optional): keeps the model live in the gmsh session, current, until
+                ``close_msh`` is called. Defaults to False.
+            background (bool, optional): writes the file on a background thread; useful with keep,
+                ``wait_msh`` waits for it, and gmsh must not be used meanwhile without holding
+                ``gmshsession.lock``. Defaults to False.
+            binary (bool, optional): writes a binary MSH 4.1 file. Defaults to False.
+            partitions (int, optional): if > 1, partitions the mesh and writes one file per
+                partition (name_1.msh ... name_N.msh). Defaults to 0.
+
+        Returns:
+            str: the name of the .msh file
         """
+        import gmsh
+        from . import gmshsession
         filename = self._filename + ".msh"
-        listsectionframes = None
-        listsectionareas = None
         
         # process options
         if model not in ['geometry', 'mesh']:
@@ -667,11 +685,52 @@ class sap2000_handler:
         if not self._check_input(filename):
             raise ValueError('Filename id nt in correct format')
         
-        # initialize gmsh
-        gmsh.initialize(sys.argv)
-        
-        gmsh.model.add(pathlib.Path(filename).stem)
-        gmsh.model.setFileName(filename)
+        self.close_msh()
+
+        # the model is built in the shared gmsh session
+        name = pathlib.Path(filename).stem
+        gmshsession.acquire(sys.argv)
+        try:
+            gmshsession.use_model(name, clear=True)
+            gmsh.model.setFileName(filename)
+            self._build_msh(filename, model, entities, physicals)
+            if write:
+                gmshsession.write_model(name, filename, binary, background, partitions)
+        except:
+            gmshsession.remove_model(name)
+            gmshsession.release()
+            raise
+
+        if keep:
+            self._msh_model = name
+        else:
+            # the background write must end before the model is removed
+            gmshsession.wait()
+            gmshsession.remove_model(name)
+            gmshsession.release()
+
+        return self._filename + ".msh"
+
+    def wait_msh(self):
+        """Waits for the background writes of the gmsh session"""
+        from . import gmshsession
+        gmshsession.wait()
+        return
+
+    def close_msh(self):
+        """Removes the model kept live by ``to_msh`` and releases the gmsh session"""
+        if self._msh_model is None:
+            return
+        from . import gmshsession
+        gmshsession.remove_model(self._msh_model)
+        gmshsession.release()
+        self._msh_model = None
+        return
+
+    def _build_msh(self, filename: str, model: str, entities: str, physicals: str):
+        import gmsh
+        listsectionframes = None
+        listsectionareas = None
 
         joints = self.s2k['Joint Coordinates'.upper()]
         elems = self.s2k['Connectivity - Frame'.upper()]
@@ -819,33 +878,43 @@ class sap2000_handler:
         gmsh.option.setNumber("Mesh.SaveAll", 1)
 
         #size = gmsh.model.getBoundingBox(-1, -1)
-        gmsh.write(filename)
 
         # # Launch the GUI to see the results:
         # if '-nopopup' not in sys.argv:
         #     gmsh.fltk.run()
 
-        gmsh.finalize()
-
-        return self._filename + ".msh"
+        return
 
 
-    def to_msh_and_open(self, model: str = 'geometry', entities: str = 'types', physicals: str = ''):
+    def to_msh_and_open(self, model: str = 'geometry', entities: str = 'types', physicals: str = '',
+                        write: bool = True, binary: bool = False):
+        """Builds the GMSH model and opens it in the GMSH GUI
 
-        s = self.to_msh(model, entities, physicals)
+        The model goes to the GUI straight from the gmsh session; the .msh file,
+        if requested, is written before the GUI starts, since gmsh can not be
+        used from two threads at once.
 
-        gmsh.initialize()
-        
-        gmsh.option.setNumber("Mesh.Lines", 1)
-        gmsh.option.setNumber("Mesh.SurfaceFaces", 1)
-        gmsh.option.setNumber("Mesh.LineWidth", 5)
-        gmsh.option.setNumber("Mesh.ColorCarousel", colors[entities])
+        Args:
+            model (str, optional): "geometry" or "mesh". Defaults to 'geometry'.
+            entities (str, optional): "types", "sections" or "elements". Defaults to 'types'.
+            physicals (str, optional): "sections" or "". Defaults to ''.
+            write (bool, optional): writes the .msh file. Defaults to True.
+            binary (bool, optional): writes a binary MSH 4.1 file. Defaults to False.
+        """
+        import gmsh
 
-        gmsh.open(s)
-        if '-nopopup' not in sys.argv:
-            gmsh.fltk.run()
+        self.to_msh(model, entities, physicals, write=write, keep=True, background=False, binary=binary)
 
-        gmsh.finalize()
+        try:
+            gmsh.option.setNumber("Mesh.Lines", 1)
+            gmsh.option.setNumber("Mesh.SurfaceFaces", 1)
+            gmsh.option.setNumber("Mesh.LineWidth", 5)
+            gmsh.option.setNumber("Mesh.ColorCarousel", colors[entities])
+
+            if '-nopopup' not in sys.argv:
+                gmsh.fltk.run()
+        finally:
+            self.close_msh()
 
 
     def copy(self):
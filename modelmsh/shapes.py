@@ -0,0 +1,187 @@
+"""Shape functions and Gauss rules of the isoparametric elements.
+
+The elements are identified by their gmsh type and use the gmsh node
+ordering, so the connectivities of ``msh.getMeshArrays`` and ``structured``
+can be used directly. All the functions are evaluated at many points at
+once: ``shape_functions`` returns (npts, nnode) values and (npts, nnode, dim)
+derivatives, and ``isoparametric`` maps them to all the elements of a block
+with one einsum.
+
+Natural coordinates: [-1, 1] for lines and quadrilaterals, area coordinates
+(xi, eta) with 0 <= xi, eta, xi+eta <= 1 for triangles.
+"""
+
+import numpy as np
+
+
+# gmsh type: (name, dim, natural coordinates of the nodes)
+element_types = {
+    1: ("line", 1, [[-1.0], [1.0]]),
+    8: ("line3", 1, [[-1.0], [1.0], [0.0]]),
+    2: ("triangle", 2, [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]),
+    9: ("triangle6", 2, [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.5, 0.0], [0.5, 0.5], [0.0, 0.5]]),
+    3: ("quad", 2, [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0]]),
+    16: ("quad8", 2, [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0],
+                      [0.0, -1.0], [1.0, 0.0], [0.0, 1.0], [-1.0, 0.0]]),
+    10: ("quad9", 2, [[-1.0, -1.0], [1.0, -1.0], [1.0, 1.0], [-1.0, 1.0],
+                      [0.0, -1.0], [1.0, 0.0], [0.0, 1.0], [-1.0, 0.0], [0.0, 0.0]]),
+}
+
+
+def natural_nodes(gtype: int) -> np.ndarray:
+    """Returns the natural coordinates of the nodes of an element type
+
+    Args:
+        gtype (int): the gmsh element type
+
+    Returns:
+        np.ndarray: (nnode, dim) coordinates
+    """
+    return np.array(element_types[gtype][2])
+
+
+def _lagrange1d(x: np.ndarray, order: int) -> tuple:
+    # 1D Lagrange polynomials at -1, 1 (and 0 for order 2), in gmsh order
+    if order == 1:
+        N = np.stack([(1.0-x)/2.0, (1.0+x)/2.0], axis=-1)
+        dN = np.stack([np.full_like(x, -0.5), np.full_like(x, 0.5)], axis=-1)
+    else:
+        N = np.stack([x*(x-1.0)/2.0, x*(x+1.0)/2.0, 1.0-x**2], axis=-1)
+        dN = np.stack([x-0.5, x+0.5, -2.0*x], axis=-1)
+    return N, dN
+
+
+def shape_functions(gtype: int, points) -> tuple:
+    """Returns the shape functions and their derivatives at points in natural coordinates
+
+    Args:
+        gtype (int): the gmsh element type
+        points (array_like): (npts, dim) natural coordinates
+
+    Raises:
+        ValueError: unsupported element type
+
+    Returns:
+        tuple: N (npts, nnode) and dN/dxi (npts, nnode, dim)
+    """
+    if gtype not in element_types:
+        raise ValueError("Unsupported element type %d." % gtype)
+    dim = element_types[gtype][1]
+    p = np.asarray(points, dtype=float).reshape(-1, dim)
+
+    if gtype in (1, 8):
+        N, dN = _lagrange1d(p[:, 0], 1 if gtype == 1 else 2)
+        return N, dN[:, :, None]
+
+    x, y = p[:, 0], p[:, 1]
+    if gtype == 2:
+        N = np.stack([1.0-x-y, x, y], axis=-1)
+        dN = np.broadcast_to(np.array([[-1.0, -1.0], [1.0, 0.0], [0.0, 1.0]]), (len(p), 3, 2)).copy()
+    elif gtype == 9:
+        L = np.stack([1.0-x-y, x, y], axis=-1)
+        dL = np.array([[-1.0, -1.0], [1.0, 0.0], [0.0, 1.0]])
+        pairs = [(0, 1), (1, 2), (2, 0)]
+        N = np.concatenate([L*(2.0*L-1.0), np.stack([4.0*L[:, i]*L[:, j] for i, j in pairs], axis=-1)], axis=1)
+        dN = np.concatenate([(4.0*L-1.0)[:, :, None]*dL,
+                             np.stack([4.0*(L[:, j, None]*dL[i] + L[:, i, None]*dL[j]) for i, j in pairs], axis=1)],
+                            axis=1)
+    elif gtype == 3:
+        nodes = natural_nodes(3)
+        N = (1.0 + x[:, None]*nodes[:, 0])*(1.0 + y[:, None]*nodes[:, 1])/4.0
+        dN = np.stack([nodes[:, 0]*(1.0 + y[:, None]*nodes[:, 1])/4.0,
+                       nodes[:, 1]*(1.0 + x[:, None]*nodes[:, 0])/4.0], axis=-1)
+    elif gtype == 16:
+        c = natural_nodes(16)[:4]
+        xc, yc = x[:, None]*c[:, 0], y[:, None]*c[:, 1]
+        corner = (1.0+xc)*(1.0+yc)*(xc+yc-1.0)/4.0
+        dcx = c[:, 0]*(1.0+yc)*(2.0*xc+yc)/4.0
+        dcy = c[:, 1]*(1.0+xc)*(xc+2.0*yc)/4.0
+        xs, ys = x[:, None]*np.array([-1.0, 1.0]), y[:, None]*np.array([-1.0, 1.0])
+        # mid-side nodes 5, 7 (eta = -1, 1) and 6, 8 (xi = 1, -1)
+        mx = (1.0-x[:, None]**2)*(1.0+ys)/2.0
+        my = (1.0+xs[:, ::-1])*(1.0-y[:, None]**2)/2.0
+        N = np.concatenate([corner, mx[:, [0]], my[:, [0]], mx[:, [1]], my[:, [1]]], axis=1)
+        dmxx = -x[:, None]*(1.0+ys)
+        dmxy = (1.0-x[:, None]**2)*np.array([-1.0, 1.0])/2.0
+        dmyx = np.array([1.0, -1.0])*(1.0-y[:, None]**2)/2.0
+        dmyy = -(1.0+xs[:, ::-1])*y[:, None]
+        dx = np.concatenate([dcx, dmxx[:, [0]], dmyx[:, [0]], dmxx[:, [1]], dmyx[:, [1]]], axis=1)
+        dy = np.concatenate([dcy, dmxy[:, [0]], dmyy[:, [0]], dmxy[:, [1]], dmyy[:, [1]]], axis=1)
+        dN = np.stack([dx, dy], axis=-1)
+    else:
+        # quad9, tensor product of the 1D quadratic polynomials (-1, 1, 0)
+        Nx, dNx = _lagrange1d(x, 2)
+        Ny, dNy = _lagrange1d(y, 2)
+        ix = np.array([0, 1, 1, 0, 2, 1, 2, 0, 2])
+        iy = np.array([0, 0, 1, 1, 0, 2, 1, 2, 2])
+        N = Nx[:, ix]*Ny[:, iy]
+        dN = np.stack([dNx[:, ix]*Ny[:, iy], Nx[:, ix]*dNy[:, iy]], axis=-1)
+    return N, dN
+
+
+def _triangle_rule(degree: int) -> tuple:
+    if degree <= 1:
+        return np.array([[1.0/3.0, 1.0/3.0]]), np.array([0.5])
+    if degree == 2:
+        a, b = 1.0/6.0, 2.0/3.0
+        return np.array([[a, a], [b, a], [a, b]]), np.full(3, 1.0/6.0)
+    # 6 point rule, exact for degree 4
+    a, wa = 0.445948490915965, 0.223381589678011/2.0
+    b, wb = 0.091576213509771, 0.109951743655322/2.0
+    points = np.array([[a, a], [1.0-2.0*a, a], [a, 1.0-2.0*a],
+                       [b, b], [1.0-2.0*b, b], [b, 1.0-2.0*b]])
+    return points, np.array([wa]*3 + [wb]*3)
+
+
+def gauss_points(gtype: int, degree: int) -> tuple:
+    """Returns a Gauss rule of an element type
+
+    Args:
+        gtype (int): the gmsh element type
+        degree (int): the polynomial degree integrated exactly (up to 4 for triangles)
+
+    Returns:
+        tuple: the points (npts, dim) in natural coordinates and the weights (npts,)
+    """
+    name, dim, _ = element_types[gtype]
+    if name.startswith("triangle"):
+        return _triangle_rule(degree)
+    x, w = np.polynomial.legendre.leggauss(max(1, (degree + 2)//2))
+    if dim == 1:
+        return x[:, None], w
+    # the first coordinate runs fastest
+    return np.stack(np.meshgrid(x, x), axis=-1).reshape(-1, 2), np.outer(w, w).ravel()
+
+
+def isoparametric(xe: np.ndarray, dN: np.ndarray) -> tuple:
+    """Maps the derivatives of the shape functions to the elements
+
+    Args:
+        xe (np.ndarray): the coordinates of the nodes of the elements (nelem, nnode, dim)
+        dN (np.ndarray): the derivatives in natural coordinates (npts, nnode, dim)
+
+    Returns:
+        tuple: the determinants of the Jacobians (nelem, npts) and the derivatives
+            in global coordinates (nelem, npts, nnode, dim)
+    """
+    J = np.einsum('pni,enj->epij', dN, xe)
+    invJ = np.linalg.inv(J)
+    return np.linalg.det(J), np.einsum('epij,pnj->epni', invJ, dN)
+
+
+def measure(xe: np.ndarray, dN: np.ndarray) -> np.ndarray:
+    """Returns the length or area scale factors of elements embedded in 3D
+
+    Args:
+        xe (np.ndarray): the coordinates of the nodes of the elements (nelem, nnode, 3)
+        dN (np.ndarray): the derivatives in natural coordinates (npts, nnode, dim)
+
+    Returns:
+        np.ndarray: (nelem, npts) the norm of the tangent vector (lines) or of the cross
+            product of the tangent vectors (surfaces)
+    """
+    xe = np.pad(xe, ((0, 0), (0, 0), (0, 3 - xe.shape[-1])))
+    J = np.einsum('pni,enj->epij', dN, xe)
+    if J.shape[2] == 1:
+        return np.sqrt((J[:, :, 0, :]**2).sum(axis=-1))
+    return np.sqrt((np.cross(J[:, :, 0, :], J[:, :, 1, :])**2).sum(axis=-1))
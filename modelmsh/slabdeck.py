@@ -0,0 +1,338 @@
+"""Decks of slabs for femix, without gmsh.
+
+The geometry and support codes of ``meshstruct`` and the writers of the
+.gldat and .cmdat files of a slab. ``meshstruct`` uses them on the meshes of
+gmsh and ``sweep`` on the structured meshes, without loading gmsh.
+"""
+
+import io
+import re
+import pathlib
+import numpy as np
+from . import ofemlib
+from . import gldat
+from . import femix
+from ._common import meshio_femix, gmsh_meshio
+
+# slabs
+RECTANGULAR = 1
+TRIANGULAR = 2
+CIRCULAR = 3
+CIRCULAR_QUARTER = 4
+CIRCULAR_WITH_HOLE = 5
+CIRCULAR_SEGMENT = 6
+POLYGON = 7
+
+# beams
+LINEAR2D = 101
+CURVED2D = 102
+SPATIAL3D = 103
+
+# supports
+FREE = -1
+HINGED = 0 # 1110
+FIXED = 1 # 1111
+HORIZONTAL = 1100
+VERTICAL = 1010
+ROTATION = 1001
+HOR_ROT = 1101
+VER_ROT = 1011
+
+
+def boundary_fixities(boundaries: list, conditions: list) -> tuple:
+    """Combines the support conditions of the boundaries into one support code per node
+
+    Args:
+        boundaries (list): the nodes on each boundary
+        conditions (list): the support condition of each boundary (FREE, HINGED or FIXED)
+
+    Raises:
+        ValueError: invalid boundary condition
+
+    Returns:
+        tuple: the supported nodes and their support codes (the most restrictive where boundaries meet)
+    """
+    nodes = []
+    codes = []
+    for bounds, b in zip(boundaries, conditions):
+        if b == FREE:
+            continue
+        elif b not in [FIXED, HINGED]:
+            raise ValueError("Invalid boundary conditions.")
+        nodes.append(np.asarray(bounds, dtype=np.int64))
+        codes.append(np.full(len(bounds), b, dtype=np.int64))
+    if len(nodes) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    nodes = np.concatenate(nodes)
+    codes = np.concatenate(codes)
+    order = np.lexsort((-codes, nodes))
+    nodes = nodes[order]
+    codes = codes[order]
+    first = np.unique(nodes, return_index=True)[1]
+    return nodes[first], codes[first]
+
+
+def slab_fixities(codes: np.ndarray) -> np.ndarray:
+    """Returns the fixity codes (w, rx, ry) of slab support codes
+
+    Args:
+        codes (np.ndarray): the support codes (FIXED or HINGED)
+
+    Returns:
+        np.ndarray: (nfix, 3) codes, 1 for fixed and 0 for free
+    """
+    rotation = np.where(np.asarray(codes) == FIXED, 1, 0)
+    return np.column_stack([np.ones_like(rotation), rotation, rotation])
+
+
+def _format_block(fmt: str, *columns) -> str:
+    # formats all the rows of a table at once, fmt is the format of one row
+    table = np.column_stack(columns)
+    return (fmt * table.shape[0]) % tuple(table.ravel().tolist())
+
+
+def write_slab_gldat(mesh_file: str, coords: np.ndarray, elements: dict, fixno: tuple,
+                     material: dict, thick: float, loads, title: str = "Slab mesh") -> np.ndarray:
+    """Writes the femix .gldat file of a slab (thick plate elements)
+
+    Args:
+        mesh_file (str): the name of the file to be written
+        coords (np.ndarray): (npoin, 3) coordinates, row i is point i+1 of the deck
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of coords)}, in
+            gmsh node order; the nodes are written in femix order
+        fixno (tuple): the supported rows of coords and their support codes (FIXED or HINGED)
+        material (dict): material properties 'E', 'nu', 'rho' and 'alpha'
+        thick (float): the thickness of the slab
+        loads (float | list): the uniform face load of each load case
+        title (str, optional): the title of the problem. Defaults to "Slab mesh".
+
+    Returns:
+        np.ndarray: the tags of the elements in the order of the deck
+    """
+    loads = np.atleast_1d(np.asarray(loads, dtype=float))
+    ncase = len(loads)
+    types = sorted(elements)
+    nelems = sum(len(elements[t][1]) for t in types)
+    npoints = coords.shape[0]
+    fixrows, fixcodes = fixno
+
+    with open(mesh_file, 'w') as file:
+
+        file.write("### Main title of the problem\n")
+        file.write(title + "\n")
+
+        file.write("\n")
+        file.write("### Main parameters\n")
+        file.write("%5d # nelem (n. of elements in the mesh)\n" % nelems)
+        file.write("%5d # npoin (n. of points in the mesh)\n" % npoints)
+        file.write("%5d # nvfix (n. of points with fixed degrees of freedom)\n" % len(fixrows))
+        file.write("%5d # ncase (n. of load cases)\n" % ncase)
+        file.write("%5d # nselp (n. of sets of element parameters)\n" % len(types))
+        file.write("%5d # nmats (n. of sets of material properties)\n" % 1)
+        file.write("%5d # nspen (n. of sets of element nodal properties)\n" % len(types))
+        file.write("%5d # nmdim (n. of geometric dimensions)\n" % 2)
+        file.write("%5d # nnscs (n. of nodes with specified coordinate systems)\n" % 0)
+        file.write("%5d # nsscs (n. of sets of specified coordinate systems)\n" % 0)
+        file.write("%5d # nncod (n. of nodes with constrained d.o.f.)\n" % 0)
+        file.write("%5d # nnecc (n. of nodes with eccentric connections)\n" % 0)
+
+        file.write("\n")
+        file.write("### Sets of element parameters\n")
+        for iselp, t in enumerate(types):
+            props = meshio_femix[gmsh_meshio[t]]
+            file.write("# iselp\n")
+            file.write(" %6d\n" % (iselp+1))
+            file.write("# element parameters\n")
+            file.write("%5d # ntype (n. of element type)\n" % 5)
+            file.write("%5d # nnode (n. of nodes per element)\n" % props[1])
+            file.write("%5d # ngauq (n. of Gaussian quadrature) (stiffness)\n" % props[3])
+            file.write("%5d # ngaus (n. of Gauss points in the formulation) (stiffness)\n" % props[4])
+            file.write("%5d # ngstq (n. of Gaussian quadrature) (stresses)\n" % props[5])
+            file.write("%5d # ngstr (n. of Gauss points in the formulation) (stresses)\n" % props[6])
+
+        file.write("\n")
+        file.write("### Sets of material properties\n")
+        file.write("### (Young modulus, Poisson ratio, mass/volume and thermic coeff.\n")
+        file.write("# imats         young        poiss        dense        alpha\n")
+        file.write("  %5d  %16.3f %16.3f %16.3f %16.3f\n" % (1,
+            material['E'], material['nu'], material['rho'], material['alpha']))
+
+        file.write("\n")
+        file.write("### Sets of element nodal properties\n")
+        for ispen, t in enumerate(types):
+            nnode = elements[t][1].shape[1]
+            file.write("# ispen\n")
+            file.write(" %6d\n" % (ispen+1))
+            file.write("# inode       thick\n")
+            file.write(_format_block(" %6d     %15.3f\n", np.arange(1, nnode+1), np.full(nnode, thick)))
+
+        file.write("\n")
+        file.write("### Element parameter index, material properties index, element nodal\n")
+        file.write("### properties index and list of the nodes of each element\n")
+        file.write("# ielem ielps matno ielnp       lnods ...\n")
+        first = 1
+        for iselp, t in enumerate(types):
+            conn = femix.gmsh_to_femix_nodes(t, elements[t][1])[2]
+            nelem, nnode = conn.shape
+            ielem = np.arange(first, first+nelem)
+            ones = np.ones(nelem, dtype=np.int64)
+            file.write(_format_block(" %6d %5d %5d %5d    " + " %8d"*nnode + "\n",
+                                     ielem, (iselp+1)*ones, ones, (iselp+1)*ones, conn+1))
+            first += nelem
+
+        file.write("\n")
+        file.write("### Coordinates of the points\n")
+        file.write("# ipoin            coord-x            coord-y            coord-z\n")
+        file.write(_format_block(" %6d    %16.8lf   %16.8lf\n",
+                                 np.arange(1, npoints+1), coords[:, 0], coords[:, 1]))
+
+        file.write("\n")
+        file.write("### Points with fixed degrees of freedom and fixity codes (1-fixed0-free)\n")
+        file.write("# ivfix  nofix       ifpre ...\n")
+        if len(fixrows) > 0:
+            rotation = np.where(fixcodes == FIXED, 1, 0)
+            file.write(_format_block(" %6d %6d       %d  %d  %d\n", np.arange(1, len(fixrows)+1),
+                                     np.asarray(fixrows)+1, np.ones(len(fixrows), dtype=np.int64), rotation, rotation))
+
+        file.write("\n")
+        file.write("# ===================================================================\n")
+        file.write("\n")
+        _write_slab_loads(file, elements, loads)
+
+    return np.concatenate([elements[t][0] for t in types])
+
+
+def _write_slab_loads(file, elements: dict, loads):
+    # the load cases of a slab deck, from the first "### Load case" header to the end of the file
+    loads = np.atleast_1d(np.asarray(loads, dtype=float))
+    types = sorted(elements)
+    nelems = sum(len(elements[t][1]) for t in types)
+
+    # the face loads of a load case only differ in the load value
+    faces = []
+    first = 1
+    for t in types:
+        conn = femix.gmsh_to_femix_nodes(t, elements[t][1])[2]
+        nelem, nnode = conn.shape
+        ielem = np.arange(first, first+nelem)
+        values = np.zeros((nelem, nnode, 4))
+        values[:, :, 0] = conn + 1
+        faces.append((nnode, ielem, values))
+        first += nelem
+
+    for icase, load in enumerate(loads):
+        if icase > 0:
+            file.write("\n")
+            file.write("# ===================================================================\n")
+            file.write("\n")
+
+        file.write("### Load case n. %8d\n" % (icase+1))
+
+        file.write("\n")
+        file.write("### Title of the load case\n")
+        file.write("Uniform distributed load\n")
+
+        file.write("\n")
+        file.write("### Load parameters\n")
+        file.write("%5d # nplod (n. of point loads in nodal points)\n" % 0)
+        file.write("%5d # ngrav (gravity load flag: 1-yes0-no)\n" % 0)
+        file.write("%5d # nedge (n. of edge loads) (F.E.M. only)\n" % 0)
+        file.write("%5d # nface (n. of face loads) (F.E.M. only)\n" % nelems)
+        file.write("%5d # ntemp (n. of points with temperature variation) (F.E.M. only)\n" % 0)
+        file.write("%5d # nudis (n. of uniformly distributed loads " % 0)
+        file.write("(3d frames and trusses only)\n")
+        file.write("%5d # nepoi (n. of element point loads) (3d frames and trusses only)\n" % 0)
+        file.write("%5d # nprva (n. of prescribed and non zero degrees of freedom)\n" % 0)
+
+        file.write("\n")
+        file.write("### Face load (loaded element, loaded points and load value)\n")
+        file.write("### (local coordinate system)\n")
+        file.write("# iface  loelf\n")
+        file.write("# lopof       prfac-n   prfac-mb   prfac-mt\n")
+        for nnode, ielem, values in faces:
+            values[:, :, 1] = load
+            file.write(_format_block(" %5d %5d\n" + " %5d %16.3f %16.3f %16.3f\n"*nnode,
+                                     ielem, ielem, values.reshape(len(ielem), -1)))
+
+    file.write("\n")
+    file.write("END_OF_FILE\n")
+    return
+
+
+def update_slab_loads(mesh_file: str, elements: dict, loads) -> list:
+    """Replaces the load cases of a slab deck written by ``write_slab_gldat``
+
+    Only the load cases (and the number of load cases, if it changed) are
+    rewritten; the element and coordinate blocks are left untouched. After a
+    solver run the deck and the .cmdat file are only in the .ofem archive;
+    they are extracted again and the stale index of the deck is dropped.
+
+    Args:
+        mesh_file (str): the .gldat file
+        elements (dict): the elements given to ``write_slab_gldat``
+        loads (float | list): the uniform face load of each load case
+
+    Returns:
+        list: the sections that were rewritten, as returned by ``gldat.patch_gldat``
+    """
+    loads = np.atleast_1d(np.asarray(loads, dtype=float))
+    text = io.StringIO()
+    _write_slab_loads(text, elements, loads)
+
+    if not pathlib.Path(mesh_file).exists():
+        job = str(pathlib.Path(mesh_file).with_suffix(''))
+        pathlib.Path(mesh_file + '.idx').unlink(missing_ok=True)
+        mesh_file = ofemlib.extract_ofem_deck(job)
+        try:
+            ofemlib.extract_ofem_deck(job, '.cmdat')
+        except KeyError:
+            pass
+
+    index = gldat.load_index(mesh_file)
+    section = [s for s in index if s['name'] == 'parameters'][0]
+    params = re.sub(r"^\s*\d+ # ncase", "%5d # ncase" % len(loads),
+                    gldat.read_section(mesh_file, section), flags=re.MULTILINE)
+    return gldat.patch_gldat(mesh_file, {('parameters', 0): params}, loads=text.getvalue())
+
+
+def write_slab_cmdat(mesh_file: str, ncase: int, title: str = "Slab mesh"):
+    """Writes the femix .cmdat combinations file of a slab
+
+    With one load case the combinations are G and 1.35G, otherwise there is
+    one combination per load case.
+
+    Args:
+        mesh_file (str): the name of the file to be written
+        ncase (int): the number of load cases
+        title (str, optional): the title of the problem. Defaults to "Slab mesh".
+    """
+    if ncase == 1:
+        combos = [("G", 1.0), ("1.35G", 1.35)]
+    else:
+        combos = [("Load case n. %d" % (i+1), 1.0) for i in range(ncase)]
+
+    with open(mesh_file, 'w') as file:
+
+        file.write("### Main title of the problem\n")
+        file.write(title + "\n")
+
+        file.write("### Number of combinations\n")
+        file.write("%7d # ncomb (number of combinations)\n\n" % len(combos))
+
+        for icomb, (name, coef) in enumerate(combos):
+            icase = 1 if ncase == 1 else icomb+1
+            file.write("### Combination title\n")
+            file.write(name + "\n")
+            file.write("### Combination number\n")
+            file.write("# combination n. (icomb) and number off load cases in combination (ncase)\n")
+            file.write("# icomb    lcase\n")
+            file.write("%7d        1\n" % (icomb+1))
+            file.write("### Coeficients\n")
+            file.write("# load case number (icase) and load coefficient (vcoef)\n")
+            file.write("# icase      vcoef\n")
+            file.write("%7d       %4.2f\n" % (icase, coef))
+            file.write("\n")
+
+        file.write("END_OF_FILE\n")
+    return
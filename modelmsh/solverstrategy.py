@@ -0,0 +1,285 @@
+"""Choice between direct and iterative solvers.
+
+Before solving, the size of the factor of the stiffness matrix is estimated
+from its sparsity pattern (or from the mesh connectivity, for the decks of
+the native solver): the matrix is reordered with reverse Cuthill-McKee and
+the envelope below the diagonal bounds the entries of the factor. Small
+models and models whose factor fits the calibrated limits are solved
+directly; the others with a preconditioned iterative solver, falling back to
+the direct solver if it does not converge. Every choice is logged with its
+reason (``logging`` logger ``modelmsh.solverstrategy``). femix only reports
+errors of its iterative solver, not a solution above the tolerance, so its
+decks fall back to the direct solver on an error code only.
+
+The thresholds come from ``solver_calibration.json``, written by
+``python -m benchmarks.calibrate`` on a reference machine.
+
+Example::
+
+    U, report = solverstrategy.solve(K, F, fixed)
+    report['method'], report['reason']
+
+    ofemlib.ofemSolver(jobname, soalg='a')      # the same choice for femix
+"""
+
+import inspect
+import json
+import logging
+import os
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse import linalg as splinalg
+from . import femsolver
+
+
+logger = logging.getLogger(__name__)
+
+calibration_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver_calibration.json')
+
+# used when the calibration file is missing, the thresholds of the bundled file
+default_calibration = {
+    'direct_min_dofs': 20000,
+    # None: the iterative solver never won a calibration run, only the memory limit selects it
+    'crossover_width': None,
+    'direct_max_mib': 4096.0,
+    'memory_fraction': 0.25,
+    'tolerance': 1.0e-8,
+    'native_tolerance': 1.0e-6,
+    'maxiter': 5000,
+    'ilu_drop_tol': 1.0e-4,
+    'ilu_fill_factor': 10.0,
+}
+
+# degrees of freedom per point of the femix element families
+femix_ndof = {"area": 3, "solid": 3, "line": 6}
+
+_calibration = None
+
+# the relative tolerance of the Krylov solvers is 'rtol' from SciPy 1.12, 'tol' before
+_rtol = 'rtol' if 'rtol' in inspect.signature(splinalg.cg).parameters else 'tol'
+
+
+def load_calibration(filename: str = None) -> dict:
+    """Returns the calibration thresholds
+
+    Args:
+        filename (str, optional): a calibration JSON file. Defaults to the bundled file.
+
+    Returns:
+        dict: the thresholds, missing keys take the defaults
+    """
+    global _calibration
+    if filename is None and _calibration is not None:
+        return _calibration
+    calibration = dict(default_calibration)
+    path = calibration_file if filename is None else filename
+    if os.path.exists(path):
+        with open(path) as f:
+            calibration.update(json.load(f).get('thresholds', {}))
+    if filename is None:
+        _calibration = calibration
+    return calibration
+
+
+def _memory_mib() -> float:
+    # physical memory, None where it is not known
+    try:
+        return os.sysconf('SC_PAGE_SIZE')*os.sysconf('SC_PHYS_PAGES')/2**20
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _envelope(graph: sparse.spmatrix) -> tuple:
+    # half bandwidth and envelope (entries below the diagonal) after RCM
+    graph = sparse.csr_matrix(graph)
+    perm = csgraph.reverse_cuthill_mckee(graph, symmetric_mode=True)
+    inverse = np.empty_like(perm)
+    inverse[perm] = np.arange(len(perm))
+    coo = graph.tocoo()
+    rows, cols = inverse[coo.row], inverse[coo.col]
+    first = np.arange(graph.shape[0])
+    np.minimum.at(first, rows, cols)
+    width = np.arange(graph.shape[0]) - first
+    return int(width.max(initial=0)), int(width.sum())
+
+
+def estimate(K: sparse.spmatrix, fixed: np.ndarray = None) -> dict:
+    """Estimates the cost of solving a system
+
+    Args:
+        K (sparse.spmatrix): the stiffness matrix
+        fixed (np.ndarray, optional): the mask of the fixed degrees of freedom. Defaults to None.
+
+    Returns:
+        dict: 'ndofs', 'nnz', 'bandwidth', 'entries' (envelope bound of the factor), 'width'
+            (entries per dof, which grows much faster for solids and 3D frames than for
+            plates) and 'mib' (memory of the factor)
+    """
+    K = sparse.csr_matrix(K)
+    if fixed is not None:
+        free = np.flatnonzero(~np.asarray(fixed, dtype=bool))
+        K = K[free][:, free]
+    bandwidth, envelope = _envelope(K)
+    entries = float(envelope + K.shape[0])
+    return {'ndofs': K.shape[0], 'nnz': int(K.nnz), 'bandwidth': bandwidth, 'entries': entries,
+            'width': entries/max(K.shape[0], 1), 'mib': 2.0*entries*8.0/2**20}
+
+
+def estimate_mesh(npoin: int, elements: dict, ndof: int) -> dict:
+    """Estimates the cost of solving a model from its connectivity
+
+    Args:
+        npoin (int): the number of points
+        elements (dict): {gmsh type: (element tags, connectivity as row indices of the points)}
+        ndof (int): the number of degrees of freedom per point
+
+    Returns:
+        dict: as ``estimate``, the supports are ignored
+    """
+    rows, cols = [], []
+    for _, conn in elements.values():
+        conn = np.asarray(conn, dtype=np.int64)
+        n = conn.shape[1]
+        rows.append(np.repeat(conn, n, axis=1).ravel())
+        cols.append(np.tile(conn, (1, n)).ravel())
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    graph = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(npoin, npoin)).tocsr()
+    bandwidth, envelope = _envelope(graph)
+    # each point is a dense ndof x ndof block
+    entries = float(ndof*ndof*envelope + npoin*ndof*(ndof+1)/2)
+    return {'ndofs': npoin*ndof, 'nnz': int(graph.nnz)*ndof*ndof, 'bandwidth': (bandwidth+1)*ndof-1,
+            'entries': entries, 'width': entries/max(npoin*ndof, 1), 'mib': 2.0*entries*8.0/2**20}
+
+
+def choose(stats: dict, calibration: dict = None) -> dict:
+    """Chooses the solver for a system
+
+    Args:
+        stats (dict): the estimate of ``estimate`` or ``estimate_mesh``
+        calibration (dict, optional): the thresholds. Defaults to ``load_calibration()``.
+
+    Returns:
+        dict: 'method' ('direct' or 'iterative'), 'tolerance' and 'reason'
+    """
+    c = load_calibration() if calibration is None else calibration
+    limit = c['direct_max_mib']
+    memory = _memory_mib()
+    if memory is not None:
+        limit = min(limit, c['memory_fraction']*memory)
+
+    if stats['ndofs'] < c['direct_min_dofs']:
+        method, reason = 'direct', "%d dofs < %d" % (stats['ndofs'], c['direct_min_dofs'])
+    elif stats['mib'] > limit:
+        method, reason = 'iterative', "factor of about %.0f MiB > %.0f MiB" % (stats['mib'], limit)
+    elif c['crossover_width'] is not None and stats['width'] > c['crossover_width']:
+        method, reason = 'iterative', "factor width of about %.0f entries per dof > crossover %.0f" % (
+            stats['width'], c['crossover_width'])
+    else:
+        method, reason = 'direct', "factor width of about %.0f entries per dof (%.0f MiB) %s" % (
+            stats['width'], stats['mib'],
+            "below the crossover" if c['crossover_width'] is not None else "within the memory limit")
+    reason = "%d dofs, bandwidth %d: %s" % (stats['ndofs'], stats['bandwidth'], reason)
+    logger.info("%s solver: %s", method, reason)
+    return {'method': method, 'tolerance': c['tolerance'], 'reason': reason}
+
+
+def _preconditioner(A: sparse.spmatrix, calibration: dict):
+    # incomplete LU, or the diagonal if the incomplete factorization breaks down
+    try:
+        ilu = splinalg.spilu(A.tocsc(), drop_tol=calibration['ilu_drop_tol'],
+                             fill_factor=calibration['ilu_fill_factor'])
+    except RuntimeError as e:
+        logger.warning("incomplete LU failed (%s), using a diagonal preconditioner", e)
+        return splinalg.LinearOperator(A.shape, matvec=lambda x: x / A.diagonal(), dtype=float), splinalg.cg
+    return splinalg.LinearOperator(A.shape, matvec=ilu.solve, dtype=float), splinalg.bicgstab
+
+
+def solve_iterative(A: sparse.spmatrix, B: np.ndarray, tol: float, calibration: dict = None) -> tuple:
+    """Solves A X = B with a preconditioned Krylov solver
+
+    Args:
+        A (sparse.spmatrix): the matrix (free degrees of freedom only)
+        B (np.ndarray): the right hand sides (n,) or (n, nrhs)
+        tol (float): the relative residual
+        calibration (dict, optional): the thresholds. Defaults to ``load_calibration()``.
+
+    Returns:
+        tuple: X, with the shape of B, and True if all the columns converged
+    """
+    c = load_calibration() if calibration is None else calibration
+    A = sparse.csr_matrix(A)
+    M, krylov = _preconditioner(A, c)
+    B2 = B.reshape(B.shape[0], -1)
+    X = np.zeros(B2.shape)
+    converged = True
+    for j in range(B2.shape[1]):
+        X[:, j], info = krylov(A, B2[:, j], maxiter=c['maxiter'], M=M, **{_rtol: tol})
+        converged = converged and info == 0
+    return X.reshape(B.shape), converged
+
+
+def solve(K: sparse.spmatrix, F: np.ndarray, fixed: np.ndarray, method: str = 'auto',
+          tol: float = None, calibration: dict = None) -> tuple:
+    """Solves K U = F with the direct or the iterative solver
+
+    Args:
+        K (sparse.spmatrix): the stiffness matrix
+        F (np.ndarray): the loads (ndofs,) or (ndofs, ncase)
+        fixed (np.ndarray): the mask of the fixed degrees of freedom
+        method (str, optional): 'auto', 'direct' or 'iterative'. Defaults to 'auto'.
+        tol (float, optional): the relative residual of the iterative solver. Defaults to the calibration.
+        calibration (dict, optional): the thresholds. Defaults to ``load_calibration()``.
+
+    Returns:
+        tuple: the displacements, with the shape of F, and a report dict with 'method', 'reason'
+            and, for iterative solves, 'converged'
+    """
+    c = load_calibration() if calibration is None else calibration
+    free = np.flatnonzero(~np.asarray(fixed, dtype=bool) & (K.diagonal() != 0.0))
+    Kff = sparse.csr_matrix(K)[free][:, free]
+    if method == 'auto':
+        report = choose(estimate(Kff), c)
+    else:
+        report = {'method': method, 'tolerance': c['tolerance'], 'reason': "requested"}
+    if tol is not None:
+        report['tolerance'] = tol
+
+    U = np.zeros(F.shape)
+    if len(free) == 0:
+        return U, report
+    if report['method'] == 'iterative':
+        X, converged = solve_iterative(Kff, F[free], report['tolerance'], c)
+        report['converged'] = converged
+        if converged:
+            U[free] = X
+            return U, report
+        logger.warning("iterative solver did not converge (tolerance %g), solving directly", report['tolerance'])
+        report['method'] = 'direct'
+        report['reason'] += "; iterative solver did not converge"
+    U[free] = femsolver.factorize(Kff)(np.ascontiguousarray(F[free]))
+    return U, report
+
+
+def native_options(filename: str, calibration: dict = None) -> dict:
+    """Chooses the femix solver options of a deck
+
+    Args:
+        filename (str): the .gldat deck
+        calibration (dict, optional): the thresholds. Defaults to ``load_calibration()``.
+
+    Returns:
+        dict: 'soalg' ('d' or 'i'), 'randsn' and 'reason', for ``ofemlib.ofemSolver``
+    """
+    from . import gldat
+    from .femix import femix_families
+
+    c = load_calibration() if calibration is None else calibration
+    deck = gldat.read_gldat(filename, sections=['coordinates', 'element parameters', 'elements'])
+    mesh = gldat.to_mesh(deck)
+    ndof = max([femix_ndof.get(femix_families.get(p.get('ntype')), 3)
+                for p in deck.get('element parameters', [])] or [3])
+    report = choose(estimate_mesh(len(mesh['nodes']), mesh['elements'], ndof), c)
+    soalg = 'i' if report['method'] == 'iterative' else 'd'
+    return {'soalg': soalg, 'randsn': c['native_tolerance'], 'reason': report['reason']}
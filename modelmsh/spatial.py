@@ -0,0 +1,288 @@
+"""Spatial queries on meshes: nearest node, nodes in a box or sphere and
+point location in elements.
+
+Nodes are indexed with a KD-tree, elements with trees over the centres of
+their bounding boxes, one tree per size class (half-diagonals within a factor
+of two), so that the search radius of a query follows the size of the
+elements near it on graded meshes. Candidates found in the trees are refined
+with an exact test on the corner nodes of each element (split into
+simplices).
+"""
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from scipy.spatial import cKDTree
+
+
+# corner nodes of each gmsh element type split into simplices (local indices)
+gmsh_simplices = {
+    1: [[0, 1]],
+    8: [[0, 1]],
+    2: [[0, 1, 2]],
+    9: [[0, 1, 2]],
+    18: [[0, 1, 2]],
+    3: [[0, 1, 2], [0, 2, 3]],
+    10: [[0, 1, 2], [0, 2, 3]],
+    16: [[0, 1, 2], [0, 2, 3]],
+    4: [[0, 1, 2, 3]],
+    11: [[0, 1, 2, 3]],
+    5: [[0, 1, 3, 4], [1, 2, 3, 6], [1, 4, 5, 6], [3, 4, 6, 7], [1, 3, 4, 6]],
+    12: [[0, 1, 3, 4], [1, 2, 3, 6], [1, 4, 5, 6], [3, 4, 6, 7], [1, 3, 4, 6]],
+    17: [[0, 1, 3, 4], [1, 2, 3, 6], [1, 4, 5, 6], [3, 4, 6, 7], [1, 3, 4, 6]],
+    6: [[0, 1, 2, 3], [1, 2, 3, 4], [2, 3, 4, 5]],
+    13: [[0, 1, 2, 3], [1, 2, 3, 4], [2, 3, 4, 5]],
+    7: [[0, 1, 2, 4], [0, 2, 3, 4]],
+    14: [[0, 1, 2, 4], [0, 2, 3, 4]],
+}
+
+
+def _in_segments(p, a, b, tol):
+    ab = b - a
+    lab = np.einsum('ij,ij->i', ab, ab)
+    t = np.einsum('ij,ij->i', p - a, ab) / np.where(lab > 0, lab, 1.0)
+    d = p - (a + np.clip(t, 0.0, 1.0)[:, None] * ab)
+    return np.einsum('ij,ij->i', d, d) <= tol*tol
+
+
+def _in_triangles(p, a, b, c, tol):
+    v0 = b - a
+    v1 = c - a
+    v2 = p - a
+    d00 = np.einsum('ij,ij->i', v0, v0)
+    d01 = np.einsum('ij,ij->i', v0, v1)
+    d11 = np.einsum('ij,ij->i', v1, v1)
+    d20 = np.einsum('ij,ij->i', v2, v0)
+    d21 = np.einsum('ij,ij->i', v2, v1)
+    den = d00*d11 - d01*d01
+    den = np.where(den != 0, den, np.finfo(float).tiny)
+    v = (d11*d20 - d01*d21) / den
+    w = (d00*d21 - d01*d20) / den
+    u = 1.0 - v - w
+    # distance to the plane of the triangle
+    n = np.cross(v0, v1)
+    ln = np.sqrt(np.einsum('ij,ij->i', n, n))
+    dist = np.abs(np.einsum('ij,ij->i', v2, n)) / np.where(ln > 0, ln, 1.0)
+    eps = tol / np.sqrt(np.maximum(d00, d11))
+    return (u >= -eps) & (v >= -eps) & (w >= -eps) & (dist <= tol)
+
+
+def _in_tetrahedra(p, a, b, c, d, tol):
+    m = np.stack([b - a, c - a, d - a], axis=2)
+    det = np.linalg.det(m)
+    ok = np.abs(det) > 0
+    lam = np.zeros((len(p), 3))
+    lam[ok] = np.linalg.solve(m[ok], (p - a)[ok][:, :, None])[:, :, 0]
+    size = np.abs(det) ** (1.0/3.0)
+    eps = tol / np.where(size > 0, size, 1.0)
+    return ok & np.all(lam >= -eps[:, None], axis=1) & (lam.sum(axis=1) <= 1.0 + eps)
+
+
+class SpatialIndex:
+    """Spatial index over the nodes and elements of a mesh.
+
+    Args:
+        coords (ArrayLike): (npoin, 3) array with the coordinates of the nodes
+        nodetags (ArrayLike, optional): tags of the nodes. Defaults to 0..npoin-1.
+        elements (dict, optional): element blocks as {gmsh type: (element tags, connectivity)},
+            with the connectivity given as row indices into ``coords``. Defaults to None.
+        tol (float, optional): geometric tolerance of the queries. Defaults to 1.0e-8
+            times the size of the model.
+    """
+
+    def __init__(self, coords: ArrayLike, nodetags: ArrayLike = None, elements: dict = None, tol: float = None):
+        self._coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        npoin = self._coords.shape[0]
+        self._nodetags = np.arange(npoin) if nodetags is None else np.asarray(nodetags)
+        self._elements = {} if elements is None else {
+            int(t): (np.asarray(e), np.asarray(c, dtype=np.int64).reshape(len(e), -1)) for t, (e, c) in elements.items()}
+        if tol is None:
+            size = np.ptp(self._coords, axis=0).max() if npoin > 0 else 1.0
+            tol = 1.0e-8 * (size if size > 0 else 1.0)
+        self.tol = tol
+        self._nodetree = None
+        self._elemtree = None
+
+    @property
+    def coords(self) -> NDArray:
+        return self._coords
+
+    @property
+    def nodetags(self) -> NDArray:
+        return self._nodetags
+
+    def _build_nodes(self):
+        if self._nodetree is None:
+            self._nodetree = cKDTree(self._coords)
+        return self._nodetree
+
+    def _build_elements(self):
+        if self._elemtree is not None:
+            return self._elemtree
+        types, tags, lows, highs = [], [], [], []
+        for t, (e, c) in self._elements.items():
+            if t not in gmsh_simplices or len(e) == 0:
+                continue
+            x = self._coords[c]
+            types.append(np.full(len(e), t))
+            tags.append(e)
+            lows.append(x.min(axis=1))
+            highs.append(x.max(axis=1))
+        if len(tags) == 0:
+            self._elemtree = ([], np.empty(0, int), np.empty(0, int), np.empty((0, 3)), np.empty((0, 3)), np.empty(0, int))
+            return self._elemtree
+        types = np.concatenate(types)
+        tags = np.concatenate(tags)
+        lows = np.concatenate(lows)
+        highs = np.concatenate(highs)
+        # position of each element inside its block
+        rows = np.concatenate([np.arange(len(self._elements[t][0])) for t in self._elements
+                               if t in gmsh_simplices and len(self._elements[t][0]) > 0])
+        centres = 0.5 * (lows + highs)
+        radius = 0.5 * np.sqrt(((highs - lows)**2).sum(axis=1))
+        # size classes: half-diagonals in [r0 2^k, r0 2^(k+1))
+        positive = radius[radius > 0]
+        sizes = np.zeros(len(radius), dtype=np.int64)
+        if len(positive) > 0:
+            sizes[radius > 0] = np.floor(np.log2(positive / positive.min())).astype(np.int64)
+        trees = []
+        for k in np.unique(sizes):
+            index = np.flatnonzero(sizes == k)
+            trees.append((cKDTree(centres[index]), index, radius[index].max()))
+        self._elemtree = (trees, types, tags, lows, highs, rows)
+        return self._elemtree
+
+    def invalidate(self):
+        """Drops the trees; they are rebuilt on the next query."""
+        self._nodetree = None
+        self._elemtree = None
+        return
+
+    def update_coords(self, coords: ArrayLike):
+        """Replaces the coordinates of the nodes and invalidates the index.
+
+        Args:
+            coords (ArrayLike): (npoin, 3) array with the new coordinates
+        """
+        coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        if coords.shape != self._coords.shape:
+            raise ValueError("The number of nodes can not change.")
+        self._coords = coords
+        self.invalidate()
+        return
+
+    def nearest_node(self, points: ArrayLike, k: int = 1):
+        """Finds the nodes nearest to one or more points
+
+        Args:
+            points (ArrayLike): a point (3,) or an array of points (n, 3)
+            k (int, optional): number of nearest nodes to return. Defaults to 1.
+
+        Returns:
+            tuple: the tags of the nearest nodes and their distances
+        """
+        tree = self._build_nodes()
+        points = np.asarray(points, dtype=float)
+        dist, index = tree.query(points, k=k)
+        return self._nodetags[index], dist
+
+    def nodes_in_sphere(self, centres: ArrayLike, radius: float):
+        """Finds the nodes inside one or more spheres
+
+        Args:
+            centres (ArrayLike): a centre (3,) or an array of centres (n, 3)
+            radius (float): the radius of the spheres
+
+        Returns:
+            NDArray | list: the tags of the nodes inside the sphere, or a list of arrays for several centres
+        """
+        tree = self._build_nodes()
+        centres = np.asarray(centres, dtype=float)
+        found = tree.query_ball_point(centres, radius + self.tol)
+        if centres.ndim == 1:
+            return self._nodetags[np.sort(np.asarray(found, dtype=np.int64))]
+        return [self._nodetags[np.sort(np.asarray(f, dtype=np.int64))] for f in found]
+
+    def nodes_in_box(self, lower: ArrayLike, upper: ArrayLike) -> NDArray:
+        """Finds the nodes inside an axis aligned box
+
+        Args:
+            lower (ArrayLike): the lower corner of the box
+            upper (ArrayLike): the upper corner of the box
+
+        Returns:
+            NDArray: the tags of the nodes inside the box
+        """
+        tree = self._build_nodes()
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+        centre = 0.5 * (lower + upper)
+        half = 0.5 * (upper - lower)
+        index = np.asarray(tree.query_ball_point(centre, half.max() + self.tol, p=np.inf), dtype=np.int64)
+        x = self._coords[index]
+        inside = np.all((x >= lower - self.tol) & (x <= upper + self.tol), axis=1)
+        return self._nodetags[np.sort(index[inside])]
+
+    def _candidates(self, points: NDArray):
+        trees, types, tags, lows, highs, rows = self._build_elements()
+        if len(trees) == 0:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        ipoint, ielem = [], []
+        for tree, index, radius in trees:
+            found = tree.query_ball_point(points, radius + self.tol)
+            counts = np.fromiter((len(f) for f in found), dtype=np.int64, count=len(found))
+            ipoint.append(np.repeat(np.arange(len(points)), counts))
+            ielem.append(index[np.fromiter((i for f in found for i in f), dtype=np.int64, count=counts.sum())])
+        ipoint = np.concatenate(ipoint)
+        ielem = np.concatenate(ielem)
+        p = points[ipoint]
+        inbox = np.all((p >= lows[ielem] - self.tol) & (p <= highs[ielem] + self.tol), axis=1)
+        return ipoint[inbox], ielem[inbox]
+
+    def _refine(self, points: NDArray, ipoint: NDArray, ielem: NDArray):
+        _, types, tags, _, _, rows = self._build_elements()
+        inside = np.zeros(len(ipoint), dtype=bool)
+        for t in np.unique(types[ielem]):
+            sel = np.nonzero(types[ielem] == t)[0]
+            conn = self._elements[t][1][rows[ielem[sel]]]
+            p = points[ipoint[sel]]
+            hit = np.zeros(len(sel), dtype=bool)
+            for simplex in gmsh_simplices[t]:
+                x = [self._coords[conn[:, i]] for i in simplex]
+                if len(simplex) == 2:
+                    hit |= _in_segments(p, x[0], x[1], self.tol)
+                elif len(simplex) == 3:
+                    hit |= _in_triangles(p, x[0], x[1], x[2], self.tol)
+                else:
+                    hit |= _in_tetrahedra(p, x[0], x[1], x[2], x[3], self.tol)
+            inside[sel] = hit
+        return ipoint[inside], ielem[inside]
+
+    def elements_containing(self, point: ArrayLike) -> NDArray:
+        """Finds all the elements that contain a point
+
+        Args:
+            point (ArrayLike): the coordinates of the point
+
+        Returns:
+            NDArray: the tags of the elements containing the point
+        """
+        points = np.asarray(point, dtype=float).reshape(1, 3)
+        ipoint, ielem = self._refine(points, *self._candidates(points))
+        return np.sort(self._build_elements()[2][ielem])
+
+    def locate(self, points: ArrayLike) -> NDArray:
+        """Finds one element containing each point
+
+        Args:
+            points (ArrayLike): (n, 3) array of points
+
+        Returns:
+            NDArray: the tag of an element containing each point, -1 if the point is outside the mesh
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        ipoint, ielem = self._refine(points, *self._candidates(points))
+        found = np.full(len(points), -1, dtype=np.int64)
+        # keeps the first element found for each point
+        first = np.unique(ipoint, return_index=True)[1]
+        found[ipoint[first]] = self._build_elements()[2][ielem[first]]
+        return found
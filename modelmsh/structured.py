@@ -0,0 +1,171 @@
+"""Structured (mapped) meshes of rectangles and straight beams built with NumPy only.
+
+These are fast paths for the simple shapes of ``meshstruct``: no gmsh session,
+no geometry synchronization, just node and connectivity arrays. The meshes
+use gmsh element types and node orderings, so they can be used wherever a
+mesh read from gmsh is expected (``msh.getMeshArrays`` returns the same layout).
+
+Returned meshes are dicts with the keys:
+
+- 'nodes': node tags (1..npoin)
+- 'coords': (npoin, 3) coordinates
+- 'elements': {gmsh type: (element tags, connectivity as row indices of coords)}
+- 'boundaries': {boundary index: row indices of the nodes on that boundary}
+"""
+
+import numpy as np
+from ._common import ofem_gmsh
+
+
+def _grid_index(nx: int, ny: int):
+    return np.arange((nx+1)*(ny+1)).reshape(ny+1, nx+1)
+
+
+def rectangle_mesh(bleft: tuple, width: float, height: float, angle: float = 0.0, msize: float = 0.3,
+                   elemtype: str = "area4", nx: int = None, ny: int = None) -> dict:
+    """Structured mesh of a rectangle, rotated counterclockwise around its bottom left corner
+
+    Args:
+        bleft (tuple): the bottom left corner (x, y, z)
+        width (float): the width of the rectangle (local x)
+        height (float): the height of the rectangle (local y)
+        angle (float, optional): rotation angle in radians. Defaults to 0.0.
+        msize (float, optional): the target element size. Defaults to 0.3.
+        elemtype (str, optional): "area3", "area4", "area6", "area8" or "area9". Defaults to "area4".
+        nx (int, optional): number of divisions along the width. Defaults to width/msize rounded up.
+        ny (int, optional): number of divisions along the height. Defaults to height/msize rounded up.
+
+    Raises:
+        ValueError: invalid element type
+
+    Returns:
+        dict: the mesh; boundaries 1 to 4 are the bottom, right, top and left edges,
+            as the curves of ``meshstruct.Rectangle``
+    """
+    if elemtype not in ["area3", "area4", "area6", "area8", "area9"]:
+        raise ValueError("Invalid element type for a rectangular mesh.")
+    nx = max(1, int(np.ceil(width/msize - 1.0e-9))) if nx is None else int(nx)
+    ny = max(1, int(np.ceil(height/msize - 1.0e-9))) if ny is None else int(ny)
+
+    quadratic = elemtype in ["area6", "area8", "area9"]
+    order = 2 if quadratic else 1
+    mx, my = order*nx, order*ny
+
+    # grid of points in local coordinates
+    grid = _grid_index(mx, my)
+    u, v = np.meshgrid(np.linspace(0.0, width, mx+1), np.linspace(0.0, height, my+1))
+    c, s = np.cos(angle), np.sin(angle)
+    coords = np.empty(((mx+1)*(my+1), 3))
+    coords[:, 0] = bleft[0] + c*u.ravel() - s*v.ravel()
+    coords[:, 1] = bleft[1] + s*u.ravel() + c*v.ravel()
+    coords[:, 2] = bleft[2]
+
+    # lower left grid point of each cell
+    i0 = (order*np.arange(nx))[None, :].repeat(ny, axis=0).ravel()
+    j0 = (order*np.arange(ny))[:, None].repeat(nx, axis=1).ravel()
+
+    def at(di, dj):
+        return grid[j0 + dj, i0 + di]
+
+    if elemtype == "area4":
+        conn = np.stack([at(0, 0), at(1, 0), at(1, 1), at(0, 1)], axis=1)
+    elif elemtype == "area3":
+        t1 = np.stack([at(0, 0), at(1, 0), at(1, 1)], axis=1)
+        t2 = np.stack([at(0, 0), at(1, 1), at(0, 1)], axis=1)
+        conn = np.stack([t1, t2], axis=1).reshape(-1, 3)
+    elif elemtype == "area6":
+        t1 = np.stack([at(0, 0), at(2, 0), at(2, 2), at(1, 0), at(2, 1), at(1, 1)], axis=1)
+        t2 = np.stack([at(0, 0), at(2, 2), at(0, 2), at(1, 1), at(1, 2), at(0, 1)], axis=1)
+        conn = np.stack([t1, t2], axis=1).reshape(-1, 6)
+    else:
+        conn = np.stack([at(0, 0), at(2, 0), at(2, 2), at(0, 2),
+                         at(1, 0), at(2, 1), at(1, 2), at(0, 1), at(1, 1)], axis=1)
+
+    boundaries = {
+        1: grid[0, :],
+        2: grid[:, -1],
+        3: grid[-1, ::-1],
+        4: grid[::-1, 0],
+        }
+
+    if elemtype == "area8":
+        # drops the centre points of the cells
+        conn = conn[:, :8]
+        used = np.ones(len(coords), dtype=bool)
+        used[grid[1::2, 1::2].ravel()] = False
+        renum = np.cumsum(used) - 1
+        coords = coords[used]
+        conn = renum[conn]
+        boundaries = {k: renum[b] for k, b in boundaries.items()}
+
+    nelem = conn.shape[0]
+    return {
+        'nodes': np.arange(1, len(coords)+1),
+        'coords': coords,
+        'elements': {ofem_gmsh[elemtype]: (np.arange(1, nelem+1), conn)},
+        'boundaries': boundaries,
+        }
+
+
+def line_mesh(points: list, msize: float = 0.3, nnode: int = 2, ndiv: list = None) -> dict:
+    """Structured mesh of a polyline, each segment uniformly subdivided
+
+    Args:
+        points (list): the vertices of the polyline [(x, y, z), ...]
+        msize (float, optional): the target element size. Defaults to 0.3.
+        nnode (int, optional): number of nodes per element, 2 or 3. Defaults to 2.
+        ndiv (list, optional): number of elements in each segment. Defaults to length/msize rounded up.
+
+    Raises:
+        ValueError: invalid number of nodes per element
+
+    Returns:
+        dict: the mesh; boundary i is the node at the i-th vertex (1 based)
+    """
+    if nnode not in [2, 3]:
+        raise ValueError("Invalid number of nodes for a beam element.")
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    seg = points[1:] - points[:-1]
+    length = np.sqrt((seg**2).sum(axis=1))
+    if ndiv is None:
+        ndiv = np.maximum(1, np.ceil(length/msize - 1.0e-9).astype(np.int64))
+    ndiv = np.asarray(ndiv, dtype=np.int64)
+    order = nnode - 1
+
+    # local parameter of the points of each segment, the first vertex of each segment is shared
+    steps = order*ndiv
+    start = np.concatenate([[0], np.cumsum(steps)])
+    iseg = np.repeat(np.arange(len(seg)), steps)
+    t = (np.arange(start[-1]) - start[iseg] + 1) / steps[iseg]
+    coords = np.vstack([points[:1], points[iseg] + t[:, None]*seg[iseg]])
+
+    first = np.concatenate([start[k] + order*np.arange(ndiv[k]) for k in range(len(seg))])
+    if nnode == 2:
+        conn = np.stack([first, first + 1], axis=1)
+    else:
+        conn = np.stack([first, first + 2, first + 1], axis=1)
+
+    nelem = conn.shape[0]
+    return {
+        'nodes': np.arange(1, len(coords)+1),
+        'coords': coords,
+        'elements': {ofem_gmsh["line%d" % nnode]: (np.arange(1, nelem+1), conn)},
+        'boundaries': {k+1: start[k:k+1] for k in range(len(points))},
+        }
+
+
+def linear_beam_mesh(spans: list, msize: float = 0.3, nnode: int = 2) -> dict:
+    """Structured mesh of a continuous straight beam along x, as ``meshstruct.LinearBeam``
+
+    Args:
+        spans (list): the lengths of the spans
+        msize (float, optional): the target element size. Defaults to 0.3.
+        nnode (int, optional): number of nodes per element, 2 or 3. Defaults to 2.
+
+    Returns:
+        dict: the mesh; boundary i is the node at the i-th support (1 based)
+    """
+    x = np.concatenate([[0.0], np.cumsum(spans)])
+    points = np.zeros((len(x), 3))
+    points[:, 0] = x
+    return line_mesh(points, msize, nnode)
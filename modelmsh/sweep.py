@@ -0,0 +1,185 @@
+"""Generates families of slabs and beams in parallel.
+
+Each worker process owns its gmsh instance, so the variants of a design sweep
+are meshed (and optionally written as femix decks) concurrently instead of
+serially re-initializing the single global gmsh state.
+
+A parameter set is a dict with the geometry type and its positional
+arguments, as in ``Slab.addGeometry`` and ``Beam.addGeometry``, plus the
+optional model parameters::
+
+    {'geometry': RECTANGULAR, 'args': ((0, 0, 0), 6.0, 4.0, 0.0, 0.25),
+     'boundary': [1, 0, 1, 0], 'material': mat, 'thick': 0.20, 'load': -10.0,
+     'name': 'slab-6x4'}
+
+With ``'structured': True`` rectangular slabs (RECTANGULAR) and straight
+beams (LINEAR2D, SPATIAL3D) are meshed with the NumPy mappers of
+``structured`` instead of gmsh (``'elemtype'`` selects the slab element,
+``'nnode'`` the beam element). When every parameter set is structured the
+sweep runs in the calling process, without gmsh.
+
+With ``'solve': True`` slabs are also analysed in the worker with the
+in-process plate solver (``plate.solve_plates``), without writing decks or
+running femix; the results are returned under 'results', with the points
+numbered as the rows of 'coords'.
+"""
+
+import os
+import pathlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from . import structured
+from . import plate
+from .slabdeck import boundary_fixities, slab_fixities, write_slab_gldat, write_slab_cmdat
+from .slabdeck import RECTANGULAR, LINEAR2D, SPATIAL3D
+
+
+model_parameters = ['boundary', 'material', 'thick', 'load', 'section']
+
+
+def _init_worker():
+    # gmsh is only loaded by the workers of unstructured sweeps
+    import gmsh
+    from . import gmshsession
+
+    gmshsession.acquire()
+    gmsh.option.setNumber("General.Terminal", 0)
+    return
+
+
+def _solve_slab(result: dict, params: dict) -> dict:
+    fixno = result['fixno']
+    fixrows = np.searchsorted(result['nodes'], np.fromiter(fixno.keys(), dtype=np.int64, count=len(fixno)))
+    fixcodes = slab_fixities(np.fromiter(fixno.values(), dtype=np.int64, count=len(fixno)))
+    return plate.solve_plates(result['coords'], result['elements'], (fixrows, fixcodes),
+                              params['material'], params['thick'], params['load'])
+
+
+def _mesh_structured(kind: str, name: str, params: dict, folder: str) -> dict:
+    geometry = params['geometry']
+    args = params.get('args', ())
+    if kind == 'slab' and geometry == RECTANGULAR:
+        msize = 0.3 if len(args) < 5 else args[4]
+        mesh = structured.rectangle_mesh(args[0], args[1], args[2], args[3], msize,
+                                         params.get('elemtype', "area4"))
+    elif kind == 'beam' and geometry in [LINEAR2D, SPATIAL3D]:
+        msize = 0.3 if len(args) < 2 else args[1]
+        if geometry == LINEAR2D:
+            mesh = structured.linear_beam_mesh(args[0], msize, params.get('nnode', 2))
+        else:
+            mesh = structured.line_mesh(args[0], msize, params.get('nnode', 2))
+    else:
+        raise ValueError("Geometry type has no structured mesher.")
+
+    bounds = mesh['boundaries']
+    conditions = params.get('boundary', [])
+    rows, codes = boundary_fixities([bounds[i+1] for i in range(len(conditions))], conditions)
+    result = {
+        'name': name,
+        'nodes': mesh['nodes'],
+        'coords': mesh['coords'],
+        'elements': mesh['elements'],
+        'fixno': dict(zip(mesh['nodes'][rows].tolist(), codes.tolist())),
+        }
+
+    if folder is not None:
+        if kind != 'slab':
+            raise ValueError("Decks of structured beams are not supported.")
+        jobname = os.path.join(folder, name)
+        write_slab_gldat(jobname + ".gldat", mesh['coords'], mesh['elements'], (rows, codes),
+                         params['material'], params['thick'], params['load'])
+        write_slab_cmdat(jobname + ".cmdat", len(np.atleast_1d(params['load'])))
+        result['jobname'] = jobname
+    if kind == 'slab' and params.get('solve', False):
+        result['results'] = _solve_slab(result, params)
+    return result
+
+
+def _mesh_structure(job: tuple) -> dict:
+    kind, index, params, folder = job
+    name = params.get('name', "%s-%05d" % (kind, index))
+    if params.get('structured', False):
+        return _mesh_structured(kind, name, params, folder)
+
+    import gmsh
+    from . import msh
+    from .meshstruct import Slab, Beam
+
+    if kind == 'slab':
+        structure, dim = Slab(), 2
+    else:
+        structure, dim = Beam(), 1
+
+    try:
+        kwargs = {k: params[k] for k in model_parameters if k in params}
+        structure.addGeometry(params['geometry'], *params.get('args', ()), **kwargs)
+
+        tags, coords, elements = msh.getMeshArrays(gmsh.model, dim)
+        result = {
+            'name': name,
+            'nodes': tags,
+            'coords': coords,
+            'elements': elements,
+            'fixno': dict(getattr(structure, 'fixno', {})),
+            }
+
+        if folder is not None:
+            result['jobname'] = structure.write_ofem(os.path.join(folder, name + ".gldat"))
+        if kind == 'slab' and params.get('solve', False):
+            result['results'] = _solve_slab(result, params)
+    finally:
+        # the worker keeps its gmsh session for the next structure
+        structure.close()
+    return result
+
+
+def _generate(kind: str, params: list, workers: int, folder: str, chunksize: int) -> list:
+    if folder is not None:
+        pathlib.Path(folder).mkdir(parents=True, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(params)))
+
+    jobs = [(kind, i, p, folder) for i, p in enumerate(params)]
+    if len(jobs) == 0:
+        return []
+
+    if all(p.get('structured', False) for p in params):
+        return [_mesh_structure(job) for job in jobs]
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        return list(pool.map(_mesh_structure, jobs, chunksize=chunksize))
+
+
+def generate_slabs(params: list, workers: int = None, folder: str = None, chunksize: int = 1) -> list:
+    """Meshes a family of slabs in parallel worker processes
+
+    Args:
+        params (list): list of parameter sets (dicts), one per slab
+        workers (int, optional): number of worker processes. Defaults to the number of cores.
+        folder (str, optional): if given, writes the .gldat/.cmdat deck of each slab in this folder. Defaults to None.
+        chunksize (int, optional): number of slabs sent to a worker at once. Defaults to 1.
+
+    Returns:
+        list: one dict per slab, in the order of params, with the keys 'name', 'nodes' (gmsh tags),
+            'coords' (npoin, 3), 'elements' ({gmsh type: (tags, connectivity rows)}), 'fixno',
+            if written, 'jobname' and, if solved, 'results'
+    """
+    return _generate('slab', params, workers, folder, chunksize)
+
+
+def generate_beams(params: list, workers: int = None, folder: str = None, chunksize: int = 1) -> list:
+    """Meshes a family of beams in parallel worker processes
+
+    Args:
+        params (list): list of parameter sets (dicts), one per beam. Writing decks needs 'section'.
+        workers (int, optional): number of worker processes. Defaults to the number of cores.
+        folder (str, optional): if given, writes the .gldat/.cmdat deck of each beam in this folder. Defaults to None.
+        chunksize (int, optional): number of beams sent to a worker at once. Defaults to 1.
+
+    Returns:
+        list: one dict per beam, with the same keys as ``generate_slabs``
+    """
+    return _generate('beam', params, workers, folder, chunksize)
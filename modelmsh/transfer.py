@@ -0,0 +1,199 @@
+"""Transfer of nodal fields between meshes.
+
+The target points are located in the elements of the source mesh with a
+``SpatialIndex`` (a tree of element bounding boxes refined with exact tests),
+their natural coordinates are found by Newton iterations on the
+isoparametric map of ``shapes`` (lines, triangles and quadrilaterals, linear
+and quadratic, also embedded in 3D) and the shape functions at those
+coordinates are stored as a sparse (ntarget, nsource) interpolation matrix.
+Points outside the source mesh take the value of the nearest source node.
+
+The matrix is built once per pair of meshes; every field (all the
+combinations and components at once) is then transferred with one sparse
+product.
+
+Example::
+
+    tags, coords, elements = msh.getMeshArrays(gmsh.model)      # source mesh
+    transfer = FieldTransfer(coords, elements)
+    target = transfer.transfer(values, new_coords)              # values (ncomb, npoin, ncomp)
+    table = transfer_table(results[ofemlib.DI_CSV], tags, transfer, new_coords, new_tags)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from . import shapes
+from .spatial import SpatialIndex
+
+
+def inverse_map(gtype: int, xe: np.ndarray, points: np.ndarray, iterations: int = 20,
+                tol: float = 1.0e-10) -> tuple:
+    """Finds the natural coordinates of points in elements of one type
+
+    Args:
+        gtype (int): the gmsh element type
+        xe (np.ndarray): the coordinates of the nodes of the element of each point (n, nnode, 3)
+        points (np.ndarray): the points (n, 3)
+        iterations (int, optional): the maximum number of Newton iterations. Defaults to 20.
+        tol (float, optional): the tolerance on the natural coordinates. Defaults to 1.0e-10.
+
+    Returns:
+        tuple: the natural coordinates (n, dim) and a mask of the converged points
+    """
+    natural = shapes.natural_nodes(gtype)
+    xi = np.broadcast_to(natural.mean(axis=0), (len(points), natural.shape[1])).copy()
+    converged = np.zeros(len(points), dtype=bool)
+    for _ in range(iterations):
+        N, dN = shapes.shape_functions(gtype, xi)
+        residual = points - np.einsum('pn,pnj->pj', N, xe)
+        # least squares step, the elements may be lines or surfaces in 3D
+        J = np.einsum('pni,pnj->pji', dN, xe)
+        JtJ = np.einsum('pji,pjk->pik', J, J)
+        step = np.linalg.solve(JtJ, np.einsum('pji,pj->pi', J, residual)[..., None])[..., 0]
+        xi += step
+        converged = np.abs(step).max(axis=1) < tol
+        if converged.all():
+            break
+    return xi, converged
+
+
+class FieldTransfer:
+    """Interpolation of nodal fields from a source mesh to any points
+
+    Example::
+
+        transfer = FieldTransfer(coords, elements)
+        P, nearest = transfer.matrix(points)
+        target = transfer.transfer(values, points)
+    """
+
+    def __init__(self, coords: np.ndarray, elements: dict):
+        """Indexes the source mesh
+
+        Args:
+            coords (np.ndarray): (npoin, 3) coordinates of the source nodes
+            elements (dict): {gmsh type: (element tags, connectivity as row indices of coords)};
+                only the types of ``shapes`` are used
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.elements = {int(t): (np.asarray(e), np.asarray(c, dtype=np.int64).reshape(len(e), -1))
+                         for t, (e, c) in elements.items() if int(t) in shapes.element_types}
+        self.index = SpatialIndex(self.coords, None, self.elements)
+        # element tag: (type, row in its block)
+        tags = [e for e, _ in self.elements.values()]
+        self._tags = np.concatenate(tags) if tags else np.empty(0, dtype=np.int64)
+        self._types = np.concatenate([np.full(len(e), t) for t, (e, _) in self.elements.items()]) \
+            if tags else np.empty(0, dtype=np.int64)
+        self._rows = np.concatenate([np.arange(len(e)) for e, _ in self.elements.values()]) \
+            if tags else np.empty(0, dtype=np.int64)
+        self._order = np.argsort(self._tags)
+        return
+
+    def matrix(self, points: np.ndarray) -> tuple:
+        """Builds the interpolation matrix for target points
+
+        Args:
+            points (np.ndarray): (n, 3) target points
+
+        Returns:
+            tuple: the sparse (n, npoin) matrix and a mask of the points that took the value
+                of the nearest node (outside the source mesh)
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        found = self.index.locate(points)
+        nearest = found < 0
+        rows, cols, vals = [], [], []
+
+        inside = np.flatnonzero(~nearest)
+        k = self._order[np.searchsorted(self._tags, found[inside], sorter=self._order)]
+        types, erows = self._types[k], self._rows[k]
+        for gtype in np.unique(types):
+            sel = types == gtype
+            p = inside[sel]
+            conn = self.elements[gtype][1][erows[sel]]
+            xi, converged = inverse_map(gtype, self.coords[conn], points[p])
+            N = shapes.shape_functions(gtype, xi)[0]
+            good = converged & np.isfinite(N).all(axis=1)
+            nearest[p[~good]] = True
+            rows.append(np.repeat(p[good], conn.shape[1]))
+            cols.append(conn[good].ravel())
+            vals.append(N[good].ravel())
+
+        outside = np.flatnonzero(nearest)
+        if len(outside) > 0:
+            node = self.index.nearest_node(points[outside])[0]
+            rows.append(outside)
+            cols.append(np.asarray(node, dtype=np.int64).ravel())
+            vals.append(np.ones(len(outside)))
+
+        P = sparse.csr_matrix((np.concatenate(vals) if vals else np.empty(0),
+                               (np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+                                np.concatenate(cols) if cols else np.empty(0, dtype=np.int64))),
+                              shape=(len(points), len(self.coords)))
+        return P, nearest
+
+    def transfer(self, values: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """Interpolates nodal values at target points
+
+        Args:
+            values (np.ndarray): (npoin,), (npoin, ncomp) or (ncomb, npoin, ncomp) values at the
+                source nodes
+            points (np.ndarray): (n, 3) target points
+
+        Returns:
+            np.ndarray: the values at the points, with the shape of values and n points
+        """
+        P = self.matrix(points)[0]
+        return apply(P, values)
+
+
+def apply(P: sparse.spmatrix, values: np.ndarray) -> np.ndarray:
+    """Applies an interpolation matrix to nodal values of all the combinations at once
+
+    Args:
+        P (sparse.spmatrix): the (n, npoin) matrix of ``FieldTransfer.matrix``
+        values (np.ndarray): (npoin,), (npoin, ncomp) or (ncomb, npoin, ncomp) values
+
+    Returns:
+        np.ndarray: the interpolated values, with n points
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim < 3:
+        return P @ values
+    ncomb, npoin, ncomp = values.shape
+    out = P @ values.transpose(1, 0, 2).reshape(npoin, -1)
+    return out.reshape(-1, ncomb, ncomp).transpose(1, 0, 2)
+
+
+def transfer_table(df: pd.DataFrame, nodes: np.ndarray, transfer: FieldTransfer, points: np.ndarray,
+                   numbers: np.ndarray = None) -> pd.DataFrame:
+    """Transfers a point result table (_di.csv or _avgst.csv layout) to another mesh
+
+    Args:
+        df (pd.DataFrame): 'point', the value columns and 'icomb'
+        nodes (np.ndarray): the point number of each source node (row of the coordinates
+            of ``transfer``)
+        transfer (FieldTransfer): the source mesh
+        points (np.ndarray): (n, 3) coordinates of the target points
+        numbers (np.ndarray, optional): the numbers of the target points. Defaults to 1 ... n.
+
+    Returns:
+        pd.DataFrame: the table of the target points, in the same layout
+    """
+    nodes = np.asarray(nodes)
+    columns = [c for c in df.columns if c not in ['point', 'icomb']]
+    combs, ic = np.unique(df['icomb'].values, return_inverse=True)
+    order = np.argsort(nodes)
+    row = order[np.searchsorted(nodes, df['point'].values, sorter=order)]
+    values = np.zeros((len(combs), len(nodes), len(columns)))
+    values[ic, row] = df[columns].values
+
+    P = transfer.matrix(points)[0]
+    out = apply(P, values)
+    ntarget = out.shape[1]
+    numbers = np.arange(1, ntarget+1) if numbers is None else np.asarray(numbers)
+    table = pd.DataFrame(out.reshape(-1, len(columns)), columns=columns)
+    table.insert(0, 'point', np.tile(numbers, len(combs)))
+    table['icomb'] = np.repeat(combs, ntarget)
+    return table